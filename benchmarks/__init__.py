@@ -0,0 +1 @@
+"""Performance benchmarks for docai. Run with ``python -m benchmarks.run``."""
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import List
+
+from docai.llm import LLMBackend
+from docai.llm_server import stand_in_reply
+
+
+class FakeGeminiModel(LLMBackend):
+    """In-process LLM backend for benchmarks.
+
+    Sleeps for ``latency`` seconds per request and answers like the
+    `docai serve-llm` stand-in server: deterministic Markdown derived from the
+    prompt, with one delimited section per module for packed requests, so
+    caching and packing behave as with a real model. ``calls`` counts
+    requests actually made.
+    """
+
+    label = "Fake"
+
+    def __init__(self, latency: float = 0.0, model_name: str = "models/fake-gemini"):
+        self.latency = latency
+        self.name = model_name
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, parts: List[str], timeout: float | None = None) -> str:
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return stand_in_reply("".join(str(p) for p in parts))
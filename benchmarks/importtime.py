@@ -0,0 +1,101 @@
+"""Import-time budget for the `docai scan` path.
+
+Usage:
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --budget-ms 150 --repeat 5
+
+Runs `python -X importtime -m docai scan` on a tiny throwaway repository and
+sums the cumulative import time of every top-level import made after the
+interpreter started (i.e. docai itself plus whatever it pulls in). The exit
+status is 1 if the best run exceeds the budget, or if the scan path imported a
+module it should not need (docs.py, the symbol DB and sqlite3, the Gemini SDK,
+gRPC, protobuf).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+PACKAGE_ROOT = Path(__file__).resolve().parents[1]
+
+# Default budget; tests/test_importtime.py enforces it in the test suite
+BUDGET_MS = 150.0
+
+# Modules that must stay out of `docai scan`
+FORBIDDEN = ("docai.docs", "docai.symbols", "sqlite3", "google.generativeai", "grpc", "google.protobuf")
+
+
+def parse_importtime(stderr: str) -> Tuple[float, List[str]]:
+    """Return (milliseconds spent importing from docai onwards, all imported module names)."""
+    total_us = 0
+    seen_docai = False
+    names: List[str] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        stripped = name.strip()
+        names.append(stripped)
+        top_level = len(name) - len(name.lstrip()) <= 1
+        if stripped == "docai" or stripped.startswith("docai."):
+            seen_docai = True
+        if seen_docai and top_level:
+            total_us += int(cumulative)
+    return total_us / 1000.0, names
+
+
+def measure(repeat: int) -> Tuple[float, List[str]]:
+    work = Path(tempfile.mkdtemp(prefix="docai-importtime-"))
+    try:
+        (work / "mod.py").write_text("def f(x: int) -> int:\n    return x\n", encoding="utf-8")
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(PACKAGE_ROOT), os.environ.get("PYTHONPATH")])))
+        best = float("inf")
+        names: List[str] = []
+        for _ in range(repeat):
+            proc = subprocess.run(
+                [sys.executable, "-X", "importtime", "-m", "docai", "scan", "--no-cache", "--jobs", "1"],
+                cwd=work, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True,
+            )
+            ms, names = parse_importtime(proc.stderr)
+            best = min(best, ms)
+        return best, names
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def forbidden(names: List[str]) -> List[str]:
+    """The FORBIDDEN modules (or their submodules) among names."""
+    return sorted({n for n in names for f in FORBIDDEN if n == f or n.startswith(f + ".")})
+
+
+def main(argv: List[str] | None = None) -> int:
+    p = argparse.ArgumentParser(prog="python -m benchmarks.importtime", description="Check the import-time budget of `docai scan`")
+    p.add_argument("--budget-ms", type=float, default=BUDGET_MS, help="Allowed cumulative import time in milliseconds")
+    p.add_argument("--repeat", type=int, default=5, help="Runs to take the best of")
+    args = p.parse_args(argv)
+
+    ms, names = measure(args.repeat)
+    leaked = forbidden(names)
+    result: Dict[str, object] = {"import_ms": round(ms, 2), "budget_ms": args.budget_ms, "forbidden_imports": leaked}
+    print(json.dumps(result, indent=2))
+    failed = False
+    if ms > args.budget_ms:
+        print(f"[bench] REGRESSION scan import time {ms:.1f}ms exceeds budget {args.budget_ms:.1f}ms", file=sys.stderr)
+        failed = True
+    if leaked:
+        print(f"[bench] REGRESSION scan path imported {', '.join(leaked)}", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,195 @@
+"""Time docai's hot paths on a synthetic repository.
+
+Usage:
+    python -m benchmarks.run --modules 200 --out results.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --tolerance 0.25
+
+Results are written as JSON. With --baseline, any benchmark slower than the
+baseline by more than the tolerance is reported and the exit status is 1.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+PACKAGE_ROOT = Path(__file__).resolve().parents[1]
+if str(PACKAGE_ROOT) not in sys.path:
+    sys.path.insert(0, str(PACKAGE_ROOT))
+
+from docai import docs as docs_mod  # noqa: E402
+from docai.llm import HTTPBackend  # noqa: E402
+from docai.llm_server import STAND_IN_MODEL, StandInServer  # noqa: E402
+from docai.scanner import _write_scan  # noqa: E402
+from docai.store import load_repo  # noqa: E402
+
+from .fake_gemini import FakeGeminiModel  # noqa: E402
+from .synth import generate_repo  # noqa: E402
+
+
+def _time(fn: Callable[[], Any], repeat: int, setup: Callable[[], Any] | None = None) -> Dict[str, Any]:
+    samples: List[float] = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return {"min": min(samples), "median": statistics.median(samples), "samples": len(samples)}
+
+
+def _reset_docs(root: Path) -> None:
+    shutil.rmtree(root / "docs", ignore_errors=True)
+    (root / ".docai" / "api_sections.jsonl").unlink(missing_ok=True)
+
+
+def _touch_and_stage(root: Path, counter: List[int]) -> None:
+    # Change one module so the hook has real work to do
+    counter[0] += 1
+    target = root / "src" / "pkg0" / "mod0.py"
+    with target.open("a", encoding="utf-8") as f:
+        f.write(f"\n\ndef bench_added_{counter[0]}(x: int) -> int:\n    return x\n")
+    subprocess.run(["git", "add", str(target)], cwd=root, check=True)
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    work = Path(tempfile.mkdtemp(prefix="docai-bench-"))
+    root = work / "repo"
+    results: Dict[str, Any] = {}
+    try:
+        results["generate_repo"] = _time(lambda: generate_repo(
+            root,
+            modules=args.modules,
+            classes=args.classes,
+            methods=args.methods,
+            functions=args.functions,
+            doc_density=args.doc_density,
+            seed=args.seed,
+        ), 1)
+
+        results["scan_cold"] = _time(lambda: _write_scan(root, use_cache=False, jobs=args.jobs), args.repeat)
+        _write_scan(root, jobs=args.jobs)
+        results["scan_warm"] = _time(lambda: _write_scan(root, jobs=args.jobs), args.repeat)
+
+        repo = load_repo(root) or {}
+        results["render_api_markdown"] = _time(lambda: docs_mod._render_api_markdown(repo), args.repeat)
+
+        original_client = docs_mod._gemini_client
+        try:
+            docs_mod._gemini_client = lambda: None
+            results["update_docs_deterministic"] = _time(
+                lambda: docs_mod.update_docs(root), args.repeat, setup=lambda: _reset_docs(root)
+            )
+            fake = FakeGeminiModel(latency=args.llm_latency)
+            docs_mod._gemini_client = lambda: fake
+            results["update_docs_fake_gemini"] = _time(
+                lambda: docs_mod.update_docs(root, use_cache=False), args.repeat, setup=lambda: _reset_docs(root)
+            )
+            results["update_docs_fake_gemini"]["llm_calls"] = fake.calls
+
+            # Same run over HTTP against the stand-in server, through the pooled backend
+            server = StandInServer(port=0, latency=args.llm_latency)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                backend = HTTPBackend(server.base_url, STAND_IN_MODEL)
+                docs_mod._gemini_client = lambda: backend
+                results["update_docs_http_stand_in"] = _time(
+                    lambda: docs_mod.update_docs(root, use_cache=False), args.repeat, setup=lambda: _reset_docs(root)
+                )
+                results["update_docs_http_stand_in"]["llm_calls"] = server.requests
+            finally:
+                server.shutdown()
+                server.server_close()
+        finally:
+            docs_mod._gemini_client = original_client
+
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(PACKAGE_ROOT), os.environ.get("PYTHONPATH")])))
+        counter = [0]
+        results["hook_end_to_end"] = _time(
+            lambda: subprocess.run(
+                [sys.executable, "-m", "docai", "hook", "--staged"],
+                cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            ),
+            args.repeat,
+            setup=lambda: _touch_and_stage(root, counter),
+        )
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "modules": args.modules,
+            "classes": args.classes,
+            "methods": args.methods,
+            "functions": args.functions,
+            "doc_density": args.doc_density,
+            "llm_latency": args.llm_latency,
+            "jobs": args.jobs,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Names of benchmarks whose best time regressed beyond tolerance."""
+    regressions = []
+    for name, base in (baseline.get("results") or {}).items():
+        cur = (current.get("results") or {}).get(name)
+        if not cur or name == "generate_repo":
+            continue
+        if cur["min"] > base["min"] * (1 + tolerance):
+            regressions.append(f"{name}: {cur['min']:.4f}s vs baseline {base['min']:.4f}s")
+    return regressions
+
+
+def main(argv: List[str] | None = None) -> int:
+    p = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Benchmark docai on a synthetic repo")
+    p.add_argument("--modules", type=int, default=200)
+    p.add_argument("--classes", type=int, default=3, help="Classes per module")
+    p.add_argument("--methods", type=int, default=5, help="Methods per class")
+    p.add_argument("--functions", type=int, default=5, help="Top-level functions per module")
+    p.add_argument("--doc-density", type=float, default=0.6, help="Fraction of definitions with docstrings")
+    p.add_argument("--llm-latency", type=float, default=0.05, help="Fake Gemini seconds per request")
+    p.add_argument("--jobs", type=int, default=1, help="Parse processes for scans")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", help="Write results JSON here (default: stdout)")
+    p.add_argument("--baseline", help="Baseline results JSON to compare against")
+    p.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    args = p.parse_args(argv)
+
+    # docai's progress messages go to stderr so stdout stays valid JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        result = run(args)
+    text = json.dumps(result, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(result, baseline, args.tolerance)
+        for r in regressions:
+            print(f"[bench] REGRESSION {r}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import random
+import subprocess
+from pathlib import Path
+
+_TYPES = ["int", "str", "bool", "float", "bytes", "Path", "Optional[str]", "List[int]", "Dict[str, Any]"]
+
+
+def _doc(rng: random.Random, density: float, indent: str, what: str) -> str:
+    if rng.random() >= density:
+        return ""
+    return f'{indent}"""{what} generated for benchmarking.\n\n{indent}Extra detail line.\n{indent}"""\n'
+
+
+def _function(rng: random.Random, name: str, indent: str, density: float, method: bool = False) -> str:
+    nargs = rng.randint(0, 4)
+    args = ["self"] if method else []
+    for i in range(nargs):
+        arg = f"a{i}: {rng.choice(_TYPES)}"
+        if i == nargs - 1 and rng.random() < 0.5:
+            arg += " = None"
+        args.append(arg)
+    ret = f" -> {rng.choice(_TYPES)}" if rng.random() < 0.7 else ""
+    deco = f"{indent}@staticmethod\n" if method and not args[1:] and rng.random() < 0.2 else ""
+    if deco:
+        args = args[1:]
+    prefix = "async def" if rng.random() < 0.1 else "def"
+    body = _doc(rng, density, indent + "    ", f"Function {name}")
+    return f"{deco}{indent}{prefix} {name}({', '.join(args)}){ret}:\n{body}{indent}    return None\n\n"
+
+
+def module_source(
+    rng: random.Random,
+    index: int,
+    classes: int = 3,
+    methods: int = 5,
+    functions: int = 5,
+    doc_density: float = 0.6,
+) -> str:
+    out = [_doc(rng, doc_density, "", f"Module {index}")]
+    out.append("from __future__ import annotations\n\nimport os\nfrom pathlib import Path\n")
+    out.append("from typing import Any, Dict, List, Optional\n\n\n")
+    for c in range(classes):
+        base = "(Exception)" if rng.random() < 0.1 else ""
+        out.append(f"class Class{index}_{c}{base}:\n")
+        out.append(_doc(rng, doc_density, "    ", f"Class {c}"))
+        out.append("    attr: int\n    other = 1\n\n")
+        for m in range(methods):
+            name = f"_helper{m}" if rng.random() < 0.3 else f"method{m}"
+            out.append(_function(rng, name, "    ", doc_density, method=True))
+        out.append("\n")
+    for f in range(functions):
+        name = f"_private{f}" if rng.random() < 0.3 else f"function{f}"
+        out.append(_function(rng, name, "", doc_density))
+    return "".join(out)
+
+
+def generate_repo(
+    path: Path,
+    modules: int = 100,
+    classes: int = 3,
+    methods: int = 5,
+    functions: int = 5,
+    doc_density: float = 0.6,
+    packages: int = 10,
+    seed: int = 0,
+    git: bool = True,
+) -> Path:
+    """Write a synthetic Python project with the given shape under path.
+
+    Modules are spread over ``packages`` packages. The same seed always
+    produces the same tree. With git=True the tree is committed to a fresh
+    repository so git-based enumeration and staged scans can be measured.
+    """
+    rng = random.Random(seed)
+    path.mkdir(parents=True, exist_ok=True)
+    for i in range(modules):
+        pkg = path / "src" / f"pkg{i % max(1, packages)}"
+        pkg.mkdir(parents=True, exist_ok=True)
+        (pkg / "__init__.py").touch()
+        (pkg / f"mod{i}.py").write_text(
+            module_source(rng, i, classes, methods, functions, doc_density), encoding="utf-8"
+        )
+    if git:
+        env_cmds = [
+            ["git", "init", "-q"],
+            ["git", "add", "-A"],
+            ["git", "-c", "user.name=bench", "-c", "user.email=bench@example.com", "commit", "-q", "-m", "synthetic"],
+        ]
+        for cmd in env_cmds:
+            subprocess.run(cmd, cwd=path, check=True)
+    return path
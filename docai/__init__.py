@@ -1,10 +1,32 @@
 __all__ = [
     "scan_repository",
+    "scan_staged",
     "update_docs",
     "generate_initial_docs",
     "install_precommit_hook",
 ]
 
-from .scanner import scan_repository  # noqa: F401
-from .docs import update_docs, generate_initial_docs  # noqa: F401
-from .hooks import install_precommit_hook  # noqa: F401
+# Public names resolve on first access (PEP 562) so `import docai` and the CLI
+# do not load the scanner, docs renderer or Gemini SDK until they are used.
+_EXPORTS = {
+    "scan_repository": ".scanner",
+    "scan_staged": ".scanner",
+    "update_docs": ".docs",
+    "generate_initial_docs": ".docs",
+    "install_precommit_hook": ".hooks",
+}
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
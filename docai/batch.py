@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, TextIO
+
+from . import trace
+from .docs import generate_initial_docs, shared_llm_limit, update_docs
+from .scanner import _write_scan, shared_pool
+from .util import repo_root
+
+# `docai batch`: scan (and document) many repositories in one process. All
+# repositories share one parse process pool and one cap on in-flight Gemini
+# calls; each runs in its own thread so one repo's LLM latency overlaps with
+# another's parsing. A failing repository is recorded in the report and the
+# rest carry on.
+
+
+def read_manifest(path: Path) -> List[str]:
+    """One repository path per line; blank lines and # comments are ignored.
+
+    Relative paths are resolved against the manifest's directory.
+    """
+    paths: List[str] = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.split("#", 1)[0].strip()
+        if line:
+            p = Path(line).expanduser()
+            paths.append(str(p if p.is_absolute() else path.parent / p))
+    return paths
+
+
+class _LabelledStream:
+    """stdout replacement that prefixes each line with the calling thread's repo."""
+
+    def __init__(self, stream: TextIO):
+        self._stream = stream
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def set_label(self, label: str | None) -> None:
+        if getattr(self._local, "pending", ""):
+            self.write("\n")
+        self._local.label = label
+        self._local.pending = ""
+
+    def write(self, text: str) -> int:
+        label = getattr(self._local, "label", None)
+        if label is None:
+            with self._lock:
+                return self._stream.write(text)
+        buf = self._local.pending + text
+        *lines, self._local.pending = buf.split("\n")
+        if lines:
+            with self._lock:
+                self._stream.write("".join(f"[{label}] {line}\n" for line in lines))
+        return len(text)
+
+    def flush(self) -> None:
+        self._stream.flush()
+
+
+def _process(path: str, use_cache: bool, jobs: int, fmt: str | None, docs: bool, out: _LabelledStream) -> Dict[str, Any]:
+    entry: Dict[str, Any] = {"path": path, "status": "ok"}
+    t0 = time.perf_counter()
+    out.set_label(Path(path).name or path)
+    try:
+        target = Path(path)
+        if not target.is_dir():
+            raise FileNotFoundError(f"not a directory: {path}")
+        root = repo_root(target)
+        entry["root"] = str(root)
+        with trace.span("batch_repo", path=str(root)):
+            entry["files"] = _write_scan(start=root, use_cache=use_cache, jobs=jobs, fmt=fmt).files
+            if docs:
+                if (root / "docs").exists():
+                    entry["docs"] = "updated" if update_docs(root, use_cache=use_cache) else "unchanged"
+                else:
+                    entry["docs"] = "generated" if generate_initial_docs(root, use_cache=use_cache) else "skipped"
+    except Exception as e:
+        entry["status"] = "failed"
+        entry["error"] = f"{type(e).__name__}: {e}"
+        entry["traceback"] = traceback.format_exc(limit=5)
+    finally:
+        out.set_label(None)
+    entry["seconds"] = round(time.perf_counter() - t0, 3)
+    return entry
+
+
+def run_batch(
+    paths: List[str],
+    use_cache: bool = True,
+    jobs: int | None = None,
+    fmt: str | None = None,
+    docs: bool = True,
+    parallel: int = 4,
+    llm_concurrency: int = 4,
+) -> Dict[str, Any]:
+    """Scan and document every path; returns the aggregated status report."""
+    jobs = jobs or os.cpu_count() or 1
+    t0 = time.perf_counter()
+    out = _LabelledStream(sys.stdout)
+    saved, sys.stdout = sys.stdout, out  # type: ignore[assignment]
+    try:
+        with shared_pool(jobs), shared_llm_limit(llm_concurrency), ThreadPoolExecutor(
+            max_workers=max(1, parallel), thread_name_prefix="docai-batch"
+        ) as ex:
+            futures = [ex.submit(_process, p, use_cache, jobs, fmt, docs, out) for p in paths]
+            repos = [f.result() for f in futures]
+    finally:
+        sys.stdout = saved
+    failed = sum(1 for r in repos if r["status"] != "ok")
+    return {
+        "summary": {
+            "total": len(repos),
+            "ok": len(repos) - failed,
+            "failed": failed,
+            "seconds": round(time.perf_counter() - t0, 3),
+        },
+        "repos": repos,
+    }
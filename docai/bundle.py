@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import json
+import re
+import subprocess
+import tarfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .cache import PARSE_CACHE_VERSION, cache_dir
+from .fingerprints import load_tree
+from .summaries import SUMMARIES_VERSION, summaries_path
+from .util import read_json, state_dir, write_json
+
+# Warm-start cache bundles (`docai cache export/import`) for ephemeral CI
+# runners. A bundle is a gzipped tar of the parse cache, the LLM response
+# cache and the fingerprint-keyed stores (API sections, overview summaries),
+# plus manifest.json with the SHA-256 of every member. Bundles are named by a
+# key (git tree hash by default) and are byte-for-byte reproducible: members
+# are sorted and carry no timestamps or owners.
+#
+# Import never extracts paths from the archive. Only the known member names
+# are read, each is checked against the manifest, and the contents are merged
+# into the local caches (local entries win), so importing is always safe.
+
+BUNDLE_VERSION = 1
+# Refuse bundles that would unpack to more than this
+MAX_BUNDLE_BYTES = 1 << 30
+
+_MEMBER = re.compile(r"^(cache/parse\.json|cache/llm/[0-9a-f]{64}\.txt|api_sections\.jsonl|summaries\.json)$")
+
+
+def _git(root: Path, *args: str) -> str | None:
+    try:
+        out = subprocess.run(["git", "-C", str(root), *args], capture_output=True, check=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.strip() or None
+
+
+def bundle_key(root: Path, key: str = "tree") -> str:
+    """Resolve "tree" (HEAD's tree hash), "commit" (HEAD) or a literal key.
+
+    Outside git (or before the first commit) "tree" and "commit" fall back to
+    the scan's root hash.
+    """
+    if key not in ("tree", "commit"):
+        if not re.fullmatch(r"[\w.-]+", key):
+            raise ValueError(f"invalid bundle key: {key!r}")
+        return key
+    rev = _git(root, "rev-parse", "HEAD^{tree}" if key == "tree" else "HEAD")
+    if rev:
+        return rev
+    tree = load_tree(root / "repo_info.json")
+    if tree and tree.get("root"):
+        return tree["root"]
+    raise ValueError("no git HEAD and no scan to key the bundle on; run `docai scan` first")
+
+
+def _members(root: Path) -> Dict[str, Path]:
+    state = state_dir(root)
+    found: Dict[str, Path] = {}
+    for name, path in (
+        ("cache/parse.json", cache_dir(root) / "parse.json"),
+        ("api_sections.jsonl", state / "api_sections.jsonl"),
+        ("summaries.json", summaries_path(root)),
+    ):
+        if path.is_file():
+            found[name] = path
+    for path in (cache_dir(root) / "llm").glob("*.txt"):
+        name = f"cache/llm/{path.name}"
+        if _MEMBER.match(name):
+            found[name] = path
+    return found
+
+
+def _add(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = 0o644
+    info.mtime = 0
+    tar.addfile(info, io.BytesIO(data))
+
+
+def export_bundle(root: Path, out: Path | None = None, key: str = "tree") -> tuple[Path, Dict[str, Any]]:
+    """Write a bundle of root's caches; out may be a file or a directory. Returns (path, manifest)."""
+    key = bundle_key(root, key)
+    data = {name: path.read_bytes() for name, path in sorted(_members(root).items())}
+    members = {name: {"sha256": hashlib.sha256(b).hexdigest(), "size": len(b)} for name, b in data.items()}
+    manifest = {
+        "version": BUNDLE_VERSION,
+        "key": key,
+        "commit": _git(root, "rev-parse", "HEAD"),
+        "content": hashlib.sha256(json.dumps(members, sort_keys=True).encode("utf-8")).hexdigest(),
+        "members": members,
+    }
+    name = f"docai-cache-{key}.tar.gz"
+    if out is None:
+        out = root / name
+    elif out.is_dir():
+        out = out / name
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name(out.name + ".tmp")
+    with tmp.open("wb") as f, gzip.GzipFile(filename="", fileobj=f, mode="wb", mtime=0) as gz, tarfile.open(
+        fileobj=gz, mode="w", format=tarfile.PAX_FORMAT
+    ) as tar:
+        _add(tar, "manifest.json", json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+        for member, blob in data.items():
+            _add(tar, member, blob)
+    tmp.replace(out)
+    return out, manifest
+
+
+def _read_bundle(path: Path) -> tuple[Dict[str, Any], Dict[str, bytes], List[str]]:
+    """(manifest, verified member contents, rejected member names)."""
+    manifest: Dict[str, Any] | None = None
+    blobs: Dict[str, bytes] = {}
+    rejected: List[str] = []
+    total = 0
+    with tarfile.open(path, mode="r:gz") as tar:
+        for m in tar:
+            if m.name != "manifest.json" and not _MEMBER.match(m.name):
+                rejected.append(m.name)
+                continue
+            if not m.isfile() or m.size < 0:
+                rejected.append(m.name)
+                continue
+            total += m.size
+            if total > MAX_BUNDLE_BYTES:
+                raise ValueError(f"bundle unpacks to more than {MAX_BUNDLE_BYTES} bytes")
+            fh = tar.extractfile(m)
+            data = fh.read(m.size + 1) if fh else b""
+            if len(data) != m.size:
+                rejected.append(m.name)
+                continue
+            if m.name == "manifest.json":
+                manifest = json.loads(data)
+            else:
+                blobs[m.name] = data
+    if not isinstance(manifest, dict) or manifest.get("version") != BUNDLE_VERSION:
+        raise ValueError(f"{path} is not a docai cache bundle (version {BUNDLE_VERSION})")
+    expected = manifest.get("members") or {}
+    for name in list(blobs):
+        if (expected.get(name) or {}).get("sha256") != hashlib.sha256(blobs[name]).hexdigest():
+            rejected.append(name)
+            del blobs[name]
+    return manifest, blobs, rejected
+
+
+def _merge_keyed(path: Path, incoming: bytes, version_key: str, version: Any, entries_key: str) -> int:
+    """Merge a {version, source, <entries>} JSON store; local entries win. Returns entries added."""
+    try:
+        theirs = json.loads(incoming)
+    except ValueError:
+        return 0
+    if not isinstance(theirs, dict) or theirs.get(version_key) != version:
+        return 0
+    try:
+        ours = read_json(path)
+    except Exception:
+        ours = None
+    if not isinstance(ours, dict) or ours.get(version_key) != version:
+        write_json(path, theirs, indent=None)
+        return len(theirs.get(entries_key) or {})
+    if any(ours.get(k) != theirs.get(k) for k in ("source", "scanner")):
+        # Produced by another model/prompt or scanner version; keep ours
+        return 0
+    mine = ours.setdefault(entries_key, {})
+    added = 0
+    for k, v in (theirs.get(entries_key) or {}).items():
+        if k not in mine:
+            mine[k] = v
+            added += 1
+    if added:
+        write_json(path, ours, indent=None)
+    return added
+
+
+def _merge_sections(path: Path, incoming: bytes) -> int:
+    """Merge an api_sections.jsonl store by module; local sections win. Returns sections added."""
+    from .docs import _read_sections, _section_line
+
+    theirs = list(_read_sections(incoming.decode("utf-8", "replace").splitlines()))
+    if not theirs:
+        return 0
+    try:
+        with path.open(encoding="utf-8") as fh:
+            ours = list(_read_sections(fh))
+    except OSError:
+        ours = []
+    if ours and ours[0].get("source") != theirs[0].get("source"):
+        # Produced by another model or prompt; keep ours
+        return 0
+    mine = {r["module"]: r for r in ours[1:] if "module" in r}
+    added = 0
+    for r in theirs[1:]:
+        m = r.get("module")
+        # A section that fell back to the deterministic renderer is worth replacing
+        if m is not None and (m not in mine or (mine[m].get("fallback") and not r.get("fallback"))):
+            mine[m] = r
+            added += 1
+    if added:
+        tmp = path.with_suffix(".tmp")
+        lines = [_section_line(theirs[0])] + [_section_line(mine[m]) for m in sorted(mine)]
+        tmp.write_text("".join(lines), encoding="utf-8")
+        tmp.replace(path)
+    return added
+
+
+def import_bundle(root: Path, path: Path, expect_key: str | None = None) -> Dict[str, Any]:
+    """Merge a bundle into root's caches; returns counts of what was added."""
+    from .docs import _response_cache
+
+    manifest, blobs, rejected = _read_bundle(path)
+    if expect_key and manifest.get("key") != expect_key:
+        raise ValueError(f"bundle key {manifest.get('key')} does not match {expect_key}")
+    stats: Dict[str, Any] = {
+        "key": manifest.get("key"),
+        "rejected": rejected,
+        "parse": 0,
+        "llm": 0,
+        "api_sections": 0,
+        "summaries": 0,
+    }
+    if "cache/parse.json" in blobs:
+        stats["parse"] = _merge_keyed(
+            cache_dir(root) / "parse.json", blobs.pop("cache/parse.json"), "version", PARSE_CACHE_VERSION, "entries"
+        )
+    if "api_sections.jsonl" in blobs:
+        stats["api_sections"] = _merge_sections(
+            state_dir(root) / "api_sections.jsonl", blobs.pop("api_sections.jsonl")
+        )
+    if "summaries.json" in blobs:
+        stats["summaries"] = _merge_keyed(
+            summaries_path(root), blobs.pop("summaries.json"), "version", SUMMARIES_VERSION, "entries"
+        )
+    llm_dir = cache_dir(root) / "llm"
+    for name, data in blobs.items():
+        target = llm_dir / name.rsplit("/", 1)[1]
+        if target.exists():
+            continue
+        llm_dir.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        tmp.replace(target)
+        stats["llm"] += 1
+    if stats["llm"]:
+        # Apply the project's cache size and age limits to the merged set
+        _response_cache(root).evict()
+    return stats
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .util import read_json, state_dir, write_json
+
+# Bump when the on-disk layout of the parse cache changes.
+PARSE_CACHE_VERSION = 1
+
+
+def cache_dir(root: Path) -> Path:
+    return state_dir(root) / "cache"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+class ParseCache:
+    """Per-repository cache of parsed file records.
+
+    Entries are keyed on the relative path and validated by size + mtime; when
+    those differ the content hash is checked before the file is re-parsed.
+    """
+
+    def __init__(self, root: Path, scanner_version: int, enabled: bool = True):
+        self.path = cache_dir(root) / "parse.json"
+        self.scanner_version = scanner_version
+        self.enabled = enabled
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._seen: set[str] = set()
+        self._dirty = False
+        if not enabled:
+            return
+        try:
+            data = read_json(self.path)
+        except Exception:
+            # Corrupt cache: start over
+            data = None
+        if (
+            isinstance(data, dict)
+            and data.get("version") == PARSE_CACHE_VERSION
+            and data.get("scanner") == scanner_version
+        ):
+            self.entries = data.get("entries") or {}
+        elif data is not None:
+            self._dirty = True
+
+    def lookup_stat(self, rel: str, st: os.stat_result) -> tuple[bool, Optional[Dict[str, Any]]]:
+        """Return (hit, info) when size and mtime match the cached entry."""
+        if not self.enabled:
+            return False, None
+        entry = self.entries.get(rel)
+        if entry and entry.get("size") == st.st_size and entry.get("mtime") == st.st_mtime_ns:
+            self._seen.add(rel)
+            return True, entry.get("info")
+        return False, None
+
+    def lookup_hash(self, rel: str, st: os.stat_result, digest: str) -> tuple[bool, Optional[Dict[str, Any]]]:
+        """Fallback check on content hash; refreshes the stored stat on a hit."""
+        if not self.enabled:
+            return False, None
+        entry = self.entries.get(rel)
+        if entry and entry.get("hash") == digest:
+            entry["size"] = st.st_size
+            entry["mtime"] = st.st_mtime_ns
+            self._seen.add(rel)
+            self._dirty = True
+            return True, entry.get("info")
+        return False, None
+
+    def store(self, rel: str, st: os.stat_result, digest: str, info: Optional[Dict[str, Any]]) -> None:
+        # info is None for files that failed to parse, so they are skipped next time too
+        if not self.enabled:
+            return
+        self.entries[rel] = {
+            "size": st.st_size,
+            "mtime": st.st_mtime_ns,
+            "hash": digest,
+            "info": info,
+        }
+        self._seen.add(rel)
+        self._dirty = True
+
+    def save(self, prune: bool = True) -> None:
+        """Persist the cache, dropping entries for files not seen in this scan."""
+        if not self.enabled:
+            return
+        if prune:
+            stale = [k for k in self.entries if k not in self._seen]
+            for k in stale:
+                del self.entries[k]
+            self._dirty = self._dirty or bool(stale)
+        if not self._dirty:
+            return
+        write_json(self.path, {
+            "version": PARSE_CACHE_VERSION,
+            "scanner": self.scanner_version,
+            "entries": self.entries,
+        }, indent=None)
+        self._dirty = False
+
+
+def _remove(p: Path) -> bool:
+    try:
+        p.unlink(missing_ok=True)
+    except OSError:
+        return False
+    return True
+
+
+class ResponseCache:
+    """Content-addressed store of LLM responses under .docai/cache/llm.
+
+    Keys hash the model name, prompt template and serialized payload. Entries
+    are evicted least-recently-used first once the byte cap is exceeded, and
+    dropped outright once older than max_age_days. Age counts from when an
+    entry was written (its mtime), so reads do not extend it; recency is kept
+    in the access time, which get() sets explicitly. The directory is scanned
+    once per instance (on the first put, or an explicit evict()); after that
+    its size is tracked as entries are written. Safe to share between threads.
+    The cache is best-effort: failing to write an entry is reported, never raised.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_age_days: float = 30.0,
+        enabled: bool = True,
+    ):
+        self.dir = cache_dir(root) / "llm"
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Bytes on disk; None until the directory has been scanned
+        self._total: Optional[int] = None
+        self._write_failed = False
+
+    @staticmethod
+    def key(model_name: str, prompt: str, payload: str) -> str:
+        h = hashlib.sha256()
+        for part in (model_name, prompt, payload):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        p = self.dir / f"{key}.txt"
+        try:
+            st = p.stat()
+            if time.time() - st.st_mtime > self.max_age:
+                p.unlink(missing_ok=True)
+                raise FileNotFoundError(p)
+            text = p.read_text(encoding="utf-8")
+        except OSError:
+            self._count(False)
+            return None
+        try:
+            # Access time for LRU ordering; the mtime keeps the entry's age
+            os.utime(p, ns=(time.time_ns(), st.st_mtime_ns))
+        except OSError:
+            pass
+        self._count(True)
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        if not self.enabled or not text:
+            return
+        p = self.dir / f"{key}.txt"
+        data = text.encode("utf-8")
+        # Unique per writer: two threads may store the same key
+        tmp = p.with_name(f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            tmp.write_bytes(data)
+            try:
+                replaced = p.stat().st_size
+            except OSError:
+                replaced = 0
+            tmp.replace(p)
+        except OSError as e:
+            tmp.unlink(missing_ok=True)
+            with self._lock:
+                warn, self._write_failed = not self._write_failed, True
+            if warn:
+                print(f"[docai] Could not write LLM cache entry ({e}); continuing without caching.")
+            return
+        with self._lock:
+            if self._total is not None:
+                self._total += len(data) - replaced
+                if self._total <= self.max_bytes:
+                    return
+        self.evict()
+
+    def evict(self) -> None:
+        """Drop expired entries, then least-recently-used ones down to max_bytes."""
+        with self._lock:
+            now = time.time()
+            entries = []
+            for p in self.dir.glob("*.txt"):
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                if now - st.st_mtime > self.max_age:
+                    _remove(p)
+                    continue
+                entries.append((st.st_atime, st.st_size, p))
+            total = sum(size for _, size, _ in entries)
+            for _, size, p in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if _remove(p):
+                    total -= size
+            self._total = total
+            for p in self.dir.glob("*.tmp"):
+                # Left behind by a writer that died mid-put
+                try:
+                    if now - p.stat().st_mtime > 3600:
+                        _remove(p)
+                except OSError:
+                    continue
+
+    def stats_line(self) -> str:
+        total = self.hits + self.misses
+        rate = f" ({100 * self.hits / total:.0f}% hit rate)" if total else ""
+        return f"[docai] LLM cache: {self.hits} hits, {self.misses} misses{rate}"
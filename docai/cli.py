@@ -4,32 +4,42 @@ import argparse
 import sys
 from pathlib import Path
 
-from .scanner import scan_repository
-from .docs import update_docs, generate_initial_docs, list_gemini_models
-from .hooks import install_precommit_hook
-from .util import repo_root, read_json
+from . import trace
+from .store import FORMATS
+from .util import repo_root
+
+# Subcommand modules are imported inside the handlers so `docai scan` or the
+# hook never load docs.py (and the Gemini SDK) unless they actually need it.
 
 
 def _cmd_scan(args) -> int:
-    scan_repository()
+    from .scanner import _write_scan
+
+    _write_scan(use_cache=not args.no_cache, jobs=args.jobs, fmt=args.format)
     print("[docai] Wrote repo_info.json")
     return 0
 
 
 def _cmd_update_docs(args) -> int:
+    from .docs import update_docs
+    from .fingerprints import load_tree
+    from .scanner import _write_scan
+
     root = repo_root()
-    before = read_json(root / "repo_info.json") or {}
-    scan_repository()
-    after = read_json(root / "repo_info.json") or {}
-    if before == after:
+    before = load_tree(root / "repo_info.json") or {}
+    _write_scan(use_cache=not args.no_cache, jobs=args.jobs, fmt=args.format)
+    after = load_tree(root / "repo_info.json") or {}
+    if before.get("root") and before.get("root") == after.get("root"):
         print("[docai] Docs already up to date.")
         return 0
-    changed = update_docs()
+    changed = update_docs(use_cache=not args.no_cache)
     print("[docai] Updated docs/" + (" (changes)" if changed else " (no changes)"))
     return 0
 
 
 def _cmd_generate_docs(args) -> int:
+    from .docs import generate_initial_docs
+
     changed = generate_initial_docs()
     if changed:
         print("[docai] Generated initial docs/")
@@ -39,18 +49,26 @@ def _cmd_generate_docs(args) -> int:
 
 
 def _cmd_run(args) -> int:
-    scan_repository()
-    root = repo_root()
+    from .scanner import _write_scan
+
+    _write_scan(use_cache=not args.no_cache, jobs=args.jobs, fmt=args.format)
+    return _sync_docs(use_cache=not args.no_cache)
+
+
+def _sync_docs(use_cache: bool = True, start: Path | None = None) -> int:
+    from .docs import generate_initial_docs, update_docs
+
+    root = repo_root(start)
     docs_dir = root / "docs"
     if docs_dir.exists():
-        changed = update_docs()
+        changed = update_docs(root, use_cache=use_cache)
         if changed:
             print("[docai] Docs updated; please review changes before committing.")
             return 1
         print("[docai] Docs already up to date.")
         return 0
     else:
-        changed = generate_initial_docs()
+        changed = generate_initial_docs(root, use_cache=use_cache)
         if changed:
             print("[docai] Initial docs generated; please review before committing.")
             return 1
@@ -58,29 +76,318 @@ def _cmd_run(args) -> int:
         return 0
 
 
+def _hook_budget(root: Path) -> float:
+    """hook_budget_ms from .docai.json, in seconds."""
+    from .util import load_project_config
+
+    return float(load_project_config(root).get("hook_budget_ms", 1500)) / 1000
+
+
+def _queue_docs(root: Path, rescan: bool = False) -> int:
+    """Queue docs regeneration (and a rescan first, if asked) for the worker; always 0."""
+    from .jobs import enqueue
+
+    try:
+        job, coalesced = enqueue(root, rescan=rescan)
+    except OSError as e:
+        print(f"[docai] Could not queue docs regeneration ({e}); run `docai worker` later.")
+        return 0
+    note = " (already queued)" if coalesced else ""
+    print(f"[docai] Queued docs regeneration as job {job['id']}{note}; `docai status` shows progress.")
+    return 0
+
+
+def _defer_docs(use_cache: bool = True, start: Path | None = None, started: float | None = None) -> int:
+    """Deferred-mode hook tail: queue LLM regeneration instead of running it.
+
+    Runs after the scan and always returns 0, so the commit is never
+    blocked. With no LLM configured the deterministic docs are rendered
+    inline if the hook is still within hook_budget_ms; otherwise the render
+    is queued too. A scan that runs past the budget never gets here: it is
+    stopped and queued as a rescan (see _cmd_hook). A render that has
+    started is not cut short.
+    """
+    import time
+
+    from .docs import generate_initial_docs, update_docs
+    from .llm import configured
+
+    root = repo_root(start)
+    budget = _hook_budget(root)
+    elapsed = time.perf_counter() - started if started is not None else 0.0
+    if not configured() and elapsed < budget:
+        render = update_docs if (root / "docs").exists() else generate_initial_docs
+        if render(root, use_cache=use_cache):
+            print("[docai] Docs updated; they are not part of this commit, so review and commit docs/ separately.")
+        else:
+            print("[docai] Docs already up to date.")
+        elapsed = time.perf_counter() - started if started is not None else 0.0
+    else:
+        _queue_docs(root)
+    if elapsed > budget:
+        print(f"[docai] Hook took {elapsed * 1000:.0f}ms, over hook_budget_ms ({budget * 1000:.0f}ms).")
+    return 0
+
+
+def _cmd_diff(args) -> int:
+    import json
+    from dataclasses import asdict
+
+    from .fingerprints import build_tree, diff_trees, is_empty_diff, load_tree
+    from .scanner import iter_repository
+
+    root = repo_root()
+    old = load_tree(root / "repo_info.json")
+    files = iter_repository(use_cache=not args.no_cache, jobs=args.jobs)
+    diff = diff_trees(old, build_tree(asdict(f) for f in files))
+    if args.json:
+        print(json.dumps(diff, indent=2))
+        return 0
+    if old is None:
+        print("[docai] No previous scan found; everything is new.")
+    if is_empty_diff(diff):
+        print("[docai] No changes since last scan.")
+        return 0
+    for m in diff["added"]:
+        print(f"+ {m}")
+    for m in diff["removed"]:
+        print(f"- {m}")
+    for m, syms in diff["changed"].items():
+        print(f"~ {m}")
+        for k in syms["added"]:
+            print(f"    + {k}")
+        for k in syms["removed"]:
+            print(f"    - {k}")
+        for k in syms["changed"]:
+            print(f"    ~ {k}")
+    return 0
+
+
+def _cmd_daemon(args) -> int:
+    from . import daemon
+
+    root = repo_root()
+    if args.stop or args.status:
+        resp = daemon.request(root, "stop" if args.stop else "ping", timeout=10.0)
+        if resp is None:
+            print("[docai] No daemon running.")
+            return 1
+        if not resp.get("ok"):
+            print(resp.get("output", ""), end="")
+            return 1
+        if args.stop:
+            print(resp.get("output", ""), end="")
+        else:
+            print(f"[docai] Daemon running for {root} ({resp.get('files', 0)} files).")
+        return 0
+    return daemon.run_daemon(root, interval=args.interval, use_cache=not args.no_cache, jobs=args.jobs)
+
+
+def _cmd_query(args) -> int:
+    import json
+
+    from .symbols import ensure_current, query
+
+    if not (args.symbol or args.module or args.decorator):
+        print("[docai] Give a symbol name, --module or --decorator.")
+        return 2
+    db = ensure_current(repo_root())
+    if db is None:
+        print("[docai] No scan results found; run `docai scan` first.")
+        return 1
+    rows = query(db, args.symbol, module=args.module, decorator=args.decorator, kind=args.kind, limit=args.limit)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return 0 if rows else 1
+    if not rows:
+        print("[docai] No matches.")
+        return 1
+    for r in rows:
+        decorators = "".join(f"@{d} " for d in r["decorators"])
+        print(f"{r['kind']:<8} {r['module']}:{r['qualname']}  {decorators}{r['signature']}")
+        print(f"         {r['path']} - {r['summary']}")
+    return 0
+
+
+def _cmd_batch(args) -> int:
+    import json
+
+    from .batch import read_manifest, run_batch
+
+    paths = list(args.paths)
+    if args.manifest:
+        paths += read_manifest(Path(args.manifest))
+    if not paths:
+        print("[docai] No repositories given; pass paths or --manifest FILE.")
+        return 2
+    report = run_batch(
+        paths,
+        use_cache=not args.no_cache,
+        jobs=args.jobs,
+        fmt=args.format,
+        docs=not args.scan_only,
+        parallel=args.parallel,
+        llm_concurrency=args.llm_concurrency,
+    )
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+        s = report["summary"]
+        print(f"[docai] Batch: {s['ok']}/{s['total']} ok, {s['failed']} failed in {s['seconds']:.1f}s; report in {args.out}")
+    else:
+        print(text)
+    return 1 if report["summary"]["failed"] else 0
+
+
+def _cmd_serve_llm(args) -> int:
+    from .llm_server import serve
+
+    return serve(args.host, args.port, latency=args.latency, verbose=args.verbose, chunk_delay=args.chunk_delay)
+
+
 def _cmd_install_hook(args) -> int:
-    path = install_precommit_hook()
+    from .hooks import install_postcommit_hook, install_precommit_hook
+
+    path = install_precommit_hook(deferred=args.deferred)
     print(f"[docai] Installed pre-commit hook at {path}")
+    if args.deferred:
+        path = install_postcommit_hook()
+        print(f"[docai] Installed post-commit hook at {path}; it drains the docs queue in the background")
     return 0
 
 
 def _cmd_hook(args) -> int:
-    # Entry used by the pre-commit hook
-    return _cmd_run(args)
+    # Entry used by the pre-commit hook; a running daemon answers from its in-memory model
+    import time
+
+    from .util import load_project_config
+
+    started = time.perf_counter()
+    defer = args.defer or load_project_config(repo_root()).get("hook_mode") == "deferred"
+    if not args.no_daemon:
+        from . import daemon
+
+        resp = daemon.request(
+            repo_root(),
+            "hook",
+            {"use_cache": not args.no_cache, "format": args.format, "defer": defer, "staged": args.staged},
+        )
+        if resp is not None:
+            print(resp.get("output", ""), end="")
+            return int(resp.get("code", 1))
+    from .scanner import ScanBudgetExceeded, _write_scan, _write_staged
+
+    scan = _write_staged if args.staged else _write_scan
+    # A deferred hook stops scanning at its budget and leaves the rest to the worker
+    deadline = started + _hook_budget(repo_root()) if defer else None
+    try:
+        scan(use_cache=not args.no_cache, jobs=args.jobs, fmt=args.format, deadline=deadline)
+    except ScanBudgetExceeded:
+        print("[docai] Scan ran past hook_budget_ms; deferring it to the worker.")
+        return _queue_docs(repo_root(), rescan=True)
+    if defer:
+        return _defer_docs(use_cache=not args.no_cache, started=started)
+    return _sync_docs(use_cache=not args.no_cache)
+
+
+def _cmd_worker(args) -> int:
+    from .jobs import run_worker
+
+    def _regenerate(root: Path) -> bool:
+        from .docs import generate_initial_docs, update_docs
+
+        if (root / "docs").exists():
+            return update_docs(root, use_cache=not args.no_cache)
+        return generate_initial_docs(root, use_cache=not args.no_cache)
+
+    ran = run_worker(repo_root(), _regenerate, once=args.once)
+    if ran < 0:
+        print("[docai] Another worker is already draining the queue.")
+    elif ran == 0:
+        print("[docai] No queued docs jobs.")
+    return 0
+
+
+def _cmd_cache_export(args) -> int:
+    from .bundle import export_bundle
+
+    out = Path(args.out) if args.out else None
+    if out is not None and args.out.endswith(("/", "\\")):
+        out.mkdir(parents=True, exist_ok=True)
+    try:
+        path, manifest = export_bundle(repo_root(), out, key=args.key)
+    except ValueError as e:
+        print(f"[docai] {e}")
+        return 2
+    size = sum(m["size"] for m in manifest["members"].values())
+    print(f"[docai] Wrote {path} ({len(manifest['members'])} entries, {size / 1024:.0f} KiB uncompressed)")
+    return 0
+
+
+def _cmd_cache_import(args) -> int:
+    import tarfile
+
+    from .bundle import import_bundle
+
+    try:
+        stats = import_bundle(repo_root(), Path(args.bundle), expect_key=args.expect_key)
+    except (OSError, EOFError, ValueError, tarfile.TarError) as e:
+        print(f"[docai] Cannot import {args.bundle}: {e}")
+        return 2
+    print(
+        f"[docai] Imported bundle {stats['key']}: {stats['parse']} parsed files, {stats['llm']} LLM responses, "
+        f"{stats['api_sections']} API sections, {stats['summaries']} summaries"
+    )
+    if stats["rejected"]:
+        print(f"[docai] Skipped {len(stats['rejected'])} unexpected or corrupt member(s): {', '.join(stats['rejected'][:5])}")
+    return 0
+
+
+def _cmd_status(args) -> int:
+    import json
+    from datetime import datetime
+
+    from .jobs import list_jobs, worker_pid
+
+    root = repo_root()
+    jobs = list_jobs(root)
+    pid = worker_pid(root)
+    if args.json:
+        print(json.dumps({"worker_pid": pid, **jobs}, indent=2))
+        return 0
+
+    def _when(ts: float | None) -> str:
+        return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") if ts else "-"
+
+    print(f"[docai] Worker: {f'running (pid {pid})' if pid else 'idle'}")
+    for state in ("running", "pending"):
+        print(f"[docai] {state.capitalize()}: {len(jobs[state])}")
+        for j in jobs[state]:
+            print(f"  {j['id']}  queued {_when(j.get('created'))}  requests {j.get('requests', 1)}")
+    print(f"[docai] Finished (last {len(jobs['done'])}):")
+    for j in jobs["done"][: args.limit]:
+        detail = j.get("result") or j.get("error") or (f"by {j['superseded_by']}" if j.get("superseded_by") else "")
+        print(f"  {j['id']}  {j['state']:<10}  {_when(j.get('finished'))}  {j.get('seconds', 0):>7.1f}s  {detail}")
+    return 0
 
 
 def _cmd_parse(args) -> int:
+    from .scanner import _write_scan
+
     target = Path(args.path)
-    scan_repository(start=target)
+    _write_scan(start=target, use_cache=not args.no_cache, jobs=args.jobs, fmt=args.format)
     print(f"[docai] Wrote repo_info.json in {repo_root(target)}")
     return 0
 
 
 def _cmd_generate_initial(args) -> int:
+    from .docs import generate_initial_docs
+    from .scanner import _write_scan
+
     target = Path(args.path)
     # Ensure repo_info.json exists for target
-    scan_repository(start=target)
-    changed = generate_initial_docs(start=target)
+    _write_scan(start=target, use_cache=not args.no_cache, jobs=args.jobs, fmt=args.format)
+    changed = generate_initial_docs(start=target, use_cache=not args.no_cache)
     if changed:
         print(f"[docai] Generated initial docs/ in {repo_root(target)}")
         return 0
@@ -88,36 +395,130 @@ def _cmd_generate_initial(args) -> int:
     return 0
 
 
+def _add_scan_options(p: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    p.add_argument("--no-cache", action="store_true", help="Bypass the parse and LLM response caches in .docai/cache")
+    p.add_argument("--jobs", "-j", type=int, default=None, help="Parallel parse processes (default: CPU count)")
+    p.add_argument(
+        "--format",
+        choices=FORMATS,
+        default=None,
+        help="Scan output: repo_info.json, streamed repo_info.jsonl, or both (default: output_format in .docai.json, else json)",
+    )
+    return p
+
+
 def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(prog="docai", description="Auto-sync docs with code")
+    p.add_argument("--timings", action="store_true", help="Print a per-phase timing table when done")
+    p.add_argument("--trace", metavar="OUT_JSON", help="Write a Chrome trace-event file of all phases")
     sub = p.add_subparsers(dest="cmd", required=True)
 
-    sub.add_parser("scan").set_defaults(func=_cmd_scan)
-    sub.add_parser("update-docs").set_defaults(func=_cmd_update_docs)
+    _add_scan_options(sub.add_parser("scan")).set_defaults(func=_cmd_scan)
+    _add_scan_options(sub.add_parser("update-docs")).set_defaults(func=_cmd_update_docs)
     sub.add_parser("generate-docs").set_defaults(func=_cmd_generate_docs)
-    sub.add_parser("run").set_defaults(func=_cmd_run)
-    sub.add_parser("install-hook").set_defaults(func=_cmd_install_hook)
-    sub.add_parser("hook").set_defaults(func=_cmd_hook)
+    _add_scan_options(sub.add_parser("run")).set_defaults(func=_cmd_run)
+    p_install = sub.add_parser("install-hook")
+    p_install.add_argument(
+        "--deferred",
+        action="store_true",
+        help="Scan only in pre-commit and regenerate docs after the commit, from a background worker",
+    )
+    p_install.set_defaults(func=_cmd_install_hook)
+    p_hook = _add_scan_options(sub.add_parser("hook"))
+    p_hook.add_argument("--staged", action="store_true", help="Only re-parse staged .py files and patch repo_info.json")
+    p_hook.add_argument("--no-daemon", action="store_true", help="Run in-process even if a docai daemon is running")
+    p_hook.add_argument(
+        "--defer", action="store_true", help="Queue LLM regeneration instead of running it (default: hook_mode in .docai.json)"
+    )
+    p_hook.set_defaults(func=_cmd_hook)
+
+    p_worker = sub.add_parser("worker", help="Run queued docs regeneration jobs")
+    p_worker.add_argument("--once", action="store_true", help="Run at most one job")
+    p_worker.add_argument("--no-cache", action="store_true", help="Bypass the LLM response cache")
+    p_worker.set_defaults(func=_cmd_worker)
+
+    p_cache = sub.add_parser("cache", help="Export or import warm-start cache bundles (e.g. for CI runners)")
+    cache_sub = p_cache.add_subparsers(dest="cache_cmd", required=True)
+    p_export = cache_sub.add_parser("export", help="Pack the parse cache, LLM responses and doc stores into a bundle")
+    p_export.add_argument("--out", help="Bundle file or directory (default: docai-cache-<key>.tar.gz in the repo root)")
+    p_export.add_argument(
+        "--key", default="tree", help="tree (HEAD's tree hash, default), commit (HEAD) or a literal key"
+    )
+    p_export.set_defaults(func=_cmd_cache_export)
+    p_import = cache_sub.add_parser("import", help="Merge a bundle into the local caches")
+    p_import.add_argument("bundle", help="Path to a docai-cache-*.tar.gz bundle")
+    p_import.add_argument("--expect-key", help="Refuse bundles with a different key")
+    p_import.set_defaults(func=_cmd_cache_import)
+
+    p_status = sub.add_parser("status", help="Show pending and finished docs jobs")
+    p_status.add_argument("--limit", type=int, default=10, help="Finished jobs to list")
+    p_status.add_argument("--json", action="store_true", help="Print the queue as JSON")
+    p_status.set_defaults(func=_cmd_status)
+
+    p_daemon = sub.add_parser("daemon", help="Keep a hot in-memory model and serve hook/scan requests over a Unix socket")
+    p_daemon.add_argument("--interval", type=float, default=1.0, help="Polling interval in seconds when watchdog is not installed")
+    p_daemon.add_argument("--no-cache", action="store_true", help="Bypass the parse cache in .docai/cache")
+    p_daemon.add_argument("--jobs", "-j", type=int, default=None, help="Parallel parse processes (default: CPU count)")
+    p_daemon.add_argument("--stop", action="store_true", help="Stop the running daemon")
+    p_daemon.add_argument("--status", action="store_true", help="Report whether a daemon is running")
+    p_daemon.set_defaults(func=_cmd_daemon)
+
+    p_diff = sub.add_parser("diff", help="Show modules and symbols changed since the last scan")
+    p_diff.add_argument("--no-cache", action="store_true", help="Bypass the parse cache in .docai/cache")
+    p_diff.add_argument("--jobs", "-j", type=int, default=None, help="Parallel parse processes (default: CPU count)")
+    p_diff.add_argument("--json", action="store_true", help="Print the diff as JSON")
+    p_diff.set_defaults(func=_cmd_diff)
 
     p_parse = sub.add_parser("parse", help="Parse a project path and write repo_info.json")
     p_parse.add_argument("path", help="Path to the project root or any child path")
+    _add_scan_options(p_parse)
     p_parse.set_defaults(func=_cmd_parse)
 
     p_gen_init = sub.add_parser("generate-initial", help="Generate initial docs for a project path")
     p_gen_init.add_argument("path", help="Path to the project root or any child path")
+    _add_scan_options(p_gen_init)
     p_gen_init.set_defaults(func=_cmd_generate_initial)
 
+    p_query = sub.add_parser("query", help="Look up classes, functions and methods in .docai/symbols.db")
+    p_query.add_argument("symbol", nargs="?", help="Name or Class.method; glob patterns (*, ?) allowed")
+    p_query.add_argument("--module", help="Restrict to modules matching this name or glob")
+    p_query.add_argument("--decorator", help="Only symbols with a decorator matching this name or glob")
+    p_query.add_argument("--kind", choices=("class", "function", "method"), help="Only this kind of symbol")
+    p_query.add_argument("--limit", type=int, default=100, help="Maximum results (default: 100)")
+    p_query.add_argument("--json", action="store_true", help="Print matches as JSON")
+    p_query.set_defaults(func=_cmd_query)
+
+    p_batch = sub.add_parser("batch", help="Scan and document many repositories in one process")
+    p_batch.add_argument("paths", nargs="*", help="Repository paths")
+    p_batch.add_argument("--manifest", help="File listing repository paths, one per line (# comments allowed)")
+    p_batch.add_argument("--parallel", type=int, default=4, help="Repositories processed at once (default: 4)")
+    p_batch.add_argument("--llm-concurrency", type=int, default=4, help="Gemini calls in flight across all repositories (default: 4)")
+    p_batch.add_argument("--scan-only", action="store_true", help="Only write repo_info.json; skip docs")
+    p_batch.add_argument("--out", help="Write the JSON report here instead of stdout")
+    _add_scan_options(p_batch)
+    p_batch.set_defaults(func=_cmd_batch)
+
     def _cmd_list_models(_):
+        from .docs import list_gemini_models
+
         names = list_gemini_models()
         if not names:
-            print("[docai] No models found or Gemini not configured. Ensure config.json has gemini_api_key.")
+            print("[docai] No models found or no LLM backend configured. Set gemini_api_key (or llm_base_url) in config.json.")
             return 1
-        print("[docai] Available Gemini models:")
+        print("[docai] Available models:")
         for n in names:
             print(f"- {n}")
         return 0
 
-    sub.add_parser("list-models", help="List available Gemini models for the configured API key").set_defaults(func=_cmd_list_models)
+    sub.add_parser("list-models", help="List models available from the configured LLM backend").set_defaults(func=_cmd_list_models)
+
+    p_serve = sub.add_parser("serve-llm", help="Run a local OpenAI-compatible stand-in model server for offline testing")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=8765)
+    p_serve.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each answer")
+    p_serve.add_argument("--chunk-delay", type=float, default=0.0, help="Seconds between streamed chunks")
+    p_serve.add_argument("--verbose", action="store_true", help="Log every request")
+    p_serve.set_defaults(func=_cmd_serve_llm)
 
     return p
 
@@ -125,7 +526,18 @@ def build_parser() -> argparse.ArgumentParser:
 def main(argv: list[str] | None = None) -> int:
     parser = build_parser()
     ns = parser.parse_args(argv)
-    return ns.func(ns)
+    if not (ns.timings or ns.trace):
+        return ns.func(ns)
+    trace.enable()
+    try:
+        with trace.span(f"docai {ns.cmd}"):
+            return ns.func(ns)
+    finally:
+        if ns.timings:
+            print(trace.summary_table(), file=sys.stderr)
+        if ns.trace:
+            trace.write_chrome_trace(ns.trace)
+            print(f"[docai] Wrote trace to {ns.trace}", file=sys.stderr)
 
 
 if __name__ == "__main__":
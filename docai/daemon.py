@@ -0,0 +1,326 @@
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import selectors
+import socket
+import stat
+import tempfile
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from . import trace
+from .util import IGNORES, staged_changes, state_dir, unstaged_paths
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .scanner import FileInfo, RepoInfo
+
+try:
+    from watchdog.events import FileSystemEventHandler  # type: ignore
+    from watchdog.observers import Observer  # type: ignore
+except Exception:  # pragma: no cover
+    Observer = None  # type: ignore
+    FileSystemEventHandler = object  # type: ignore
+
+# Resident process that keeps the parsed model of a repository in memory and
+# answers scan/hook/render requests over a Unix domain socket, so the pre-commit
+# hook does not pay for a cold start and a full re-scan on every commit.
+# The client half (request) stays import-light; the scanner loads in the server.
+
+# AF_UNIX paths are limited to ~104-108 bytes depending on the platform.
+_MAX_SOCKET_PATH = 100
+
+
+def supported() -> bool:
+    return hasattr(socket, "AF_UNIX") and hasattr(os, "getuid")
+
+
+def _private_dir() -> Path | None:
+    """Per-user socket directory: $XDG_RUNTIME_DIR/docai, else a 0700 docai-<uid> in the temp dir.
+
+    Returns None unless the directory is ours and closed to everyone else, so
+    another user cannot plant or pre-create the socket.
+    """
+    base = os.environ.get("XDG_RUNTIME_DIR")
+    path = Path(base) / "docai" if base else Path(tempfile.gettempdir()) / f"docai-{os.getuid()}"
+    try:
+        path.mkdir(mode=0o700, exist_ok=True)
+        st = path.lstat()
+    except OSError:
+        return None
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        return None
+    return path
+
+
+def socket_path(root: Path) -> Path | None:
+    """Socket for root's daemon, or None if there is no safe place for it."""
+    path = state_dir(root) / "daemon.sock"
+    if len(str(path)) <= _MAX_SOCKET_PATH:
+        return path
+    private = _private_dir()
+    if private is None:
+        return None
+    digest = hashlib.sha1(str(root).encode("utf-8")).hexdigest()[:16]
+    path = private / f"{digest}.sock"
+    return path if len(str(path)) <= _MAX_SOCKET_PATH else None
+
+
+def _trusted(path: Path) -> bool:
+    """True if path is a socket owned by the current user."""
+    try:
+        st = path.lstat()
+    except OSError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and st.st_uid == os.getuid()
+
+
+def _failed(message: str) -> Dict[str, Any]:
+    return {"ok": False, "code": 1, "output": f"[docai] {message}\n"}
+
+
+def request(root: Path, cmd: str, args: Dict[str, Any] | None = None, timeout: float = 300.0) -> Dict[str, Any] | None:
+    """Send one request to the daemon for root. Returns None if no trusted daemon is reachable.
+
+    Once the request is sent, a timeout or a broken reply is returned as an
+    error response rather than None: the daemon may still be writing
+    repo_info.json and docs/, so the caller must not redo the work in-process.
+    """
+    if not supported():
+        return None
+    path = socket_path(root)
+    if path is None or not path.exists():
+        return None
+    if not _trusted(path):
+        # Its answers (e.g. code 0 from the hook) would skip the docs check
+        print(f"[docai] Ignoring {path}: not a socket owned by you.")
+        return None
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        try:
+            s.connect(str(path))
+            s.sendall((json.dumps({"cmd": cmd, "args": args or {}}) + "\n").encode("utf-8"))
+        except OSError:
+            return None
+        try:
+            with s.makefile("rb") as f:
+                line = f.readline()
+        except socket.timeout:
+            return _failed(f"Daemon did not answer within {timeout:g}s; it may still be working. Retry, or stop it.")
+        except OSError as e:
+            return _failed(f"Lost the connection to the daemon: {e}")
+    try:
+        resp = json.loads(line)
+    except ValueError:
+        resp = None
+    if not isinstance(resp, dict):
+        return _failed("Daemon sent no valid reply; check it with `docai daemon --status`.")
+    return resp
+
+
+class _ChangeFlag(FileSystemEventHandler):  # type: ignore[misc,valid-type]
+    def __init__(self) -> None:
+        self.dirty = threading.Event()
+        self.dirty.set()
+
+    def on_any_event(self, event) -> None:  # pragma: no cover - driven by watchdog
+        path = str(getattr(event, "src_path", ""))
+        if path.endswith(".py") and not any(part in IGNORES for part in Path(path).parts):
+            self.dirty.set()
+
+
+class Daemon:
+    """In-memory FileInfo model of one repository, kept current by polling or inotify.
+
+    Uses watchdog (inotify/FSEvents/...) when installed, otherwise polls file
+    stats every ``interval`` seconds. Every request also re-checks stats first,
+    so answers never lag behind the working tree.
+    """
+
+    def __init__(self, root: Path, interval: float = 1.0, use_cache: bool = True, jobs: int | None = None):
+        from .cache import ParseCache
+        from .scanner import SCANNER_VERSION
+
+        self.root = root
+        self.interval = interval
+        self.jobs = jobs or os.cpu_count() or 1
+        self.cache = ParseCache(root, SCANNER_VERSION, enabled=use_cache)
+        self.files: Dict[str, FileInfo] = {}
+        self._sigs: Dict[str, tuple[int, int]] = {}
+        self._flag: Optional[_ChangeFlag] = None
+        self._running = False
+
+    def refresh(self) -> int:
+        """Re-parse files whose size/mtime changed; returns the number of changed files."""
+        from .scanner import _collect, _repo_paths
+
+        with trace.span("daemon_refresh"):
+            current: Dict[str, tuple[int, int]] = {}
+            for py in _repo_paths(self.root):
+                try:
+                    st = py.stat()
+                except OSError:
+                    continue
+                current[py.relative_to(self.root).as_posix()] = (st.st_size, st.st_mtime_ns)
+            stale = [rel for rel, sig in current.items() if self._sigs.get(rel) != sig]
+            removed = [rel for rel in self._sigs if rel not in current]
+            for rel in removed + stale:
+                self.files.pop(rel, None)
+            for info in _collect(self.root, [self.root / rel for rel in stale], self.cache, self.jobs):
+                self.files[Path(info.path).as_posix()] = info
+            self._sigs = current
+            if stale:
+                self.cache.save(prune=False)
+            return len(stale) + len(removed)
+
+    def repo(self) -> RepoInfo:
+        from .scanner import RepoInfo
+
+        return RepoInfo(root=str(self.root), files=[self.files[k] for k in sorted(self.files)])
+
+    def write_staged(self, fmt: str | None = None) -> None:
+        """Write outputs for the index rather than the working tree, from the in-memory model.
+
+        Only files with unstaged edits are parsed, from their staged blobs;
+        staged removals are dropped. Same result as `docai hook --staged`.
+        """
+        from .scanner import _output_format, _parse_index, _record_scan, _selected, _symbol_db
+        from .store import RepoWriter
+
+        unstaged = unstaged_paths(self.root)
+        staged = staged_changes(self.root)
+        parsed = _parse_index(self.root, _selected(self.root, unstaged)) if unstaged is not None else None
+        if staged is None or parsed is None:
+            self.write_outputs(fmt)
+            return
+        drop = set(unstaged or ()) | set(staged[1])
+        out = self.root / "repo_info.json"
+        with RepoWriter(out, str(self.root), _output_format(self.root, fmt), _symbol_db(self.root)) as writer:
+            for rel in sorted((set(self.files) - drop) | set(parsed)):
+                writer.add(asdict(parsed.get(rel) or self.files[rel]))
+        _record_scan(self.root, out)
+
+    def write_outputs(self, fmt: str | None = None) -> None:
+        from .scanner import _output_format, _symbol_db
+        from .store import RepoWriter
+
+        out = self.root / "repo_info.json"
+        with RepoWriter(out, str(self.root), _output_format(self.root, fmt), _symbol_db(self.root)) as writer:
+            for rel in sorted(self.files):
+                writer.add(asdict(self.files[rel]))
+
+    def handle(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        cmd = req.get("cmd")
+        args = req.get("args") or {}
+        if cmd == "ping":
+            return {"ok": True, "code": 0, "output": "", "files": len(self.files)}
+        if cmd == "stop":
+            self._running = False
+            return {"ok": True, "code": 0, "output": "[docai] Daemon stopping.\n"}
+        if cmd not in ("scan", "render", "hook"):
+            return {"ok": False, "code": 2, "output": f"[docai] Unknown daemon command: {cmd}\n"}
+
+        from .cli import _defer_docs, _sync_docs
+        from .docs import update_docs
+
+        started = time.perf_counter()
+        buf = io.StringIO()
+        code = 0
+        with contextlib.redirect_stdout(buf):
+            changed = self.refresh()
+            if cmd == "hook" and args.get("staged"):
+                self.write_staged(args.get("format"))
+            elif cmd in ("scan", "hook"):
+                self.write_outputs(args.get("format"))
+                if cmd == "scan":
+                    print("[docai] Wrote repo_info.json")
+            if cmd == "hook" and args.get("defer"):
+                code = _defer_docs(use_cache=args.get("use_cache", True), start=self.root, started=started)
+            elif cmd == "hook":
+                code = _sync_docs(use_cache=args.get("use_cache", True), start=self.root)
+            elif cmd == "render":
+                update_docs(self.root, use_cache=args.get("use_cache", True))
+        return {"ok": True, "code": code, "output": buf.getvalue(), "changed_files": changed}
+
+    def _start_watcher(self):
+        if Observer is None:
+            return None
+        self._flag = _ChangeFlag()
+        observer = Observer()
+        observer.schedule(self._flag, str(self.root), recursive=True)
+        observer.daemon = True
+        observer.start()
+        return observer
+
+    def serve(self) -> None:
+        """Bind the socket and serve requests until a stop request arrives."""
+        path = socket_path(self.root)
+        if path is None:
+            raise RuntimeError(f"no private directory for the daemon socket of {self.root}; set XDG_RUNTIME_DIR")
+        if request(self.root, "ping", timeout=2.0) is not None:
+            raise RuntimeError(f"a docai daemon is already serving {self.root}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.unlink(missing_ok=True)
+        self.refresh()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(str(path))
+        os.chmod(path, 0o600)
+        server.listen(8)
+        server.setblocking(False)
+        observer = self._start_watcher()
+        sel = selectors.DefaultSelector()
+        sel.register(server, selectors.EVENT_READ)
+        mode = "watchdog" if observer else f"polling every {self.interval:g}s"
+        print(f"[docai] Daemon serving {self.root} on {path} ({len(self.files)} files, {mode})")
+        self._running = True
+        try:
+            while self._running:
+                if not sel.select(timeout=self.interval):
+                    if self._flag is None or self._flag.dirty.is_set():
+                        if self._flag is not None:
+                            self._flag.dirty.clear()
+                        self.refresh()
+                    continue
+                conn, _ = server.accept()
+                with conn:
+                    conn.setblocking(True)
+                    self._serve_one(conn)
+        finally:
+            sel.close()
+            server.close()
+            path.unlink(missing_ok=True)
+            if observer is not None:
+                observer.stop()
+            self.cache.save(prune=False)
+
+    def _serve_one(self, conn: socket.socket) -> None:
+        with conn.makefile("rb") as f:
+            line = f.readline()
+        try:
+            resp = self.handle(json.loads(line))
+        except Exception as e:
+            resp = {"ok": False, "code": 1, "output": f"[docai] Daemon error: {e}\n"}
+        try:
+            conn.sendall((json.dumps(resp) + "\n").encode("utf-8"))
+        except OSError:
+            pass
+
+
+def run_daemon(root: Path, interval: float = 1.0, use_cache: bool = True, jobs: int | None = None) -> int:
+    if not supported():
+        print("[docai] The daemon needs Unix domain sockets, which this platform lacks.")
+        return 1
+    try:
+        Daemon(root, interval=interval, use_cache=use_cache, jobs=jobs).serve()
+    except RuntimeError as e:
+        print(f"[docai] {e}")
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
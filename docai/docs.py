@@ -1,26 +1,209 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import os
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, TextIO
 
-from .util import repo_root, read_json
+from . import trace
+from .cache import ResponseCache
+from .packing import PACK_INSTRUCTION, pack_payload, pack_prompt, plan_packs, split_response
+from .payload import CHARS_PER_TOKEN, compact_payload, estimate_tokens, truncate_payload
+from .store import RepoView, open_repo
+from .summaries import SummaryStore, children_payload, group_children, package_levels, package_tree
+from .util import fingerprint, load_project_config, repo_root, read_json, state_dir, write_json
 
-try:
-    import google.generativeai as genai  # type: ignore
-except Exception:  # pragma: no cover
-    genai = None  # type: ignore
+if TYPE_CHECKING:  # pragma: no cover
+    from .llm import LLMBackend
 
 
 def _ensure_dir(p: Path) -> None:
     p.mkdir(parents=True, exist_ok=True)
 
 
-def _write_text(path: Path, text: str) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    tmp = path.with_suffix(path.suffix + ".tmp")
-    tmp.write_text(text, encoding="utf-8")
-    tmp.replace(path)
+def _file_digest(path: Path) -> str | None:
+    if not path.exists():
+        return None
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class _AtomicWriter:
+    """Stream text to a temp file, then replace the target only if the content changed.
+
+    Unchanged files keep their mtime, so static-site builds and file watchers
+    are not triggered needlessly. The temp file sits next to the target
+    unless tmp_dir is given.
+    """
+
+    def __init__(self, path: Path, tmp_suffix: str = ".tmp", tmp_dir: Path | None = None):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        if tmp_dir is None:
+            self.tmp = path.with_suffix(path.suffix + tmp_suffix)
+        else:
+            tmp_dir.mkdir(parents=True, exist_ok=True)
+            self.tmp = tmp_dir / (path.name + tmp_suffix)
+        self._fh = self.tmp.open("w", encoding="utf-8", newline="")
+        self._hash = hashlib.sha256()
+        self.changed = False
+
+    def write(self, text: str) -> None:
+        self._fh.write(text)
+        self._hash.update(text.encode("utf-8"))
+
+    def flush(self) -> None:
+        self._fh.flush()
+
+    def close(self) -> bool:
+        self._fh.close()
+        if _file_digest(self.path) == self._hash.hexdigest():
+            self.tmp.unlink(missing_ok=True)
+            self.changed = False
+        else:
+            self.tmp.replace(self.path)
+            self.changed = True
+        return self.changed
+
+    def discard(self) -> None:
+        """Drop the temp file and leave the target untouched."""
+        self._fh.close()
+        self.tmp.unlink(missing_ok=True)
+
+    def __enter__(self) -> "_AtomicWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def _write_text(path: Path, text: str) -> bool:
+    """Atomically write text unless the file already has it. Returns True if written."""
+    with _AtomicWriter(path) as w:
+        w.write(text)
+    return w.changed
+
+
+_TRUNCATED = "\n\n<!-- docai: response truncated at the streaming budget -->\n"
+
+
+class _StreamTarget:
+    """A docs file that an LLM response is streamed into as it arrives.
+
+    Chunks go to <name>.part in tmp_dir (outside docs/) and are flushed as
+    they come, so progress is visible on disk; the target is replaced
+    atomically (and only if changed) once the response ends. This is about
+    latency, not memory: the full text is also returned for the response
+    cache. max_chars and max_seconds (0 = unlimited) stop the response early;
+    the text received so far is kept, marked as truncated and not cached.
+    Empty, failed or abandoned responses leave the target as it was.
+    """
+
+    def __init__(self, path: Path, tmp_dir: Path, max_chars: int = 0, max_seconds: float = 0):
+        self.path = path
+        self.tmp_dir = tmp_dir
+        self.max_chars = max_chars
+        self.max_seconds = max_seconds
+        self.changed = False
+        #: The returned text is what the target now holds
+        self.committed = False
+        self.truncated = False
+        #: Seconds until the first chunk arrived
+        self.first_chunk: float | None = None
+        self._lock = threading.Lock()
+        self._abandoned = False
+
+    def abandon(self) -> None:
+        """The caller has given up on this response; it will never replace the target."""
+        with self._lock:
+            self._abandoned = True
+
+    def _commit(self, w: _AtomicWriter) -> bool:
+        # Under the lock, so a response cannot land after abandon() has returned
+        with self._lock:
+            if self._abandoned:
+                w.discard()
+                return False
+            self.changed = w.close()
+            self.committed = True
+            return True
+
+    def write_all(self, text: str) -> None:
+        w = _AtomicWriter(self.path, ".part", self.tmp_dir)
+        w.write(text)
+        self._commit(w)
+
+    def consume(self, chunks: Iterator[str]) -> str:
+        """Write chunks to the target and return the text written ("" if nothing was)."""
+        t0 = time.monotonic()
+        w = _AtomicWriter(self.path, ".part", self.tmp_dir)
+        pieces: list[str] = []
+        size = 0
+        try:
+            with trace.span("llm_stream", cat="llm", path=self.path.name):
+                for chunk in chunks:
+                    if self._abandoned:
+                        break
+                    if not chunk:
+                        continue
+                    if not pieces:
+                        self.first_chunk = time.monotonic() - t0
+                    if self.max_chars and size + len(chunk) >= self.max_chars:
+                        chunk = chunk[: self.max_chars - size]
+                        self.truncated = True
+                    w.write(chunk)
+                    w.flush()
+                    pieces.append(chunk)
+                    size += len(chunk)
+                    if self.max_seconds and time.monotonic() - t0 >= self.max_seconds:
+                        self.truncated = True
+                    if self.truncated:
+                        break
+        except BaseException:
+            w.discard()
+            raise
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                # Stops the backend's stream, e.g. closes its HTTP connection
+                close()
+        if self.truncated and pieces:
+            pieces.append(_TRUNCATED)
+            w.write(_TRUNCATED)
+        text = "".join(pieces)
+        if not text.strip() or not self._commit(w):
+            w.discard()
+            return ""
+        return text
+
+
+def _stream_targets(root: Path, docs: Path, keys: Iterable[str]) -> Dict[str, _StreamTarget]:
+    """Stream targets for whole-document requests when llm_stream is enabled in .docai.json."""
+    cfg = load_project_config(root)
+    if not cfg.get("llm_stream"):
+        return {}
+    files = {"overview": "overview.md", "readme": "readme.md"}
+    return {
+        k: _StreamTarget(
+            docs / files[k],
+            state_dir(root) / "tmp",
+            max_chars=int(cfg.get("llm_stream_max_chars", 0)),
+            max_seconds=float(cfg.get("llm_stream_max_seconds", 0)),
+        )
+        for k in keys
+        if k in files
+    }
+
 
 def _load_bundled_prompts() -> Dict[str, str]:
     # Load prompt templates shipped within this package
@@ -41,12 +224,22 @@ def _load_bundled_prompts() -> Dict[str, str]:
             "Draft a README.md for the repository using the structured repo info (JSON).\n"
             "Include: Title, quick start, dependency notes, and a short roadmap. Keep it succinct.\n"
         ),
+        "module_summary": (
+            "Summarize what this Python module is for in 3-5 sentences: its responsibility,\n"
+            "main classes and functions, and how the rest of the project likely uses it.\n"
+        ),
+        "package_summary": (
+            "Summarize this Python package in one paragraph from the summaries of its modules\n"
+            "and sub-packages below: its responsibility and how its parts relate.\n"
+        ),
     }
     contents: Dict[str, str] = {}
     for key, fname in {
         "overview": "overview.txt",
         "api": "api.txt",
         "readme": "readme.txt",
+        "module_summary": "module_summary.txt",
+        "package_summary": "package_summary.txt",
     }.items():
         p = prompts_dir / fname
         try:
@@ -56,50 +249,688 @@ def _load_bundled_prompts() -> Dict[str, str]:
     return contents
 
 
+def _format_signature(fn: Dict[str, Any]) -> str:
+    # args is now list of {name, annotation}
+    arg_list = []
+    for a in (fn.get('args') or []):
+        name = a.get('name')
+        ann = a.get('annotation')
+        arg_list.append(f"{name}: {ann}" if ann else f"{name}")
+    sig = f"({', '.join(arg_list)})"
+    ret = fn.get('returns')
+    ret_str = f" -> {ret}" if ret else ""
+    return f"{fn['name']}{sig}{ret_str}"
+
+
+def _render_module_section(info: Dict[str, Any]) -> str:
+    """Deterministic Markdown for one module of the API reference."""
+    lines = [f"## {info['module']}", ""]
+    if info.get("classes"):
+        lines += ["### Classes", ""]
+        for c in info["classes"]:
+            lines += [f"#### {c['name']}", "", c.get("summary", ""), ""]
+            for m in c.get("methods", []):
+                lines += [f"- {_format_signature(m)}: {m.get('summary','')}"]
+            lines.append("")
+    if info.get("functions"):
+        lines += ["### Functions", ""]
+        for fn in info["functions"]:
+            lines += [f"- {_format_signature(fn)}: {fn.get('summary','')}"]
+    lines.append("")
+    return "\n".join(lines)
+
+
+def _join_api_sections(sections: list[str]) -> str:
+    return "\n".join(["# API Reference", ""] + sections).strip() + "\n"
+
+
+def _modules(repo: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    return {f["module"]: f for f in repo.get("files", [])}
+
+
 def _render_api_markdown(repo: Dict[str, Any]) -> str:
-    lines = ["# API Reference", ""]
-    files = repo.get("files", [])
-    by_module: Dict[str, Dict[str, Any]] = {f["module"]: f for f in files}
-    for mod, info in sorted(by_module.items()):
-        lines += [f"## {mod}", ""]
-        if info.get("classes"):
-            lines += ["### Classes", ""]
-            for c in info["classes"]:
-                lines += [f"#### {c['name']}", "", c.get("summary", ""), ""]
-                methods = c.get("methods", [])
-                for m in methods:
-                    # args is now list of {name, annotation}
-                    arg_list = []
-                    for a in (m.get('args') or []):
-                        name = a.get('name')
-                        ann = a.get('annotation')
-                        arg_list.append(f"{name}: {ann}" if ann else f"{name}")
-                    sig = f"({', '.join(arg_list)})"
-                    ret = m.get('returns')
-                    ret_str = f" -> {ret}" if ret else ""
-                    lines += [f"- {m['name']}{sig}{ret_str}: {m.get('summary','')}"]
-                lines.append("")
-        if info.get("functions"):
-            lines += ["### Functions", ""]
-            for fn in info["functions"]:
-                arg_list = []
-                for a in (fn.get('args') or []):
-                    name = a.get('name')
-                    ann = a.get('annotation')
-                    arg_list.append(f"{name}: {ann}" if ann else f"{name}")
-                sig = f"({', '.join(arg_list)})"
-                ret = fn.get('returns')
-                ret_str = f" -> {ret}" if ret else ""
-                lines += [f"- {fn['name']}{sig}{ret_str}: {fn.get('summary','')}"]
-        lines.append("")
-    return "\n".join(lines).strip() + "\n"
-
-
-def update_docs(start: str | Path | None = None) -> bool:
+    by_module = _modules(repo)
+    return _join_api_sections([_render_module_section(by_module[m]) for m in sorted(by_module)])
+
+
+def _write_joined(fh: TextIO, pieces: Iterable[str]) -> None:
+    """Stream the equivalent of fh.write("\\n".join(pieces).rstrip() + "\\n").
+
+    Only the trailing whitespace of the latest piece is held back, so memory
+    does not grow with the number of pieces.
+    """
+    pending = ""
+    for i, piece in enumerate(pieces):
+        if i:
+            pending += "\n"
+        body = piece.rstrip()
+        if body:
+            fh.write(pending + body)
+            pending = piece[len(body):]
+        else:
+            pending += piece
+    fh.write("\n")
+
+
+def _api_pieces(sections: Iterable[str]) -> Iterable[str]:
+    yield "# API Reference"
+    yield ""
+    yield from sections
+
+
+_API_SECTIONS_VERSION = 2
+
+_API_MODULE_INSTRUCTION = (
+    "\nDocument only the module in the JSON below, as a single Markdown section "
+    "that starts with the level-2 heading `## <module name>`.\n"
+)
+
+
+def _read_sections(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Parse api_sections.jsonl: a {version, source} header, then one record per module in sorted order.
+
+    Yields nothing for another version and stops at the first malformed line.
+    """
+    for i, line in enumerate(lines):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return
+        if not isinstance(record, dict) or (i == 0 and record.get("version") != _API_SECTIONS_VERSION):
+            return
+        yield record
+
+
+def _section_line(record: Dict[str, Any]) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+class _ApiPlan:
+    """Per-module regeneration plan for api_reference.md.
+
+    Each module section is stored as one line of .docai/api_sections.jsonl
+    with the module hash (see docai.fingerprints) of the FileInfo it was
+    rendered from. Only modules whose hash changed (or whose previous Gemini
+    call failed) are rendered again; the rest are streamed back from the
+    stored sections, so only the per-module hashes are held in memory.
+    """
+
+    def __init__(self, root: Path, repo: RepoView, source: str):
+        self.path = state_dir(root) / "api_sections.jsonl"
+        self.repo = repo
+        self.source = source
+        self.previous: Dict[str, Dict[str, Any]] = {
+            r["module"]: {"fingerprint": r.get("fingerprint"), "fallback": r.get("fallback")}
+            for r in self._stored()
+        }
+        self.fingerprints = repo.module_hashes()
+        self.modules = sorted(self.fingerprints)
+        self.stale = [
+            m for m in self.modules
+            if (self.previous.get(m) or {}).get("fingerprint") != self.fingerprints[m]
+            or (self.previous.get(m) or {}).get("fallback")
+        ]
+
+    def _stored(self) -> Iterator[Dict[str, Any]]:
+        """Stored section records for this source, in module order."""
+        try:
+            fh = self.path.open(encoding="utf-8")
+        except OSError:
+            return
+        with fh:
+            records = _read_sections(fh)
+            header = next(records, None)
+            if header is not None and header.get("source") == self.source:
+                yield from (r for r in records if "module" in r and "text" in r)
+
+    def requests(self, prompt: str) -> Dict[str, tuple[str, Dict[str, Any]]]:
+        return {
+            f"api:{m}": (prompt + _API_MODULE_INSTRUCTION, {"root": self.repo.root, "files": [self.repo.get(m)]})
+            for m in self.stale
+        }
+
+    def assemble(self, outputs: Dict[str, str] | None = None) -> None:
+        with trace.span("render_api", stale=len(self.stale)):
+            self._assemble(outputs or {})
+
+    def _render(self, m: str, text: str) -> Dict[str, Any]:
+        entry: Dict[str, Any] = {"module": m, "fingerprint": self.fingerprints[m]}
+        if text:
+            entry["text"] = text + "\n"
+        else:
+            entry["text"] = _render_module_section(self.repo.get(m))
+            if self.source != "deterministic":
+                # Retry Gemini for this module next time
+                entry["fallback"] = True
+        return entry
+
+    def _assemble(self, outputs: Dict[str, str]) -> None:
+        # Superseded by the JSONL store
+        (self.path.parent / "api_sections.json").unlink(missing_ok=True)
+        if not self.stale and set(self.previous) == set(self.modules):
+            return
+        failed = 0
+        stored = self._stored()
+        record = next(stored, None)
+        with _AtomicWriter(self.path) as w:
+            w.write(_section_line({"version": _API_SECTIONS_VERSION, "source": self.source}))
+            for m in self.modules:
+                while record is not None and record["module"] < m:
+                    record = next(stored, None)
+                if m in self.stale or record is None or record["module"] != m:
+                    entry = self._render(m, outputs.get(f"api:{m}", "").strip())
+                    failed += bool(entry.get("fallback"))
+                else:
+                    entry = record
+                w.write(_section_line(entry))
+            stored.close()
+        if failed:
+            print(f"[docai] LLM API reference empty for {failed} module(s); using deterministic renderer.")
+
+    def write(self, docs: Path, layout: str = "single") -> bool:
+        """Stream the assembled reference into docs/. Returns True if any file changed.
+
+        layout "single" writes everything to api_reference.md; "per-module"
+        writes docs/api/<module>.md and makes api_reference.md an index.
+        Files left behind by the other layout are removed.
+        """
+        changed = False
+        api_dir = docs / "api"
+        keep = {f"{m}.md" for m in self.modules} if layout == "per-module" else set()
+        for stale in api_dir.glob("*.md"):
+            if stale.name not in keep:
+                stale.unlink()
+                changed = True
+        if layout != "per-module":
+            if api_dir.is_dir() and not any(api_dir.iterdir()):
+                api_dir.rmdir()
+            with _AtomicWriter(docs / "api_reference.md") as w:
+                _write_joined(w, _api_pieces(r["text"] for r in self._stored()))
+            return changed or w.changed
+        for r in self._stored():
+            with _AtomicWriter(api_dir / f"{r['module']}.md") as w:
+                _write_joined(w, [r["text"]])
+            changed |= w.changed
+        with _AtomicWriter(docs / "api_reference.md") as w:
+            _write_joined(w, _api_pieces(f"- [{m}](api/{m}.md)" for m in self.modules))
+        return changed or w.changed
+
+
+_OVERVIEW_FROM_SUMMARIES = (
+    "\nThe outline below holds summaries of the project's top-level packages and "
+    "modules rather than raw code.\n"
+)
+
+
+class _OverviewPlan:
+    """Flat or hierarchical (map-reduce) generation of overview.md.
+
+    overview_mode in .docai.json: "flat" sends the whole outline in one
+    request; "hierarchical" summarizes modules, then packages bottom-up, then
+    writes the overview from the top-level summaries; "auto" (default) picks
+    hierarchical once the outline exceeds prompt_token_budget. Intermediate
+    summaries are cached in .docai/summaries.json by input fingerprint.
+    Packages with more child summaries than fit the budget are reduced in
+    parts first (see _fit).
+    """
+
+    #: Reduce passes per package before oversized children are left to truncation
+    MAX_PASSES = 8
+
+    def __init__(self, root: Path, repo: RepoView, prompts: Dict[str, str], model):
+        cfg = load_project_config(root)
+        mode = cfg.get("overview_mode", "auto")
+        self.budget = int(cfg.get("prompt_token_budget", 24000))
+        if mode == "auto":
+            mode = "hierarchical" if estimate_tokens(compact_payload(repo)) > self.budget else "flat"
+        self.hierarchical = mode == "hierarchical"
+        self.root = root
+        self.repo = repo
+        self.prompts = prompts
+        self.hashes = repo.module_hashes()
+        # "mod:<module>" and "pkg:<package>": pkg.py and a pkg/ package share a dotted name
+        self.summaries: Dict[str, str] = {}
+        self.store = SummaryStore(
+            root,
+            _api_source(model, prompts.get("module_summary", "") + prompts.get("package_summary", "")),
+        )
+        self._keys: Dict[str, str] = {}
+
+    def requests(self) -> Dict[str, tuple[str, Any]]:
+        """First-round requests: the flat overview, or summaries of changed modules."""
+        if not self.hierarchical:
+            return {"overview": (self.prompts.get("overview", ""), self.repo)}
+        prompt = self.prompts.get("module_summary", "") + _API_MODULE_INSTRUCTION
+        out: Dict[str, tuple[str, Any]] = {}
+        for m in sorted(self.hashes):
+            key = self._keys[m] = fingerprint(["module", prompt, self.hashes[m]])
+            cached = self.store.get(key)
+            if cached is not None:
+                self.summaries[f"mod:{m}"] = cached
+            else:
+                out[f"msum:{m}"] = (prompt, {"root": self.repo.root, "files": [self.repo.get(m)]})
+        return out
+
+    def finish(
+        self,
+        model,
+        outputs: Dict[str, str],
+        cache: ResponseCache | None,
+        streams: Dict[str, _StreamTarget] | None = None,
+    ) -> str:
+        """Reduce summaries up to the overview; returns "" if the overview call failed."""
+        if not self.hierarchical:
+            return outputs.get("overview", "")
+        with trace.span("overview_reduce"):
+            for m in sorted(self.hashes):
+                if f"mod:{m}" in self.summaries:
+                    continue
+                text = _strip_heading(outputs.get(f"msum:{m}", ""))
+                if text:
+                    self.store.put(self._keys[m], text)
+                self.summaries[f"mod:{m}"] = text or (self.repo.get(m) or {}).get("summary", "")
+            tree = package_tree(self.hashes)
+            for level in package_levels(tree):
+                self._summarize_packages(model, tree, level, cache)
+            top = self._children(tree, "")
+            prompt = self.prompts.get("overview", "") + _OVERVIEW_FROM_SUMMARIES
+            key = fingerprint(["overview", prompt, top])
+            text = self.store.get(key)
+            if text is None:
+                top = self._fit(model, cache, prompt, {"": ("Project", top)})[""]
+                out = _generate_all(
+                    model, {"overview": (prompt, children_payload("Project", top))}, self.root, cache, streams
+                )
+                text = out["overview"]
+                if text.strip():
+                    self.store.put(key, text)
+            self.store.save()
+        return text
+
+    def _children(self, tree: Dict[str, Any], pkg: str) -> list[tuple[str, str]]:
+        node = tree[pkg]
+        return [(f"package {p}", self.summaries[f"pkg:{p}"]) for p in node["packages"]] + [
+            (f"module {m}", self.summaries[f"mod:{m}"]) for m in node["modules"]
+        ]
+
+    def _summarize_packages(self, model, tree: Dict[str, Any], level: list[str], cache: ResponseCache | None) -> None:
+        prompt = self.prompts.get("package_summary", "")
+        pending: Dict[str, tuple[str, list[tuple[str, str]]]] = {}
+        keys: Dict[str, str] = {}
+        for pkg in level:
+            children = self._children(tree, pkg)
+            if len(children) == 1:
+                # Nothing to combine; a single child's summary stands for the package
+                self.summaries[f"pkg:{pkg}"] = children[0][1]
+                continue
+            key = keys[pkg] = fingerprint(["package", prompt, pkg, children])
+            cached = self.store.get(key)
+            if cached is not None:
+                self.summaries[f"pkg:{pkg}"] = cached
+            else:
+                pending[pkg] = (f"Package {pkg}", children)
+        fitted = self._fit(model, cache, prompt, pending) if pending else {}
+        requests = {
+            f"psum:{pkg}": (prompt, children_payload(title, fitted[pkg])) for pkg, (title, _) in pending.items()
+        }
+        out = _generate_all(model, requests, self.root, cache) if requests else {}
+        for k, text in out.items():
+            pkg = _module_of(k)
+            text = text.strip()
+            if text:
+                self.store.put(keys[pkg], text)
+                self.summaries[f"pkg:{pkg}"] = text
+            else:
+                names = ", ".join(name for name, _ in self._children(tree, pkg))
+                self.summaries[f"pkg:{pkg}"] = f"Package {pkg} containing {names}"
+
+
+    def _fit(
+        self,
+        model,
+        cache: ResponseCache | None,
+        prompt: str,
+        items: Dict[str, tuple[str, list[tuple[str, str]]]],
+    ) -> Dict[str, list[tuple[str, str]]]:
+        """Reduce each item's children until children_payload fits prompt_token_budget.
+
+        items maps a name to (title, children). Children that do not fit are
+        split into groups that do, and every group of two or more becomes
+        one "part" summary (cached like the others). All items' parts for
+        one pass go out in a single _generate_all. Returns name -> children.
+        """
+        part_prompt = self.prompts.get("package_summary", "") + _PART_INSTRUCTION
+        budget = max(1, self.budget - estimate_tokens(part_prompt) - estimate_tokens(prompt))
+        current = {name: list(children) for name, (_, children) in items.items()}
+        for _ in range(self.MAX_PASSES):
+            # name -> [(label, text or None while requested, request key, store key, group)]
+            plans: Dict[str, list[tuple[str, str | None, str, str, list[tuple[str, str]]]]] = {}
+            requests: Dict[str, tuple[str, Any]] = {}
+            for name, children in current.items():
+                title = items[name][0]
+                if len(children) < 2 or estimate_tokens(children_payload(title, children)) <= budget:
+                    continue
+                groups = group_children(children, budget - estimate_tokens(title))
+                if len(groups) == len(children):
+                    # Every child is over budget alone; the payload budget truncates them
+                    continue
+                plan = plans[name] = []
+                for i, group in enumerate(groups):
+                    if len(group) == 1:
+                        plan.append((group[0][0], group[0][1], "", "", group))
+                        continue
+                    label = f"{title}, part {i + 1} of {len(groups)}"
+                    key = fingerprint(["part", part_prompt, label, group])
+                    request = f"part:{name or '(project)'}#{i}"
+                    cached = self.store.get(key)
+                    if cached is None:
+                        requests[request] = (part_prompt, children_payload(label, group))
+                    plan.append((label, cached, request, key, group))
+            if not plans:
+                break
+            out = _generate_all(model, requests, self.root, cache) if requests else {}
+            for name, plan in plans.items():
+                reduced: list[tuple[str, str]] = []
+                for label, text, request, key, group in plan:
+                    if text is None:
+                        text = out.get(request, "").strip()
+                        if text:
+                            self.store.put(key, text)
+                        else:
+                            text = "Covers " + ", ".join(child for child, _ in group)
+                    reduced.append((label, text))
+                current[name] = reduced
+        return current
+
+
+_PART_INSTRUCTION = (
+    "\nThe outline below is only one part of this package's contents; summarize "
+    "that part, it will be combined with the others later.\n"
+)
+
+
+def _strip_heading(text: str) -> str:
+    # Per-module answers start with "## <module>"; the summary is what follows
+    lines = text.strip().splitlines()
+    if lines and lines[0].startswith("#"):
+        lines = lines[1:]
+    return "\n".join(lines).strip()
+
+
+def _api_layout(root: Path) -> str:
+    return load_project_config(root).get("api_layout", "single")
+
+
+def _api_source(model, prompt: str) -> str:
+    if not model:
+        return "deterministic"
+    return f"{model.label.lower()}:{model.name}:{fingerprint(prompt)[:16]}"
+
+
+def _response_cache(root: Path, enabled: bool = True) -> ResponseCache:
+    cfg = load_project_config(root)
+    return ResponseCache(
+        root,
+        max_bytes=int(float(cfg.get("llm_cache_max_mb", 64)) * 1024 * 1024),
+        max_age_days=float(cfg.get("llm_cache_max_age_days", 30)),
+        enabled=enabled,
+    )
+
+
+_ARTIFACT_LABELS = {"overview": "overview", "readme": "README"}
+
+
+# Set by shared_llm_limit() so concurrent runs over several repositories
+# (`docai batch`) share one cap on in-flight Gemini calls.
+_shared_slots: threading.BoundedSemaphore | None = None
+
+
+@contextmanager
+def shared_llm_limit(limit: int) -> Iterator[None]:
+    """Cap in-flight Gemini calls across every _generate_all in the block."""
+    global _shared_slots
+    _shared_slots = threading.BoundedSemaphore(max(1, limit))
+    try:
+        yield
+    finally:
+        _shared_slots = None
+
+
+def _generate_all(
+    model,
+    requests: Dict[str, tuple[str, Any]],
+    root: Path,
+    cache: ResponseCache | None = None,
+    streams: Dict[str, _StreamTarget] | None = None,
+) -> Dict[str, str]:
+    """Run independent Gemini generations concurrently.
+
+    requests maps a key to (prompt, payload). Concurrency and the per-call
+    timeout come from llm_concurrency and llm_timeout in .docai.json (or the
+    shared_llm_limit() in effect). Small per-module requests are packed
+    into shared calls up to pack_token_budget; modules missing from a packed
+    response are retried individually. Calls that fail or time out yield "",
+    leaving the caller's deterministic fallback in place. Requests with a
+    stream target in streams are streamed straight into their docs file.
+    """
+    if not requests:
+        return {}
+    cfg = load_project_config(root)
+    limit = max(1, int(cfg.get("llm_concurrency", 3)))
+    timeout = float(cfg.get("llm_timeout", 120))
+    with trace.span("prompt_build", requests=len(requests)):
+        payloads = _serialize_payloads(requests, int(cfg.get("prompt_token_budget", 24000)))
+        calls, packs = _pack_calls(requests, payloads, int(cfg.get("pack_token_budget", 8000)))
+    suffix = f" in {len(calls)} request{'s' if len(calls) != 1 else ''}" if packs else ""
+    print(f"[docai] Generating {_describe_requests(requests)} with {model.label}{suffix}...")
+    results = _run_calls(model, calls, cache, limit, timeout, streams)
+
+    retry: Dict[str, tuple[str, str]] = {}
+    for pack_key, keys in packs.items():
+        with trace.span("split_pack", modules=len(keys)):
+            sections = split_response(results.pop(pack_key, ""), [_module_of(k) for k in keys])
+        for k in keys:
+            text = sections.get(_module_of(k))
+            if text:
+                results[k] = text + "\n"
+            else:
+                retry[k] = (requests[k][0], payloads[k])
+    if retry:
+        print(f"[docai] Packed response incomplete for {len(retry)} module(s); retrying individually.")
+        results.update(_run_calls(model, retry, cache, limit, timeout))
+    return {k: results.get(k, "") for k in requests}
+
+
+def _module_of(key: str) -> str:
+    # "api:pkg.mod" / "msum:pkg.mod" -> "pkg.mod"
+    return key.split(":", 1)[1]
+
+
+def _pack_calls(
+    requests: Dict[str, tuple[str, Any]],
+    payloads: Dict[str, str],
+    budget: int,
+) -> tuple[Dict[str, tuple[str, str]], Dict[str, list[str]]]:
+    """Turn requests into calls, packing per-module requests where they fit.
+
+    A request is per-module when its key is "<kind>:<module>" and its prompt
+    ends with _API_MODULE_INSTRUCTION; only requests sharing a prompt are packed.
+
+    Returns (calls, packs): calls maps a call key to (prompt, payload text);
+    packs maps each packed call key to the request keys it answers.
+    """
+    calls = {k: (requests[k][0], payloads[k]) for k in requests}
+    packable = [k for k in requests if ":" in k and requests[k][0].endswith(_API_MODULE_INSTRUCTION)]
+    if budget <= 0 or len(packable) < 2:
+        return calls, {}
+    by_base: Dict[str, list[str]] = {}
+    for k in packable:
+        by_base.setdefault(requests[k][0][: -len(_API_MODULE_INSTRUCTION)], []).append(k)
+    packs: Dict[str, list[str]] = {}
+    for base, keys in by_base.items():
+        sizes = {k: estimate_tokens(payloads[k]) + estimate_tokens(k) for k in keys}
+        for group in plan_packs(sizes, budget, estimate_tokens(base + PACK_INSTRUCTION)):
+            if len(group) < 2:
+                continue
+            names = [_module_of(k) for k in group]
+            pack_key = f"pack:{len(packs)}"
+            calls[pack_key] = (pack_prompt(base, names), pack_payload([(n, payloads[k]) for n, k in zip(names, group)]))
+            for k in group:
+                del calls[k]
+            packs[pack_key] = group
+    return calls, packs
+
+
+def _run_calls(
+    model,
+    calls: Dict[str, tuple[str, str]],
+    cache: ResponseCache | None,
+    limit: int,
+    timeout: float,
+    streams: Dict[str, _StreamTarget] | None = None,
+) -> Dict[str, str]:
+    """Run (prompt, payload) calls on at most `limit` daemon worker threads.
+
+    The timeout counts from when a call gets a slot. A call that times out is
+    abandoned (its result dropped) but keeps its slot until its thread ends, so
+    in-flight requests never exceed the limit, including the limit shared across projects in `docai batch`.
+    When every slot is held by hung calls, the calls still waiting for one
+    fall back too, once the run is past its overall deadline (every call
+    taking the full timeout, plus one) and nothing has started or finished
+    for a whole timeout.
+    """
+    from collections import deque
+
+    slots = _shared_slots or threading.BoundedSemaphore(limit)
+    cond = threading.Condition()
+    queued = deque(calls)
+    started: Dict[str, float] = {}
+    finished: set[str] = set()
+    abandoned: set[str] = set()
+    starved: set[str] = set()
+    results: Dict[str, str] = {}
+    errors: Dict[str, Exception] = {}
+    progress = [time.monotonic()]
+    deadline = progress[0] + timeout * (-(-len(calls) // max(1, limit)) + 1)
+
+    def _worker() -> None:
+        while True:
+            with cond:
+                if not queued:
+                    return
+                key = queued.popleft()
+            _run(key)
+
+    def _run(key: str) -> None:
+        slots.acquire()
+        with cond:
+            if key in starved:
+                slots.release()
+                return
+            started[key] = progress[0] = time.monotonic()
+            cond.notify_all()
+        text = ""
+        try:
+            with trace.span("gemini_call", cat="llm", key=key):
+                text = _call_gemini(model, calls[key][0], calls[key][1], cache, timeout, (streams or {}).get(key))
+        except Exception as e:
+            errors[key] = e
+        finally:
+            with cond:
+                if key not in abandoned:
+                    results[key] = text
+                finished.add(key)
+                progress[0] = time.monotonic()
+                cond.notify_all()
+            slots.release()
+
+    # A fixed set of daemon threads (not a ThreadPoolExecutor, whose threads are joined at exit), so a
+    # hung request cannot keep the process alive past its timeout
+    for i in range(min(max(1, limit), len(calls))):
+        threading.Thread(target=_worker, name=f"docai-llm-{i}", daemon=True).start()
+    with cond:
+        while True:
+            now = time.monotonic()
+            for k, t0 in started.items():
+                if k not in finished and k not in abandoned and now - t0 >= timeout:
+                    # Stop waiting for the hung call; it holds its slot until it ends
+                    abandoned.add(k)
+                    if k in (streams or {}):
+                        # Before the caller writes its fallback
+                        streams[k].abandon()
+            running = [k for k in calls if k not in finished and k not in abandoned]
+            if not running:
+                break
+            waits = [started[k] + timeout - now for k in running if k in started]
+            if not waits:
+                # Nothing of ours is in flight: the slots are held by hung calls
+                give_up = max(deadline, progress[0] + timeout)
+                if now >= give_up:
+                    starved.update(running)
+                    abandoned.update(running)
+                    queued.clear()
+                    for k in running:
+                        if k in (streams or {}):
+                            streams[k].abandon()
+                    break
+                waits = [give_up - now]
+            cond.wait(min(waits))
+    from .scheduler import CircuitOpenError
+
+    rejected = 0
+    for k in calls:
+        if k in starved:
+            label = _ARTIFACT_LABELS.get(k, k)
+            print(f"[docai] {model.label} {label} got no free slot within {timeout:g}s; using fallback.")
+        elif k in abandoned:
+            print(f"[docai] {model.label} {_ARTIFACT_LABELS.get(k, k)} timed out after {timeout:g}s; using fallback.")
+        elif isinstance(errors.get(k), CircuitOpenError):
+            rejected += 1
+        elif k in errors:
+            print(f"[docai] {model.label} {_ARTIFACT_LABELS.get(k, k)} failed: {errors[k]}; using fallback.")
+    if rejected:
+        print(f"[docai] {model.label} circuit breaker open after repeated failures; {rejected} request(s) stopped, using fallback.")
+    return {k: results.get(k, "") for k in calls}
+
+
+def _serialize_payloads(requests: Dict[str, tuple[str, Any]], budget: int) -> Dict[str, str]:
+    """Compact each request payload to fit the per-prompt token budget and report the savings.
+
+    Payloads that are already text (e.g. child summaries) are cut to the budget.
+    """
+    out: Dict[str, str] = {}
+    before = after = 0
+    for key, (prompt, payload) in requests.items():
+        if isinstance(payload, str):
+            text = truncate_payload(payload, max(0, budget - estimate_tokens(prompt)))
+        else:
+            text = compact_payload(payload, max(0, budget - estimate_tokens(prompt)))
+        before += payload.size() // CHARS_PER_TOKEN if isinstance(payload, RepoView) else estimate_tokens(str(payload))
+        after += estimate_tokens(text)
+        out[key] = text
+    print(f"[docai] Prompt payload: ~{before:,} -> ~{after:,} tokens")
+    return out
+
+
+def _describe_requests(requests: Dict[str, Any]) -> str:
+    labels = [_ARTIFACT_LABELS[k] for k in requests if k in _ARTIFACT_LABELS]
+    for prefix, label, unit in (
+        ("msum:", "module summaries", "module"),
+        ("psum:", "package summaries", "package"),
+        ("part:", "partial summaries", "part"),
+        ("api:", "API reference", "module"),
+    ):
+        n = sum(1 for k in requests if k.startswith(prefix))
+        if n:
+            labels.append(f"{label} ({n} {unit}{'s' if n != 1 else ''})")
+    return ", ".join(labels)
+
+
+def update_docs(start: str | Path | None = None, use_cache: bool = True) -> bool:
     """Update docs using repo_info.json. Returns True if files changed."""
     root = repo_root(Path(start) if start else None)
-    repo = read_json(root / "repo_info.json")
-    if not repo:
+    repo = open_repo(root)
+    if repo is None:
         return False
     docs = root / "docs"
     _ensure_dir(docs)
@@ -108,108 +939,130 @@ def update_docs(start: str | Path | None = None) -> bool:
     prompts = _load_bundled_prompts()
 
     # Compute new contents
-    api_md_det = _render_api_markdown(repo)
-    overview_md = "# Overview\n\n" + (repo.get("files") and "Auto-generated overview." or "") + "\n"
+    overview_md = "# Overview\n\n" + (repo.modules() and "Auto-generated overview." or "") + "\n"
     readme_md = "# README\n\nProject README.\n"
+    plan = _ApiPlan(root, repo, _api_source(model, prompts.get("api", "")))
+    streams: Dict[str, _StreamTarget] = {}
 
     if model:
-        print("[docai] Updating docs with Gemini...")
-        over = _call_gemini(model, prompts.get("overview", ""), repo)
-        if over.strip():
-            overview_md = over
-        rd = _call_gemini(model, prompts.get("readme", ""), repo)
-        if rd.strip():
-            readme_md = rd
-        api_g = _call_gemini(model, prompts.get("api", ""), repo)
-        api_md = api_g if api_g.strip() else api_md_det
+        print(f"[docai] Updating docs with {model.label}...")
+        cache = _response_cache(root, use_cache)
+        overview = _OverviewPlan(root, repo, prompts, model)
+        requests = {"readme": (prompts.get("readme", ""), repo)}
+        requests.update(overview.requests())
+        requests.update(plan.requests(prompts.get("api", "")))
+        streams = _stream_targets(root, docs, ("overview", "readme"))
+        out = _generate_all(model, requests, root, cache, streams)
+        overview_text = overview.finish(model, out, cache, streams)
+        if overview_text.strip():
+            overview_md = overview_text
+        if out["readme"].strip():
+            readme_md = out["readme"]
+        plan.assemble(out)
+        _report_llm(root, cache)
     else:
-        api_md = api_md_det
+        plan.assemble()
 
-    # Existing files content
-    paths = {
-        "overview": docs / "overview.md",
-        "readme": docs / "readme.md",
-        "api": docs / "api_reference.md",
-    }
-    before_over = paths["overview"].read_text(encoding="utf-8") if paths["overview"].exists() else None
-    before_readme = paths["readme"].read_text(encoding="utf-8") if paths["readme"].exists() else None
-    before_api = paths["api"].read_text(encoding="utf-8") if paths["api"].exists() else None
+    # Only files whose content differs are rewritten
+    with trace.span("write_docs"):
+        changed = _write_doc(docs / "overview.md", overview_md, streams.get("overview"))
+        changed |= _write_doc(docs / "readme.md", readme_md, streams.get("readme"))
+        changed |= plan.write(docs, _api_layout(root))
+    return changed
 
-    _write_text(paths["overview"], overview_md)
-    _write_text(paths["readme"], readme_md)
-    _write_text(paths["api"], api_md)
 
-    changed = (before_over != overview_md) or (before_readme != readme_md) or (before_api != api_md)
-    return changed
+def _write_doc(path: Path, text: str, stream: _StreamTarget | None = None) -> bool:
+    """_write_text, unless the response was already streamed into path."""
+    if stream is not None and stream.committed:
+        return stream.changed
+    return _write_text(path, text)
 
 
-def _gemini_client():
-    if genai is None:
-        return None
-    # Only read API key from this package's root config.json
-    pkg_root = Path(__file__).resolve().parents[1]
-    api_key = None
-    model_name = None
-    try:
-        cfg = read_json(pkg_root / "config.json")
-        if isinstance(cfg, dict):
-            api_key = cfg.get("gemini_api_key") or cfg.get("GOOGLE_API_KEY")
-            model_name = cfg.get("gemini_model")
-    except Exception:
-        api_key = None
-        model_name = None
-    if not api_key:
-        return None
-    genai.configure(api_key=api_key)
-    try:
-        name = (model_name).strip()
-        print(f"[docai] Using Gemini model: {name}")
-        return genai.GenerativeModel(name)
-    except Exception:
+def _report_llm(root: Path, cache: ResponseCache) -> None:
+    """Print cache and scheduler statistics; the scheduler's metrics go to .docai/llm_metrics.json."""
+    from .scheduler import get_scheduler
+
+    scheduler = get_scheduler()
+    print(cache.stats_line())
+    print(scheduler.summary_line())
+    write_json(state_dir(root) / "llm_metrics.json", scheduler.metrics())
+
+
+def _gemini_client() -> LLMBackend | None:
+    """The configured LLM backend (see docai.llm), or None if none is usable.
+
+    The backend is built once per process and reused, so configuration is
+    read and connections are set up only on first use.
+    """
+    from .llm import get_backend
+
+    backend = get_backend()
+    if backend is None or not backend.name:
         return None
+    global _announced
+    if not _announced:
+        print(f"[docai] Using {backend.label} model: {backend.name}")
+        _announced = True
+    return backend
 
 
-def _call_gemini(model, prompt: str, json_payload: Dict[str, Any]) -> str:
-    try:
-        parts = [prompt, "\n\nJSON:\n", str(json_payload)]
-        resp = model.generate_content(parts)  # type: ignore
-        text = getattr(resp, "text", None)
-        if not text and hasattr(resp, "candidates") and resp.candidates:
-            text = resp.candidates[0].content.parts[0].text  # type: ignore
-        return text or ""
-    except Exception as e:
-        msg = str(e)
-        print(f"[docai] Gemini error: {msg}")
-        return ""
+_announced = False
+
+
+def _call_gemini(
+    model: LLMBackend,
+    prompt: str,
+    json_payload: Dict[str, Any] | str,
+    cache: ResponseCache | None = None,
+    timeout: float | None = None,
+    stream: _StreamTarget | None = None,
+) -> str:
+    payload = json_payload if isinstance(json_payload, str) else compact_payload(json_payload)
+    key = ""
+    if cache is not None:
+        key = cache.key(model.name, prompt, payload)
+        hit = cache.get(key)
+        if hit is not None:
+            if stream is not None:
+                stream.write_all(hit)
+            return hit
+    from .scheduler import get_scheduler
+
+    # Rate limits, retries and the circuit breaker live in the scheduler;
+    # errors that survive them propagate to the caller
+    scheduler = get_scheduler()
+    parts = [prompt, "\n\nRepository outline:\n", payload]
+    tokens = estimate_tokens(prompt) + estimate_tokens(payload)
+    if stream is not None:
+        text = scheduler.call(lambda t: stream.consume(model.stream(parts, timeout=t)), tokens, timeout)
+    else:
+        text = scheduler.call(lambda t: model.generate(parts, timeout=t), tokens, timeout)
+    scheduler.record_output(estimate_tokens(text or ""))
+    if stream is not None and stream.truncated:
+        print(f"[docai] {model.label} response for {stream.path.name} stopped at the streaming budget.")
+        return text
+    if cache is not None and text:
+        cache.put(key, text)
+    return text or ""
 
 
 def list_gemini_models() -> list[str]:
-    if genai is None:
-        return []
-    # Use package root config for API key
-    pkg_root = Path(__file__).resolve().parents[1]
-    cfg = read_json(pkg_root / "config.json") or {}
-    api_key = cfg.get("gemini_api_key") or cfg.get("GOOGLE_API_KEY")
-    if not api_key:
+    from .llm import get_backend
+
+    backend = get_backend()
+    if backend is None:
         return []
     try:
-        genai.configure(api_key=api_key)
-        models = genai.list_models()  # type: ignore
-        names: list[str] = []
-        for m in models:
-            name = getattr(m, "name", None)
-            if name:
-                names.append(name)
-        return names
+        return backend.list_models()
     except Exception:
         return []
 
 
-def generate_initial_docs(start: str | Path | None = None) -> bool:
+def generate_initial_docs(start: str | Path | None = None, use_cache: bool = True) -> bool:
     """Generate docs/ if missing. Returns True if files created/changed."""
     root = repo_root(Path(start) if start else None)
-    repo = read_json(root / "repo_info.json")
-    if not repo:
+    repo = open_repo(root)
+    if repo is None:
         return False
     docs = root / "docs"
     if docs.exists():
@@ -218,26 +1071,30 @@ def generate_initial_docs(start: str | Path | None = None) -> bool:
     model = _gemini_client()
     prompts = _load_bundled_prompts()
 
-    api_md = _render_api_markdown(repo)
+    plan = _ApiPlan(root, repo, _api_source(model, prompts.get("api", "")))
+    streams: Dict[str, _StreamTarget] = {}
 
     if model:
-        print("[docai] Generating overview with Gemini...")
-        overview_md = _call_gemini(model, prompts.get("overview", ""), repo) or "# Overview\n\nProject overview."
-        print("[docai] Generating README with Gemini...")
-        readme_md = _call_gemini(model, prompts.get("readme", ""), repo) or "# README\n\nGetting started."
-        # Use Gemini for API reference with fallback to deterministic renderer
-        print("[docai] Generating API reference with Gemini...")
-        api_md_gemini = _call_gemini(model, prompts.get("api", ""), repo)
-        if api_md_gemini.strip():
-            api_md = api_md_gemini
-        else:
-            print("[docai] Gemini API reference empty; using deterministic renderer.")
+        cache = _response_cache(root, use_cache)
+        overview = _OverviewPlan(root, repo, prompts, model)
+        requests = {"readme": (prompts.get("readme", ""), repo)}
+        requests.update(overview.requests())
+        requests.update(plan.requests(prompts.get("api", "")))
+        streams = _stream_targets(root, docs, ("overview", "readme"))
+        out = _generate_all(model, requests, root, cache, streams)
+        overview_md = overview.finish(model, out, cache, streams) or "# Overview\n\nProject overview."
+        readme_md = out["readme"] or "# README\n\nGetting started."
+        # Gemini per-module API sections, falling back to the deterministic renderer
+        plan.assemble(out)
+        _report_llm(root, cache)
     else:
+        plan.assemble()
         overview_md = "# Overview\n\nGemini not configured. Place a config.json with your API key in the tool's root folder.\n"
         readme_md = "# README\n\nInstall dependencies and run your project.\n"
 
     _ensure_dir(docs)
-    _write_text(docs / "overview.md", overview_md)
-    _write_text(docs / "readme.md", readme_md)
-    _write_text(docs / "api_reference.md", api_md)
+    with trace.span("write_docs"):
+        _write_doc(docs / "overview.md", overview_md, streams.get("overview"))
+        _write_doc(docs / "readme.md", readme_md, streams.get("readme"))
+        plan.write(docs, _api_layout(root))
     return True
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Iterable
+
+from .util import fingerprint, read_json
+
+# Hash tree of scan results:
+#   symbol hash  - one per class, method ("Class.method") and top-level function
+#   module hash  - module-level fields plus its symbol hashes
+#   root hash    - all module hashes
+# Equal root hashes mean nothing changed; otherwise only modules whose hash
+# differs need to be descended into. Same-named definitions (a property and
+# its setter, @overload variants, conditional redefinitions) are kept apart
+# as "name", "name#2", ... in source order.
+TREE_VERSION = 2
+
+
+def tree_path(json_path: Path) -> Path:
+    return json_path.with_suffix(".tree.json")
+
+
+def _without(d: Dict[str, Any], *keys: str) -> Dict[str, Any]:
+    return {k: v for k, v in d.items() if k not in keys}
+
+
+def _add_symbol(symbols: Dict[str, str], name: str, digest: str) -> None:
+    key, n = name, 1
+    while key in symbols:
+        n += 1
+        key = f"{name}#{n}"
+    symbols[key] = digest
+
+
+def module_tree(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Symbol hashes and the combined module hash for one FileInfo record."""
+    symbols: Dict[str, str] = {}
+    for c in info.get("classes") or []:
+        methods: Dict[str, str] = {}
+        for m in c.get("methods") or []:
+            _add_symbol(methods, f"{c['name']}.{m['name']}", fingerprint(m))
+        _add_symbol(symbols, c["name"], fingerprint([_without(c, "methods"), sorted(methods.items())]))
+        for name, digest in methods.items():
+            _add_symbol(symbols, name, digest)
+    for fn in info.get("functions") or []:
+        _add_symbol(symbols, fn["name"], fingerprint(fn))
+    own = _without(info, "classes", "functions")
+    return {"hash": fingerprint([own, sorted(symbols.items())]), "symbols": symbols}
+
+
+def root_hash(modules: Dict[str, Dict[str, Any]]) -> str:
+    return fingerprint(sorted((m, t["hash"]) for m, t in modules.items()))
+
+
+def build_tree(files: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    modules = {f["module"]: module_tree(f) for f in files}
+    return {"version": TREE_VERSION, "root": root_hash(modules), "modules": modules}
+
+
+def load_tree(json_path: Path) -> Dict[str, Any] | None:
+    try:
+        tree = read_json(tree_path(json_path))
+    except Exception:
+        return None
+    if not isinstance(tree, dict) or tree.get("version") != TREE_VERSION:
+        return None
+    return tree
+
+
+def diff_trees(old: Dict[str, Any] | None, new: Dict[str, Any]) -> Dict[str, Any]:
+    """Changed modules and symbols between two trees.
+
+    Returns {"added": [...], "removed": [...], "changed": {module: {"added",
+    "removed", "changed"}}}. Only modules with differing hashes are compared
+    symbol by symbol.
+    """
+    result: Dict[str, Any] = {"added": [], "removed": [], "changed": {}}
+    if old and old.get("root") == new.get("root"):
+        return result
+    old_mods = (old or {}).get("modules") or {}
+    new_mods = new.get("modules") or {}
+    result["added"] = sorted(m for m in new_mods if m not in old_mods)
+    result["removed"] = sorted(m for m in old_mods if m not in new_mods)
+    for m in sorted(set(old_mods) & set(new_mods)):
+        a, b = old_mods[m], new_mods[m]
+        if a["hash"] == b["hash"]:
+            continue
+        sa, sb = a.get("symbols") or {}, b.get("symbols") or {}
+        result["changed"][m] = {
+            "added": sorted(k for k in sb if k not in sa),
+            "removed": sorted(k for k in sa if k not in sb),
+            "changed": sorted(k for k in sa if k in sb and sa[k] != sb[k]),
+        }
+    return result
+
+
+def is_empty_diff(diff: Dict[str, Any]) -> bool:
+    return not (diff["added"] or diff["removed"] or diff["changed"])
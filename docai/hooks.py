@@ -8,7 +8,9 @@ from .util import repo_root
 
 HOOK_BODY = """#!/usr/bin/env sh
 # docai pre-commit hook
-# Scans repo and updates/generates docs. Aborts commit if docs changed.
+# Re-scans staged files and updates/generates docs. Aborts commit if docs changed.
+# When `docai daemon` is running, the hook is answered from its in-memory model.
+# With --defer it only scans and queues docs regeneration for the post-commit hook.
 
 if command -v docai >/dev/null 2>&1; then
   DOC_AI="docai"
@@ -16,7 +18,7 @@ else
   DOC_AI="python -m docai"
 fi
 
-$DOC_AI hook
+$DOC_AI hook --staged{flags}
 status=$?
 if [ $status -ne 0 ]; then
   echo "\n[docai] Commit aborted. Review and add updated docs before committing."
@@ -26,12 +28,39 @@ exit 0
 """
 
 
-def install_precommit_hook(start: str | Path | None = None) -> Path:
+POSTCOMMIT_BODY = """#!/usr/bin/env sh
+# docai post-commit hook
+# Drains the docs queue filled by `docai hook --defer` in a background worker,
+# so the commit returns immediately. Progress: `docai status`.
+
+ls .docai/queue/pending/*.json >/dev/null 2>&1 || exit 0
+
+if command -v docai >/dev/null 2>&1; then
+  DOC_AI="docai"
+else
+  DOC_AI="python -m docai"
+fi
+
+nohup $DOC_AI worker >> .docai/queue/worker.log 2>&1 &
+exit 0
+"""
+
+
+def _write_hook(start: str | Path | None, name: str, body: str) -> Path:
     root = repo_root(Path(start) if start else None)
     hooks = root / ".git" / "hooks"
     hooks.mkdir(parents=True, exist_ok=True)
-    hook = hooks / "pre-commit"
-    hook.write_text(HOOK_BODY, encoding="utf-8")
+    hook = hooks / name
+    hook.write_text(body, encoding="utf-8")
     mode = hook.stat().st_mode
     hook.chmod(mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
     return hook
+
+
+def install_precommit_hook(start: str | Path | None = None, deferred: bool = False) -> Path:
+    """Install the pre-commit hook; deferred hooks scan only and queue docs regeneration."""
+    return _write_hook(start, "pre-commit", HOOK_BODY.replace("{flags}", " --defer" if deferred else ""))
+
+
+def install_postcommit_hook(start: str | Path | None = None) -> Path:
+    return _write_hook(start, "post-commit", POSTCOMMIT_BODY)
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List
+
+from .fingerprints import load_tree
+from .util import fingerprint, git_tree, load_project_config, read_json, state_dir, write_json
+
+# Deferred doc regeneration. In deferred mode the pre-commit hook only scans
+# (the fast, deterministic part) and queues LLM-backed regeneration here; a
+# worker started by the post-commit hook (or `docai worker`) drains the queue.
+#
+#   .docai/queue/pending/<fingerprint>.json   waiting
+#   .docai/queue/running/<fingerprint>.json   claimed by the worker
+#   .docai/queue/done/<fingerprint>.json      finished (also failed/superseded)
+#   .docai/queue/worker.lock                  pid of the running worker
+#   .docai/queue/queue.lock                   held briefly while job files move
+#
+# A job's fingerprint is the scan's root hash plus .docai.json, so queueing
+# the same tree twice coalesces into one job. A hook whose scan ran out of
+# budget queues a rescan job instead, keyed on the staged tree. Only the
+# newest pending job is run; older ones describe trees that no longer exist
+# and are superseded.
+
+STATES = ("pending", "running", "done")
+# Finished jobs kept for `docai status`
+KEEP_FINISHED = 20
+
+
+def queue_dir(root: Path) -> Path:
+    return state_dir(root) / "queue"
+
+
+def _job_path(root: Path, state: str, fp: str) -> Path:
+    return queue_dir(root) / state / f"{fp}.json"
+
+
+def job_fingerprint(root: Path) -> str:
+    tree = load_tree(root / "repo_info.json") or {}
+    return fingerprint([tree.get("root"), load_project_config(root)])
+
+
+def enqueue(root: Path, reason: str = "hook", rescan: bool = False) -> tuple[Dict[str, Any], bool]:
+    """Queue regeneration of the current scan; returns (job, coalesced).
+
+    rescan queues a hook whose scan ran out of budget: the worker scans before
+    regenerating, and the job is keyed on the staged tree since no new scan
+    exists yet. Raises TimeoutError if the queue stays locked.
+    """
+    if rescan:
+        fp = fingerprint(["rescan", git_tree(root, index=True), load_project_config(root)])
+    else:
+        fp = job_fingerprint(root)
+    with _queue_lock(root):
+        now = time.time()
+        running = _read(_job_path(root, "running", fp))
+        if running is not None:
+            return running, True
+        path = _job_path(root, "pending", fp)
+        job = _read(path)
+        coalesced = job is not None
+        if job is None:
+            job = {"id": fp[:12], "fingerprint": fp, "state": "pending", "created": now, "requests": 0, "reason": reason}
+            if rescan:
+                job["rescan"] = True
+        job["requests"] += 1
+        job["updated"] = now
+        write_json(path, job)
+    return job, coalesced
+
+
+def list_jobs(root: Path) -> Dict[str, List[Dict[str, Any]]]:
+    """Jobs by state, pending/running oldest first and finished newest first."""
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    for state in STATES:
+        jobs = [j for j in (_read(p) for p in sorted((queue_dir(root) / state).glob("*.json"))) if j]
+        jobs.sort(key=lambda j: j.get("finished") or j.get("created") or 0, reverse=state == "done")
+        out[state] = jobs
+    return out
+
+
+def _read(path: Path) -> Dict[str, Any] | None:
+    try:
+        data = read_json(path)
+    except Exception:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _lock_pid(lock: Path) -> int | None:
+    try:
+        pid = int(lock.read_text().strip())
+    except (OSError, ValueError):
+        return None
+    return pid if _pid_alive(pid) else None
+
+
+def worker_pid(root: Path) -> int | None:
+    """Pid of the running worker, or None."""
+    return _lock_pid(queue_dir(root) / "worker.lock")
+
+
+def _acquire_lock(lock: Path) -> bool:
+    lock.parent.mkdir(parents=True, exist_ok=True)
+    # The pid is written first and the lock appears with it (link fails if it
+    # exists), so a waiter never sees an empty lock and mistakes it for stale
+    tmp = lock.with_name(f"{lock.name}.{os.getpid()}.{threading.get_ident()}")
+    tmp.write_text(str(os.getpid()))
+    try:
+        for _ in range(2):
+            try:
+                os.link(tmp, lock)
+            except FileExistsError:
+                if _lock_pid(lock) is not None:
+                    return False
+                # Left behind by a process that died
+                lock.unlink(missing_ok=True)
+                continue
+            return True
+        return False
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+@contextmanager
+def _queue_lock(root: Path, timeout: float = 5.0) -> Iterator[None]:
+    """Serializes enqueue() against the worker claiming and superseding jobs."""
+    lock = queue_dir(root) / "queue.lock"
+    deadline = time.monotonic() + timeout
+    while not _acquire_lock(lock):
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"{lock} is held by pid {_lock_pid(lock)}")
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        lock.unlink(missing_ok=True)
+
+
+def _finish(root: Path, job: Dict[str, Any], state_from: str, state: str = "done", **fields: Any) -> None:
+    job.update(fields, state=state, finished=time.time())
+    write_json(_job_path(root, "done", job["fingerprint"]), job)
+    _job_path(root, state_from, job["fingerprint"]).unlink(missing_ok=True)
+
+
+def _prune(root: Path) -> None:
+    for job in list_jobs(root)["done"][KEEP_FINISHED:]:
+        _job_path(root, "done", job["fingerprint"]).unlink(missing_ok=True)
+
+
+def run_worker(root: Path, regenerate: Callable[[Path], bool], once: bool = False) -> int:
+    """Drain the queue, calling regenerate(root) (True if docs changed) per job.
+
+    Returns the number of jobs run, or -1 if another worker holds the lock.
+    """
+    if not _acquire_lock(queue_dir(root) / "worker.lock"):
+        return -1
+    ran = 0
+    try:
+        with _queue_lock(root):
+            # Holding the lock means nothing is running; anything in running/ was interrupted
+            for job in list_jobs(root)["running"]:
+                os.replace(_job_path(root, "running", job["fingerprint"]), _job_path(root, "pending", job["fingerprint"]))
+        while True:
+            with _queue_lock(root):
+                pending = list_jobs(root)["pending"]
+                if not pending:
+                    break
+                job = max(pending, key=lambda j: j.get("updated") or 0)
+                for old in pending:
+                    if old is not job:
+                        _finish(root, old, "pending", state="superseded", superseded_by=job["id"])
+                running = _job_path(root, "running", job["fingerprint"])
+                running.parent.mkdir(parents=True, exist_ok=True)
+                # Re-read under the lock: enqueue() may have coalesced more requests into it
+                job = _read(_job_path(root, "pending", job["fingerprint"])) or job
+                os.replace(_job_path(root, "pending", job["fingerprint"]), running)
+            job.update(state="running", started=time.time(), pid=os.getpid())
+            write_json(running, job)
+            print(f"[docai] Running docs job {job['id']} ({job['requests']} request(s))...")
+            t0 = time.perf_counter()
+            try:
+                if job.get("rescan"):
+                    from .scanner import _write_scan
+
+                    _write_scan(root)
+                changed = regenerate(root)
+            except Exception as e:
+                _finish(
+                    root, job, "running", state="failed", seconds=round(time.perf_counter() - t0, 3),
+                    error=f"{type(e).__name__}: {e}", traceback=traceback.format_exc(limit=5),
+                )
+                print(f"[docai] Docs job {job['id']} failed: {e}")
+            else:
+                _finish(
+                    root, job, "running", state="done", seconds=round(time.perf_counter() - t0, 3),
+                    result="changed" if changed else "unchanged",
+                )
+                print(f"[docai] Docs job {job['id']} done ({'docs changed' if changed else 'no changes'}).")
+            ran += 1
+            if once:
+                break
+        _prune(root)
+    finally:
+        (queue_dir(root) / "worker.lock").unlink(missing_ok=True)
+    return ran
@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import http.client
+import json
+import os
+import queue
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+from .util import read_json
+
+# LLM providers behind docs._call_gemini. The backend is configured from the
+# tool's config.json (next to the package), with DOCAI_LLM_* environment
+# variables taking precedence, and is built once per process:
+#
+#   gemini  gemini_api_key, gemini_model (google-generativeai SDK)
+#   http    llm_base_url, llm_model, llm_api_key (optional), llm_pool_size:
+#           any OpenAI-compatible /chat/completions server, e.g. a self-hosted
+#           model or `docai serve-llm`
+#
+# Backends can also stream a response (stream()), yielding text chunks as the
+# model produces them; docs uses this to write long documents progressively.
+#
+# llm_provider picks one explicitly; by default http is used when
+# llm_base_url is set and gemini otherwise.
+
+_ENV = {
+    "llm_provider": "DOCAI_LLM_PROVIDER",
+    "llm_base_url": "DOCAI_LLM_BASE_URL",
+    "llm_model": "DOCAI_LLM_MODEL",
+    "llm_api_key": "DOCAI_LLM_API_KEY",
+    "llm_rpm": "DOCAI_LLM_RPM",
+    "llm_tpm": "DOCAI_LLM_TPM",
+}
+
+
+class LLMError(Exception):
+    """A failed request to an LLM backend.
+
+    status is the HTTP status when known; retry_after is the server's
+    Retry-After in seconds, if it sent one (see docai.scheduler).
+    """
+
+    def __init__(self, message: str, status: int | None = None, retry_after: float | None = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _sdk_error(e: Exception) -> LLMError:
+    # google.api_core exceptions carry the HTTP status as .code (e.g. 429 for ResourceExhausted)
+    code = getattr(e, "code", None)
+    return LLMError(f"{type(e).__name__}: {e}", code if isinstance(code, int) else None)
+
+
+class LLMBackend(ABC):
+    """Provider interface: one text generation per call, optionally streamed."""
+
+    #: Short provider name for messages
+    label = "LLM"
+    #: Model identity; part of response-cache keys
+    name = ""
+
+    @abstractmethod
+    def generate(self, parts: List[str], timeout: float | None = None) -> str:
+        """The full response text for parts, sent as one prompt."""
+
+    def stream(self, parts: List[str], timeout: float | None = None) -> Iterator[str]:
+        """Yield the response in chunks; backends without streaming yield it whole."""
+        yield self.generate(parts, timeout=timeout)
+
+    def list_models(self) -> List[str]:
+        return []
+
+
+def _genai():
+    """Import google.generativeai on first use; it drags in gRPC and protobuf."""
+    try:
+        import google.generativeai as genai  # type: ignore
+    except Exception:  # pragma: no cover
+        return None
+    return genai
+
+
+class GeminiBackend(LLMBackend):
+    label = "Gemini"
+
+    def __init__(self, genai, model_name: str):
+        self._genai = genai
+        self.name = model_name
+        self._model = genai.GenerativeModel(model_name) if model_name else None
+
+    def generate(self, parts: List[str], timeout: float | None = None) -> str:
+        if self._model is None:
+            raise LLMError("gemini_model is not configured")
+        try:
+            if timeout:
+                resp = self._model.generate_content(parts, request_options={"timeout": timeout})
+            else:
+                resp = self._model.generate_content(parts)
+        except Exception as e:
+            raise _sdk_error(e) from e
+        text = getattr(resp, "text", None)
+        if not text and getattr(resp, "candidates", None):
+            text = resp.candidates[0].content.parts[0].text
+        return text or ""
+
+    def stream(self, parts: List[str], timeout: float | None = None) -> Iterator[str]:
+        if self._model is None:
+            raise LLMError("gemini_model is not configured")
+        try:
+            if timeout:
+                resp = self._model.generate_content(parts, stream=True, request_options={"timeout": timeout})
+            else:
+                resp = self._model.generate_content(parts, stream=True)
+            chunks = iter(resp)
+            while True:
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    return
+                try:
+                    text = chunk.text
+                except (ValueError, AttributeError, IndexError):
+                    # Chunks without text parts (e.g. only safety metadata)
+                    continue
+                if text:
+                    yield text
+        except LLMError:
+            raise
+        except Exception as e:
+            raise _sdk_error(e) from e
+
+    def list_models(self) -> List[str]:
+        return [m.name for m in self._genai.list_models() if getattr(m, "name", None)]
+
+
+# Errors that mean a pooled keep-alive connection went stale; retried once on a fresh one
+_STALE = (http.client.RemoteDisconnected, http.client.CannotSendRequest, ConnectionResetError, BrokenPipeError)
+
+
+def _http_error(what: str, resp: http.client.HTTPResponse, payload: bytes) -> LLMError:
+    try:
+        retry_after = float(resp.getheader("Retry-After") or "")
+    except ValueError:
+        retry_after = None  # absent, or an HTTP date
+    return LLMError(f"{what} -> {resp.status}: {payload[:200].decode('utf-8', 'replace')}", resp.status, retry_after)
+
+
+class HTTPBackend(LLMBackend):
+    """OpenAI-compatible chat completions over a pool of keep-alive connections."""
+
+    label = "HTTP"
+
+    def __init__(self, base_url: str, model: str, api_key: str | None = None, pool_size: int = 8):
+        url = urlsplit(base_url.rstrip("/"))
+        if url.scheme not in ("http", "https") or not url.hostname:
+            raise LLMError(f"invalid llm_base_url: {base_url!r}")
+        self._https = url.scheme == "https"
+        self._host = url.hostname
+        self._port = url.port
+        self._prefix = url.path
+        self.name = model
+        self.base_url = base_url
+        self._headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        if api_key:
+            self._headers["Authorization"] = f"Bearer {api_key}"
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=max(1, pool_size))
+
+    def _connect(self, timeout: float | None) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        return cls(self._host, self._port, timeout=timeout)
+
+    def _release(self, conn: http.client.HTTPConnection) -> None:
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _open(self, method: str, path: str, body: Dict[str, Any] | None, timeout: float | None):
+        """Send a request on a pooled connection; returns (connection, response) with the body unread."""
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        for attempt in range(2):
+            try:
+                conn, reused = self._idle.get_nowait(), True
+            except queue.Empty:
+                conn, reused = self._connect(timeout), False
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            try:
+                conn.request(method, self._prefix + path, body=data, headers=self._headers)
+                return conn, conn.getresponse()
+            except _STALE:
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+        raise LLMError(f"{method} {path}: connection failed")  # pragma: no cover
+
+    def _done(self, conn: http.client.HTTPConnection, resp: http.client.HTTPResponse) -> None:
+        # Return the connection to the pool once its response has been read in full
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+
+    def request(self, method: str, path: str, body: Dict[str, Any] | None = None, timeout: float | None = None) -> Any:
+        conn, resp = self._open(method, path, body, timeout)
+        try:
+            payload = resp.read()
+        except BaseException:
+            conn.close()
+            raise
+        self._done(conn, resp)
+        if resp.status >= 400:
+            raise _http_error(f"{method} {path}", resp, payload)
+        return json.loads(payload)
+
+    def generate(self, parts: List[str], timeout: float | None = None) -> str:
+        body = {"model": self.name, "messages": [{"role": "user", "content": "".join(parts)}]}
+        data = self.request("POST", "/chat/completions", body, timeout)
+        try:
+            return data["choices"][0]["message"]["content"] or ""
+        except (KeyError, IndexError, TypeError):
+            raise LLMError("malformed chat completion response")
+
+    def stream(self, parts: List[str], timeout: float | None = None) -> Iterator[str]:
+        """Server-sent events from /chat/completions with "stream": true.
+
+        The connection goes back to the pool only when the stream was read to
+        the end; a consumer that stops early closes it.
+        """
+        body = {"model": self.name, "messages": [{"role": "user", "content": "".join(parts)}], "stream": True}
+        conn, resp = self._open("POST", "/chat/completions", body, timeout)
+        complete = False
+        try:
+            if resp.status >= 400:
+                payload = resp.read()
+                complete = True
+                raise _http_error("POST /chat/completions", resp, payload)
+            for line in resp:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    resp.read()
+                    break
+                try:
+                    text = (json.loads(data)["choices"][0].get("delta") or {}).get("content")
+                except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                    raise LLMError("malformed chat completion stream")
+                if text:
+                    yield text
+            complete = True
+        finally:
+            if complete:
+                self._done(conn, resp)
+            else:
+                conn.close()
+
+    def list_models(self) -> List[str]:
+        data = self.request("GET", "/models", timeout=30)
+        return [m["id"] for m in data.get("data") or [] if m.get("id")]
+
+
+def _load_config() -> Dict[str, Any]:
+    # Only read settings from this package's root config.json (plus environment overrides)
+    pkg_root = Path(__file__).resolve().parents[1]
+    try:
+        cfg = read_json(pkg_root / "config.json") or {}
+    except Exception:
+        cfg = {}
+    if not isinstance(cfg, dict):
+        cfg = {}
+    for key, env in _ENV.items():
+        if os.environ.get(env):
+            cfg[key] = os.environ[env]
+    return cfg
+
+
+def configured() -> bool:
+    """Whether an LLM backend is configured, without building it or importing an SDK."""
+    cfg = _load_config()
+    provider = cfg.get("llm_provider") or ("http" if cfg.get("llm_base_url") else "gemini")
+    if provider == "http":
+        return bool(cfg.get("llm_base_url"))
+    return bool((cfg.get("gemini_api_key") or cfg.get("GOOGLE_API_KEY")) and cfg.get("gemini_model"))
+
+
+def build_backend(cfg: Dict[str, Any]) -> Optional[LLMBackend]:
+    provider = cfg.get("llm_provider") or ("http" if cfg.get("llm_base_url") else "gemini")
+    if provider == "http":
+        if not cfg.get("llm_base_url"):
+            return None
+        return HTTPBackend(
+            cfg["llm_base_url"],
+            cfg.get("llm_model") or "default",
+            api_key=cfg.get("llm_api_key"),
+            pool_size=int(cfg.get("llm_pool_size", 8)),
+        )
+    api_key = cfg.get("gemini_api_key") or cfg.get("GOOGLE_API_KEY")
+    if not api_key:
+        return None
+    genai = _genai()
+    if genai is None:
+        return None
+    genai.configure(api_key=api_key)
+    return GeminiBackend(genai, (cfg.get("gemini_model") or "").strip())
+
+
+_lock = threading.Lock()
+_backend: Optional[LLMBackend] = None
+_built = False
+
+
+def get_backend() -> Optional[LLMBackend]:
+    """The configured backend, built on first use and reused for the process."""
+    global _backend, _built
+    with _lock:
+        if not _built:
+            try:
+                _backend = build_backend(_load_config())
+            except Exception as e:
+                print(f"[docai] LLM backend unavailable: {e}")
+                _backend = None
+            _built = True
+        return _backend
+
+
+def reset_backend() -> None:
+    """Forget the cached backend and scheduler so the next use re-reads configuration."""
+    global _backend, _built
+    from .scheduler import reset_scheduler
+
+    with _lock:
+        _backend, _built = None, False
+    reset_scheduler()
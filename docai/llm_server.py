@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+# Local stand-in for an OpenAI-compatible model server (`docai serve-llm`), for
+# offline runs and benchmarks. Answers are deterministic functions of the
+# prompt: a Markdown section per request, or one delimited section per module
+# for packed requests (docai.packing), so caching and packing behave as they
+# would against a real model. Requests with "stream": true are answered as
+# server-sent events, one line of the answer per event.
+
+STAND_IN_MODEL = "docai-stand-in"
+
+_PACKED = re.compile(r"^=== module: (\S+) ===$", re.M)
+
+
+def stand_in_reply(text: str) -> str:
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+    modules = _PACKED.findall(text)
+    if modules:
+        return "\n".join(
+            f"<!-- docai:begin {m} -->\n## {m}\n\nGenerated {digest}\n<!-- docai:end {m} -->" for m in modules
+        )
+    first = text.strip().splitlines()[0] if text.strip() else ""
+    return f"## Generated {digest}\n\n{first[:80]}\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so clients can pool connections
+    # Headers and body go out in separate writes; without this, Nagle plus
+    # delayed ACKs add ~40ms to every response on a reused connection
+    disable_nagle_algorithm = True
+    server: "StandInServer"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, model: str, text: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for piece in text.splitlines(keepends=True):
+                event = {
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                }
+                self._chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                if self.server.chunk_delay:
+                    time.sleep(self.server.chunk_delay)
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading early (e.g. a streaming budget ran out)
+            self.close_connection = True
+
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/").endswith("/models"):
+            self._send(200, {"object": "list", "data": [{"id": STAND_IN_MODEL, "object": "model"}]})
+        else:
+            self._send(404, {"error": {"message": f"no route for {self.path}"}})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            req = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, {"error": {"message": "invalid JSON"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"no route for {self.path}"}})
+            return
+        prompt = "".join(str(m.get("content", "")) for m in req.get("messages") or [])
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.server.requests += 1
+        model = req.get("model") or STAND_IN_MODEL
+        if req.get("stream"):
+            self._send_stream(model, stand_in_reply(prompt))
+            return
+        self._send(200, {
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": stand_in_reply(prompt)}, "finish_reason": "stop"}],
+        })
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        latency: float = 0.0,
+        verbose: bool = False,
+        chunk_delay: float = 0.0,
+    ):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        # Pause between streamed events, to mimic a model producing tokens
+        self.chunk_delay = chunk_delay
+        self.verbose = verbose
+        self.requests = 0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    latency: float = 0.0,
+    verbose: bool = False,
+    chunk_delay: float = 0.0,
+) -> int:
+    server = StandInServer(host, port, latency, verbose, chunk_delay)
+    print(f"[docai] Stand-in LLM server on {server.base_url} (model {STAND_IN_MODEL})")
+    print(f"[docai] Point docai at it with DOCAI_LLM_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Sequence, Tuple
+
+# Request packing: several small per-module API requests are sent to Gemini as
+# one call. Each module's outline is introduced by a header line in the
+# payload, and the model is asked to wrap each answer in begin/end markers so
+# the response can be split back per module. Modules whose section is missing
+# or malformed are retried one request per module by the caller.
+
+PAYLOAD_HEADER = "=== module: {name} ==="
+BEGIN = "<!-- docai:begin {name} -->"
+END = "<!-- docai:end {name} -->"
+# Upper bound on modules per packed call, so one bad response cannot cost too much
+MAX_MODULES = 16
+
+PACK_INSTRUCTION = (
+    "\nThe outline below contains several modules, each introduced by a line "
+    "`=== module: <name> ===`. Document every module separately, as a Markdown "
+    "section that starts with the level-2 heading `## <module name>`. Wrap each "
+    "section exactly like this, one block per module, in the order given:\n"
+    "<!-- docai:begin <module name> -->\n## <module name>\n...\n<!-- docai:end <module name> -->\n"
+    "Write nothing outside these blocks.\n"
+    "Modules: {names}\n"
+)
+
+_BLOCK = re.compile(r"<!-- docai:begin (?P<name>\S+) -->\n?(?P<body>.*?)\n?<!-- docai:end (?P=name) -->", re.S)
+
+
+def plan_packs(sizes: Dict[str, int], budget: int, overhead: int = 0) -> List[List[str]]:
+    """Group keys into packs whose summed size (plus overhead) fits the budget.
+
+    First-fit decreasing; keys too large to share a call end up alone. Packs
+    and their members come back in sorted key order.
+    """
+    packs: List[List[str]] = []
+    loads: List[int] = []
+    for key in sorted(sizes, key=lambda k: (-sizes[k], k)):
+        size = sizes[key]
+        for i, load in enumerate(loads):
+            if load + size <= budget and len(packs[i]) < MAX_MODULES:
+                packs[i].append(key)
+                loads[i] += size
+                break
+        else:
+            packs.append([key])
+            loads.append(overhead + size)
+    return sorted((sorted(p) for p in packs), key=lambda p: p[0])
+
+
+def pack_prompt(base_prompt: str, names: Sequence[str]) -> str:
+    return base_prompt + PACK_INSTRUCTION.format(names=", ".join(names))
+
+
+def pack_payload(sections: Sequence[Tuple[str, str]]) -> str:
+    """Join (module name, outline) pairs into one delimited payload."""
+    return "\n\n".join(f"{PAYLOAD_HEADER.format(name=name)}\n{text.strip()}" for name, text in sections)
+
+
+def split_response(text: str, names: Sequence[str]) -> Dict[str, str]:
+    """Per-module sections from a packed response that pass validation.
+
+    A section is accepted when it appears exactly once, is wrapped in matching
+    markers and starts with its own `## <module>` heading. Missing or invalid
+    modules are simply absent from the result.
+    """
+    found: Dict[str, List[str]] = {}
+    for m in _BLOCK.finditer(text or ""):
+        found.setdefault(m.group("name"), []).append(m.group("body").strip())
+    out: Dict[str, str] = {}
+    for name in names:
+        bodies = found.get(name) or []
+        if len(bodies) != 1:
+            continue
+        body = bodies[0]
+        first = body.splitlines()[0].strip() if body else ""
+        if first.startswith("## ") and first[3:].strip().strip("`") == name:
+            out[name] = body
+    return out
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Tuple
+
+# Rough chars-per-token ratio for English text and code.
+CHARS_PER_TOKEN = 4
+
+# Trim priority: lower tiers are kept first when over budget.
+_TIER_MODULE = 0
+_TIER_PUBLIC = 1
+_TIER_MEMBER = 2
+_TIER_DETAIL = 3
+_TIER_PRIVATE = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _is_private(name: str) -> bool:
+    return name.startswith("_") and not (name.startswith("__") and name.endswith("__"))
+
+
+def _signature(fn: Dict[str, Any]) -> str:
+    defaults = fn.get("defaults") or {}
+    parts = []
+    for a in fn.get("args") or []:
+        name = a.get("name")
+        text = f"{name}: {a['annotation']}" if a.get("annotation") else f"{name}"
+        if name in defaults:
+            text += f"={defaults[name]}"
+        parts.append(text)
+    ret = f" -> {fn['returns']}" if fn.get("returns") else ""
+    prefix = "async def" if fn.get("is_async") else "def"
+    return f"{prefix} {fn['name']}({', '.join(parts)}){ret}"
+
+
+def _decorated(line: str, decorators: List[str]) -> str:
+    return " ".join(f"@{d}" for d in decorators) + (" " if decorators else "") + line
+
+
+def _with_summary(line: str, item: Dict[str, Any], doc_key: str = "doc") -> str:
+    # Summaries synthesised from names add nothing; only keep real docstrings.
+    if item.get(doc_key):
+        return f"{line}: {item.get('summary', '')}"
+    return line
+
+
+def _outline_lines(info: Dict[str, Any]) -> List[Tuple[int, str]]:
+    """(tier, line) pairs for one module, parents before children."""
+    out: List[Tuple[int, str]] = []
+    out.append((_TIER_MODULE, _with_summary(f"module {info['module']} ({info['path']})", info, "module_doc")))
+    if info.get("imports"):
+        out.append((_TIER_DETAIL, "  imports: " + ", ".join(info["imports"])))
+    for c in info.get("classes") or []:
+        ctier = _TIER_PRIVATE if _is_private(c["name"]) else _TIER_PUBLIC
+        bases = f"({', '.join(c['bases'])})" if c.get("bases") else ""
+        out.append((ctier, "  " + _with_summary(_decorated(f"class {c['name']}{bases}", c.get("decorators") or []), c)))
+        attrs = [
+            f"{a['name']}: {a['annotation']}" if a.get("annotation") else f"{a['name']}"
+            for a in c.get("attributes") or []
+        ]
+        if attrs:
+            out.append((max(ctier, _TIER_DETAIL), "    attrs: " + ", ".join(attrs)))
+        for m in c.get("methods") or []:
+            mtier = _TIER_PRIVATE if _is_private(m["name"]) else _TIER_MEMBER
+            out.append((max(ctier, mtier), "    " + _with_summary(_decorated(_signature(m), m.get("decorators") or []), m)))
+    for fn in info.get("functions") or []:
+        ftier = _TIER_PRIVATE if _is_private(fn["name"]) else _TIER_PUBLIC
+        out.append((ftier, "  " + _with_summary(_decorated(_signature(fn), fn.get("decorators") or []), fn)))
+    return out
+
+
+def truncate_payload(text: str, budget_tokens: int) -> str:
+    """Cut a text payload to budget_tokens at a line boundary, noting what was dropped."""
+    if estimate_tokens(text) <= budget_tokens:
+        return text
+    limit = max(0, budget_tokens * CHARS_PER_TOKEN - 64)
+    cut = text.rfind("\n", 0, limit)
+    kept = text[: cut if cut > 0 else limit]
+    return kept + f"\n... {len(text) - len(kept)} characters omitted to fit the token budget"
+
+
+def compact_payload(repo: Any, budget_tokens: int | None = None) -> str:
+    """Render repo info as a dense outline, trimmed to budget_tokens.
+
+    repo is a scan dict or a docai.store.RepoView, whose records are read one
+    at a time. Full docstrings, synthesised summaries, empty fields and the
+    absolute root are dropped. When over budget, lines are kept in priority
+    order (module headers, public API, members, details, private helpers) and
+    emitted in their original order.
+    """
+    files = repo.iter_files() if hasattr(repo, "iter_files") else repo.get("files", [])
+    outlines = sorted(((info["module"], _outline_lines(info)) for info in files), key=lambda o: o[0])
+    lines: List[Tuple[int, int, str]] = []
+    for _, outline in outlines:
+        for tier, line in outline:
+            lines.append((len(lines), tier, line))
+    if budget_tokens is None or estimate_tokens("\n".join(line for _, _, line in lines)) <= budget_tokens:
+        return "\n".join(line for _, _, line in lines)
+
+    keep: List[Tuple[int, str]] = []
+    used = 0
+    for idx, _, line in sorted(lines, key=lambda t: (t[1], t[0])):
+        cost = estimate_tokens(line + "\n")
+        if used + cost > budget_tokens:
+            break
+        keep.append((idx, line))
+        used += cost
+    dropped = len(lines) - len(keep)
+    text = "\n".join(line for _, line in sorted(keep))
+    return text + f"\n... {dropped} lower-priority lines omitted to fit the token budget"
@@ -1,15 +1,42 @@
 from __future__ import annotations
 
 import ast
+import heapq
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
 from dataclasses import dataclass, asdict
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
-from .util import iter_python_files, repo_root, write_json
+from . import trace
+from .cache import ParseCache, content_hash
+from .store import RepoWriter, open_repo
+from .util import (
+    git_tree,
+    in_ignored_dir,
+    index_blobs,
+    iter_python_files,
+    load_project_config,
+    path_selected,
+    read_json,
+    repo_root,
+    staged_changes,
+    state_dir,
+    write_json,
+)
 
+# Bump whenever extraction output changes so cached records are invalidated.
+SCANNER_VERSION = 1
 
+
+# Records use explicit __slots__ (no per-instance __dict__): large repos hold
+# hundreds of thousands of them. Fields have no defaults, so this is safe on 3.9.
 @dataclass
 class FunctionInfo:
+    __slots__ = ("name", "args", "returns", "defaults", "decorators", "is_async", "doc", "summary")
+
     name: str
     args: List[Dict[str, Optional[str]]]
     returns: Optional[str]
@@ -19,9 +46,15 @@ class FunctionInfo:
     doc: str | None
     summary: str
 
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "FunctionInfo":
+        return cls(**d)
+
 
 @dataclass
 class ClassInfo:
+    __slots__ = ("name", "bases", "decorators", "doc", "attributes", "methods", "summary")
+
     name: str
     bases: List[str]
     decorators: List[str]
@@ -30,9 +63,17 @@ class ClassInfo:
     methods: List[FunctionInfo]
     summary: str
 
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "ClassInfo":
+        d = dict(d)
+        d["methods"] = [FunctionInfo.from_dict(m) for m in d.get("methods", [])]
+        return cls(**d)
+
 
 @dataclass
 class FileInfo:
+    __slots__ = ("path", "module", "module_doc", "imports", "classes", "functions", "summary")
+
     path: str
     module: str
     module_doc: Optional[str]
@@ -41,6 +82,13 @@ class FileInfo:
     functions: List[FunctionInfo]
     summary: str
 
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "FileInfo":
+        d = dict(d)
+        d["classes"] = [ClassInfo.from_dict(c) for c in d.get("classes", [])]
+        d["functions"] = [FunctionInfo.from_dict(f) for f in d.get("functions", [])]
+        return cls(**d)
+
 
 @dataclass
 class RepoInfo:
@@ -54,6 +102,24 @@ class RepoInfo:
         }
 
 
+@dataclass
+class ScanResult:
+    """What a scan wrote; the records themselves are read back through docai.store."""
+
+    root: str
+    files: int
+    tree: str
+
+
+class ScanBudgetExceeded(Exception):
+    """A scan given a deadline ran past it; the previous output was left as it was."""
+
+
+def _check_deadline(deadline: float | None) -> None:
+    if deadline is not None and time.perf_counter() > deadline:
+        raise ScanBudgetExceeded("scan ran past its deadline")
+
+
 def _doc_summary(doc: str | None) -> str:
     if doc:
         first = doc.strip().splitlines()[0].strip()
@@ -61,6 +127,73 @@ def _doc_summary(doc: str | None) -> str:
     return "No docstring provided."
 
 def _unparse_safe(n: ast.AST) -> str:
+    if trace.enabled():
+        t0 = time.perf_counter()
+        try:
+            return _render(n)
+        finally:
+            trace.add_time("ast.unparse", time.perf_counter() - t0)
+    return _render(n)
+
+
+def _render(n: ast.AST) -> str:
+    # Annotations, bases and decorators are mostly names, dotted names and
+    # simple subscripts (str, Path, Optional[str], typing.Dict[str, Any]).
+    # Render those directly and intern the result; anything else goes through
+    # ast.unparse. Output must stay identical to ast.unparse.
+    text = _render_simple(n)
+    if text is None:
+        text = _unparse(n)
+    return sys.intern(text)
+
+
+def _render_simple(n: ast.AST) -> Optional[str]:
+    if isinstance(n, ast.Name):
+        return n.id
+    if isinstance(n, ast.Attribute):
+        if not isinstance(n.value, (ast.Name, ast.Attribute)):
+            return None
+        value = _render_simple(n.value)
+        return None if value is None else f"{value}.{n.attr}"
+    if isinstance(n, ast.Constant):
+        v = n.value
+        if v is None or v is True or v is False or v is Ellipsis:
+            return "..." if v is Ellipsis else repr(v)
+        if type(v) is int:
+            return repr(v)
+        if type(v) is str and n.kind is None and v.isprintable() and "'" not in v and "\\" not in v:
+            return repr(v)
+        return None
+    if isinstance(n, ast.Subscript):
+        if not isinstance(n.value, (ast.Name, ast.Attribute)):
+            return None
+        value = _render_simple(n.value)
+        sl = n.slice
+        if isinstance(sl, ast.Tuple):
+            if not sl.elts:
+                return None
+            parts = [_render_simple(e) for e in sl.elts]
+            if any(p is None or isinstance(e, ast.Tuple) for p, e in zip(parts, sl.elts)):
+                return None
+            inner = ", ".join(parts)  # type: ignore[arg-type]
+        elif isinstance(sl, (ast.Name, ast.Attribute, ast.Constant, ast.Subscript, ast.List)):
+            inner = _render_simple(sl)
+        else:
+            return None
+        return None if value is None or inner is None else f"{value}[{inner}]"
+    if isinstance(n, ast.List):
+        parts = [_render_simple(e) for e in n.elts]
+        if any(p is None or isinstance(e, ast.Tuple) for p, e in zip(parts, n.elts)):
+            return None
+        return "[" + ", ".join(parts) + "]"  # type: ignore[arg-type]
+    if isinstance(n, ast.BinOp) and isinstance(n.op, ast.BitOr) and not isinstance(n.right, ast.BinOp):
+        left = _render_simple(n.left)
+        right = _render_simple(n.right)
+        return None if left is None or right is None else f"{left} | {right}"
+    return None
+
+
+def _unparse(n: ast.AST) -> str:
     try:
         return ast.unparse(n)  # type: ignore[attr-defined]
     except Exception:
@@ -143,49 +276,460 @@ def _module_name(root: Path, file: Path) -> str:
     return ".".join(rel.parts)
 
 
-def scan_repository(start: str | Path | None = None, out_path: str | Path | None = None) -> RepoInfo:
-    root = repo_root(Path(start) if start else None)
-    files: List[FileInfo] = []
-    for py in iter_python_files(root):
+def _parse_source(root: Path, py: Path, source: str) -> FileInfo:
+    with trace.span("ast.parse"):
+        tree = ast.parse(source)
+    with trace.span("extract"):
+        return _extract(root, py, tree)
+
+
+# Statement lists that can contain (nested) import statements. Imports are
+# statements, so expressions never need to be visited.
+_STMT_FIELDS = ("body", "orelse", "finalbody", "handlers", "cases")
+
+
+def _extract(root: Path, py: Path, tree: ast.Module) -> FileInfo:
+    # One pass over the statement tree: top-level classes/functions are
+    # extracted as they are met, imports are gathered at any depth.
+    imports: set[str] = set()
+    classes: List[ClassInfo] = []
+    functions: List[FunctionInfo] = []
+    stack: List[tuple[ast.AST, bool]] = [(n, True) for n in reversed(tree.body)]
+    while stack:
+        n, top = stack.pop()
+        if isinstance(n, ast.Import):
+            for alias in n.names:
+                imports.add(alias.name)
+            continue
+        if isinstance(n, ast.ImportFrom):
+            mod = n.module or ""
+            for alias in n.names:
+                imports.add(f"{mod}.{alias.name}" if mod else alias.name)
+            continue
+        if top:
+            if isinstance(n, ast.ClassDef):
+                classes.append(_class_info(n))
+            elif isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                functions.append(_func_info(n))
+        for field in _STMT_FIELDS:
+            children = getattr(n, field, None)
+            if children:
+                stack.extend((c, False) for c in reversed(children))
+    mod = _module_name(root, py)
+    file_doc = ast.get_docstring(tree)
+    summary = _doc_summary(file_doc) if file_doc else (
+        f"Module {mod} with {len(classes)} classes and {len(functions)} functions"
+    )
+    return FileInfo(
+        path=str(py.relative_to(root)),
+        module=mod,
+        module_doc=file_doc,
+        imports=sorted(imports),
+        classes=classes,
+        functions=functions,
+        summary=summary,
+    )
+
+
+def _parse_one(root: Path, py: Path, source: str) -> Optional[FileInfo]:
+    with trace.span("parse_file", path=str(py.relative_to(root)), bytes=len(source)):
         try:
-            source = py.read_text(encoding="utf-8")
-            tree = ast.parse(source)
+            # Match read_text() universal newline handling
+            source = source.replace("\r\n", "\n").replace("\r", "\n")
+            return _parse_source(root, py, source)
         except Exception:
             # Skip files that can't be parsed
+            return None
+
+
+def _parse_chunk(
+    root: str, items: List[tuple[int, str, str]], tracing: bool = False
+) -> tuple[List[tuple[int, Optional[FileInfo]]], Dict[str, Any] | None]:
+    # Process pool worker: items are (index, path, source). Spans recorded in a
+    # worker are returned to the parent for merging.
+    if tracing:
+        trace.enable()
+    base = Path(root)
+    parsed = [(idx, _parse_one(base, Path(path), source)) for idx, path, source in items]
+    return parsed, trace.drain() if tracing else None
+
+
+# Below this many files to parse, process pool startup costs more than it saves.
+_MIN_PARALLEL_FILES = 16
+# Files (or bytes of source) per batch sent to a pool worker, and batches in
+# flight per worker; together they bound how much is held while scanning.
+_BATCH_FILES = 32
+_BATCH_BYTES = 1 << 20
+_BATCHES_PER_WORKER = 2
+
+
+# Set by shared_pool() so several scans (e.g. `docai batch`) reuse one set of
+# worker processes instead of starting a pool per repository.
+_shared_pool = None
+
+
+@contextmanager
+def shared_pool(jobs: int) -> Iterator[None]:
+    """Route process-pool parsing through one pool of `jobs` workers for the block."""
+    global _shared_pool
+    if jobs <= 1:
+        yield
+        return
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Callers submit from several threads, where forking is unsafe; spawn instead
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=ctx, initializer=trace.reset) as pool:
+        _shared_pool = pool
+        try:
+            yield
+        finally:
+            _shared_pool = None
+
+
+def _collect(root: Path, paths: Iterable[Path], cache: ParseCache, jobs: int) -> Iterator[FileInfo]:
+    """Yield FileInfo records for paths (in order), parsing only cache misses.
+
+    With jobs == 1 records are yielded as soon as each file is handled. With
+    a process pool, misses are sent off in batches while enumeration goes on,
+    and each record is yielded once everything before it is done; only the
+    batches in flight and the records waiting behind them are held.
+    """
+    if jobs <= 1:
+        for rel, py, st, digest, hit, cached, source in _lookup(root, paths, cache):
+            if hit:
+                info = FileInfo.from_dict(cached) if cached else None
+            else:
+                info = _parse_one(root, py, source)
+                cache.store(rel, st, digest, asdict(info) if info else None)
+            if info is not None:
+                yield info
+        return
+    yield from _collect_parallel(root, paths, cache, jobs)
+
+
+def _lookup(root: Path, paths: Iterable[Path], cache: ParseCache):
+    """(rel, path, stat, digest, hit, cached record, source) per readable file."""
+    for py in paths:
+        rel = str(py.relative_to(root))
+        try:
+            st = py.stat()
+        except OSError:
             continue
-        # Gather imports
-        imports: List[str] = []
-        for n in ast.walk(tree):
-            if isinstance(n, ast.Import):
-                for alias in n.names:
-                    imports.append(alias.name)
-            elif isinstance(n, ast.ImportFrom):
-                mod = n.module or ""
-                for alias in n.names:
-                    imports.append(f"{mod}.{alias.name}" if mod else alias.name)
-        classes: List[ClassInfo] = []
-        functions: List[FunctionInfo] = []
-        for node in tree.body:
-            if isinstance(node, ast.ClassDef):
-                classes.append(_class_info(node))
-            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
-                functions.append(_func_info(node))
-        mod = _module_name(root, py)
-        file_doc = ast.get_docstring(tree)
-        summary = _doc_summary(file_doc) if file_doc else (
-            f"Module {mod} with {len(classes)} classes and {len(functions)} functions"
-        )
-        files.append(FileInfo(
-            path=str(py.relative_to(root)),
-            module=mod,
-            module_doc=file_doc,
-            imports=sorted(set(imports)),
-            classes=classes,
-            functions=functions,
-            summary=summary,
-        ))
-
-    repo = RepoInfo(root=str(root), files=files)
+        hit, cached = cache.lookup_stat(rel, st)
+        digest = source = None
+        if not hit:
+            try:
+                data = py.read_bytes()
+            except OSError:
+                continue
+            digest = content_hash(data)
+            hit, cached = cache.lookup_hash(rel, st, digest)
+            if not hit:
+                try:
+                    source = data.decode("utf-8")
+                except UnicodeDecodeError:
+                    cache.store(rel, st, digest, None)
+                    continue
+        yield rel, py, st, digest, hit, cached, source
+
+
+def _collect_parallel(root: Path, paths: Iterable[Path], cache: ParseCache, jobs: int) -> Iterator[FileInfo]:
+    from collections import deque
+
+    order: deque[int] = deque()  # slots not yet yielded, in enumeration order
+    ready: Dict[int, Optional[FileInfo]] = {}
+    misses: Dict[int, tuple[str, os.stat_result, str]] = {}
+    batch: List[tuple[int, str, str]] = []
+    batch_bytes = 0
+    in_flight: deque = deque()
+    max_in_flight = jobs * _BATCHES_PER_WORKER
+    # Records held waiting for an earlier file; past this the partial batch goes out
+    max_held = _BATCH_FILES * (max_in_flight + 1)
+    pool = own_pool = None
+    tracing = trace.enabled()
+
+    def _store(part: List[tuple[int, Optional[FileInfo]]]) -> None:
+        for idx, info in part:
+            ready[idx] = info
+            rel, st, digest = misses.pop(idx)
+            cache.store(rel, st, digest, asdict(info) if info else None)
+
+    def _wait_oldest() -> None:
+        with trace.span("parse_pool_wait"):
+            part, spans = in_flight.popleft().result()
+        if spans:
+            trace.merge(spans)
+        _store(part)
+
+    def _submit() -> None:
+        nonlocal batch, batch_bytes, pool, own_pool
+        if pool is None and len(misses) < _MIN_PARALLEL_FILES:
+            # Too few misses so far to be worth starting a pool
+            _store(_parse_chunk(str(root), batch)[0])
+        else:
+            if pool is None:
+                if _shared_pool is not None:
+                    pool = _shared_pool
+                else:
+                    from concurrent.futures import ProcessPoolExecutor
+
+                    pool = own_pool = ProcessPoolExecutor(max_workers=jobs, initializer=trace.reset)
+            in_flight.append(pool.submit(_parse_chunk, str(root), batch, tracing))
+        batch, batch_bytes = [], 0
+
+    def _drain() -> Iterator[FileInfo]:
+        while order and order[0] in ready:
+            info = ready.pop(order.popleft())
+            if info is not None:
+                yield info
+
+    try:
+        for slot, (rel, py, st, digest, hit, cached, source) in enumerate(_lookup(root, paths, cache)):
+            order.append(slot)
+            if hit:
+                ready[slot] = FileInfo.from_dict(cached) if cached else None
+            else:
+                misses[slot] = (rel, st, digest)
+                batch.append((slot, str(py), source))
+                batch_bytes += len(source)
+                if pool is None:
+                    if len(misses) >= _MIN_PARALLEL_FILES:
+                        _submit()
+                elif len(batch) >= _BATCH_FILES or batch_bytes >= _BATCH_BYTES:
+                    _submit()
+            if len(order) > max_held:
+                if batch:
+                    _submit()
+                while order[0] not in ready:
+                    _wait_oldest()
+            while in_flight and (len(in_flight) > max_in_flight or in_flight[0].done()):
+                _wait_oldest()
+            yield from _drain()
+        if batch:
+            _submit()
+        while in_flight:
+            _wait_oldest()
+            yield from _drain()
+        yield from _drain()
+    finally:
+        for future in in_flight:
+            future.cancel()
+        if own_pool is not None:
+            own_pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _output_format(root: Path, fmt: str | None) -> str:
+    return fmt or load_project_config(root).get("output_format", "json")
+
+
+def _symbol_db(root: Path) -> Optional[Path]:
+    if not load_project_config(root).get("symbol_db"):
+        return None
+    # Only now: docai.symbols imports sqlite3
+    from .symbols import db_path
+
+    return db_path(root)
+
+
+def _repo_paths(root: Path) -> Iterator[Path]:
+    cfg = load_project_config(root)
+    return iter_python_files(
+        root,
+        include=cfg.get("include"),
+        exclude=cfg.get("exclude"),
+        backend=cfg.get("file_source", "auto"),
+    )
+
+
+def iter_repository(
+    start: str | Path | None = None,
+    use_cache: bool = True,
+    jobs: int | None = None,
+) -> Iterator[FileInfo]:
+    """Scan the repository without writing any output (the parse cache is still updated)."""
+    root = repo_root(Path(start) if start else None)
+    cache = ParseCache(root, SCANNER_VERSION, enabled=use_cache)
+    yield from _collect(root, _repo_paths(root), cache, jobs or os.cpu_count() or 1)
+    cache.save()
+
+
+def scan_repository(
+    start: str | Path | None = None,
+    out_path: str | Path | None = None,
+    use_cache: bool = True,
+    jobs: int | None = None,
+    fmt: str | None = None,
+) -> RepoInfo:
+    """Scan the repository, write repo_info.json and/or repo_info.jsonl, and return every FileInfo.
+
+    fmt is one of docai.store.FORMATS; defaults to output_format in .docai.json.
+    The CLI, hooks and daemon use _write_scan instead, which streams records
+    to disk without keeping them in memory.
+    """
+    files: List[FileInfo] = []
+    result = _write_scan(start, out_path, use_cache, jobs, fmt, keep=files)
+    return RepoInfo(root=result.root, files=files)
+
+
+def _write_scan(
+    start: str | Path | None = None,
+    out_path: str | Path | None = None,
+    use_cache: bool = True,
+    jobs: int | None = None,
+    fmt: str | None = None,
+    keep: List[FileInfo] | None = None,
+    deadline: float | None = None,
+) -> ScanResult:
+    """Scan the repository and stream results to repo_info.json and/or repo_info.jsonl.
+
+    The fingerprint tree is written to repo_info.tree.json alongside. Records
+    go to disk as they are produced and are only kept if keep is given. Past
+    deadline (a time.perf_counter() value) the scan stops with
+    ScanBudgetExceeded and the previous output stays in place.
+    """
+    root = repo_root(Path(start) if start else None)
+    with trace.span("scan_repository"):
+        with trace.span("cache_load"):
+            cache = ParseCache(root, SCANNER_VERSION, enabled=use_cache)
+        out = Path(out_path) if out_path else root / "repo_info.json"
+        try:
+            with RepoWriter(out, str(root), _output_format(root, fmt), _symbol_db(root)) as writer:
+                for info in _collect(root, _repo_paths(root), cache, jobs or os.cpu_count() or 1):
+                    _check_deadline(deadline)
+                    writer.add(asdict(info))
+                    if keep is not None:
+                        keep.append(info)
+        except ScanBudgetExceeded:
+            # Whatever was parsed still saves the next scan the work
+            cache.save(prune=False)
+            raise
+        with trace.span("cache_save"):
+            cache.save()
+        _record_scan(root, out)
+    return ScanResult(root=str(root), files=writer.count, tree=writer.root_hash or "")
+
+
+def _scan_state_path(root: Path) -> Path:
+    return state_dir(root) / "scan_state.json"
+
+
+def _record_scan(root: Path, out: Path) -> None:
+    # The git trees the output was scanned against, so scan_staged can tell
+    # whether HEAD moved without it (pull, checkout, merge, --no-verify commits)
+    write_json(
+        _scan_state_path(root),
+        {"output": str(out), "head_tree": git_tree(root), "index_tree": git_tree(root, index=True)},
+    )
+
+
+def _staged_base_valid(root: Path, out: Path) -> bool:
+    """True if the only changes since the last scan are in the staged diff against HEAD.
+
+    That holds while HEAD's tree is the one scanned against, or is the index
+    that was scanned (the commit the last hook run was checking went in).
+    """
+    try:
+        state = read_json(_scan_state_path(root)) or {}
+    except Exception:
+        return False
+    head = git_tree(root)
+    if head is None or state.get("output") != str(out):
+        return False
+    return head in (state.get("head_tree"), state.get("index_tree"))
+
+
+def _selected(root: Path, rels: Iterable[str]) -> List[str]:
+    """The relative POSIX paths among rels that a full scan would include."""
+    cfg = load_project_config(root)
+    include, exclude = cfg.get("include"), cfg.get("exclude")
+    return [
+        rel for rel in rels if rel.endswith(".py") and not in_ignored_dir(rel) and path_selected(rel, include, exclude)
+    ]
+
+
+def _parse_index(root: Path, rels: List[str]) -> Dict[str, FileInfo] | None:
+    """FileInfo of the staged (index) version of each path, keyed by rel; None if git cannot read the index.
+
+    Paths missing from the index or failing to parse are left out.
+    """
+    with trace.span("read_index", files=len(rels)):
+        blobs = index_blobs(root, rels)
+    if blobs is None:
+        return None
+    parsed: Dict[str, FileInfo] = {}
+    for rel, data in blobs.items():
+        try:
+            source = data.decode("utf-8")
+        except UnicodeDecodeError:
+            continue
+        info = _parse_one(root, root / rel, source)
+        if info is not None:
+            parsed[rel] = info
+    return parsed
+
+
+def scan_staged(
+    start: str | Path | None = None,
+    out_path: str | Path | None = None,
+    use_cache: bool = True,
+    jobs: int | None = None,
+    fmt: str | None = None,
+) -> RepoInfo:
+    """Re-parse only staged .py files, from their index content, and patch them into the existing output.
+
+    Falls back to a full scan_repository when there is no previous output,
+    the staged file list is unavailable, or HEAD has moved since the last
+    scan by other means than the commit that scan was for. The full scan
+    still reuses the parse cache for unchanged files.
+    """
+    files: List[FileInfo] = []
+    result = _write_staged(start, out_path, use_cache, jobs, fmt, keep=files)
+    return RepoInfo(root=result.root, files=files)
+
+
+def _write_staged(
+    start: str | Path | None = None,
+    out_path: str | Path | None = None,
+    use_cache: bool = True,
+    jobs: int | None = None,
+    fmt: str | None = None,
+    keep: List[FileInfo] | None = None,
+    deadline: float | None = None,
+) -> ScanResult:
+    """scan_staged without holding the records, unless keep is given; deadline as for _write_scan."""
+    root = repo_root(Path(start) if start else None)
     out = Path(out_path) if out_path else root / "repo_info.json"
-    write_json(out, repo.to_dict())
-    return repo
+    with trace.span("staged_changes"):
+        changes = staged_changes(root)
+    try:
+        previous = open_repo(root, out)
+    except Exception:
+        previous = None
+    if changes is None or previous is None or previous.root != str(root) or not _staged_base_valid(root, out):
+        return _write_scan(root, out_path, use_cache, jobs, fmt, keep, deadline)
+
+    changed, removed = changes
+    drop = set(removed) | set(changed)
+    # The staged content, not the working copy: edits left unstaged are not being committed
+    parsed = _parse_index(root, _selected(root, changed))
+    if parsed is None:
+        return _write_scan(root, out_path, use_cache, jobs, fmt, keep, deadline)
+    fresh = {rel: asdict(info) for rel, info in parsed.items()}
+
+    # Previous records are read one at a time and merged with the fresh ones
+    # in the same order as iter_python_files: sorted by POSIX relative path
+    kept = (
+        (rel, record)
+        for rel, record in ((Path(r["path"]).as_posix(), r) for r in previous.iter_files())
+        if rel not in drop
+    )
+    with trace.span("write_output"), RepoWriter(out, str(root), _output_format(root, fmt), _symbol_db(root)) as writer:
+        for _, record in heapq.merge(kept, sorted(fresh.items()), key=lambda item: item[0]):
+            _check_deadline(deadline)
+            writer.add(record)
+            if keep is not None:
+                keep.append(FileInfo.from_dict(record))
+    _record_scan(root, out)
+    return ScanResult(root=str(root), files=writer.count, tree=writer.root_hash or "")
@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import http.client
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from . import trace
+from .llm import LLMError, _load_config
+
+# Every LLM request goes through one process-wide scheduler (shared by all
+# repositories in `docai batch`, since provider quotas are per account):
+#
+#   rate limits      token buckets for requests and tokens per minute
+#                    (llm_rpm, llm_tpm; 0 = unlimited); a call waits for both
+#   retries          429, 408, 5xx, timeouts and dropped connections are retried
+#                    up to llm_max_retries times with full-jitter exponential
+#                    backoff (llm_backoff_base .. llm_backoff_max seconds), or
+#                    after the server's Retry-After when it sends one
+#   circuit breaker  after llm_breaker_threshold consecutive failures the
+#                    endpoint is not called for llm_breaker_cooldown seconds;
+#                    then one trial call decides whether it closes again
+#
+# Settings come from the tool's config.json, with DOCAI_LLM_RPM and
+# DOCAI_LLM_TPM environment overrides (see docai.llm).
+
+T = TypeVar("T")
+
+_RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+# Failures that say nothing about the endpoint's health (the request itself was bad)
+_REQUEST_STATUS = {400, 404, 409, 413, 422}
+
+
+class CircuitOpenError(LLMError):
+    """Raised without calling the backend while the circuit breaker is open."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, LLMError):
+        if exc.status is not None:
+            return exc.status in _RETRY_STATUS
+        exc = exc.__cause__  # type: ignore[assignment]
+    return isinstance(exc, (TimeoutError, ConnectionError, http.client.IncompleteRead))
+
+
+class TokenBucket:
+    """Refills at per_minute / 60 per second, up to one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.stamp = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount is available (amounts above capacity wait for a full bucket)."""
+        self._refill(now)
+        need = min(amount, self.capacity) - self.level
+        return max(0.0, need / self.rate) if self.rate else 0.0
+
+    def take(self, amount: float) -> None:
+        # May go negative, e.g. when a response used more tokens than estimated
+        self.level -= amount
+
+
+class CircuitBreaker:
+    """closed -> open after threshold consecutive failures -> half-open after cooldown.
+
+    While half-open exactly one trial call is let through; its outcome closes
+    or reopens the circuit. Not thread-safe on its own (Scheduler locks it).
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 60.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> str | None:
+        """"call" or "trial" (the one probe while half-open) if a call may go out, else None."""
+        state = self.state
+        if state == "closed":
+            return "call"
+        if state == "half-open" and not self._trial:
+            self._trial = True
+            return "trial"
+        return None
+
+    def release_trial(self) -> None:
+        # The trial ended without an outcome (never sent, or interrupted); the next caller probes
+        self._trial = False
+
+    def success(self) -> None:
+        """The endpoint answered; closes the circuit."""
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def failure(self) -> bool:
+        """Record a failure; returns True if this opened the circuit."""
+        self.failures += 1
+        was_closed = self.opened_at is None
+        trial, self._trial = self._trial, False
+        if trial or (self.threshold and self.failures >= self.threshold):
+            self.opened_at = time.monotonic()
+            return was_closed
+        return False
+
+
+class Scheduler:
+    """Rate limiting, retries and circuit breaking around backend calls."""
+
+    def __init__(
+        self,
+        rpm: float = 0,
+        tpm: float = 0,
+        max_retries: int = 4,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        breaker_threshold: int = 5,
+        breaker_cooldown: float = 60.0,
+    ):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.counters: Dict[str, float] = {
+            "calls": 0,
+            "attempts": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retries": 0,
+            "rejected": 0,
+            "circuit_opened": 0,
+            "throttled_seconds": 0.0,
+            "backoff_seconds": 0.0,
+            "tokens_in": 0,
+            "tokens_out": 0,
+        }
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def _throttle(self, tokens: int, deadline: float | None) -> None:
+        if self.requests is None and self.tokens is None:
+            return
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = max(
+                    self.requests.wait_time(1, now) if self.requests else 0.0,
+                    self.tokens.wait_time(tokens, now) if self.tokens else 0.0,
+                )
+                if wait <= 0:
+                    if self.requests:
+                        self.requests.take(1)
+                    if self.tokens:
+                        self.tokens.take(tokens)
+                    self.counters["throttled_seconds"] += waited
+                    return
+            if deadline is not None and now + wait > deadline:
+                self._count("throttled_seconds", waited)
+                raise LLMError(f"rate limit would delay the request past its timeout ({wait:.1f}s)", 429)
+            with trace.span("llm_throttle", cat="llm"):
+                time.sleep(wait)
+            waited += wait
+
+    def _backoff(self, attempt: int, exc: BaseException) -> float:
+        retry_after = getattr(exc, "retry_after", None)
+        if retry_after:
+            return min(float(retry_after), self.backoff_max)
+        # Full jitter: spreads retries from concurrent calls apart
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def call(self, fn: Callable[[float | None], T], tokens: int = 0, timeout: float | None = None) -> T:
+        """Run fn(remaining_timeout) under the rate limits, retrying retryable failures.
+
+        timeout bounds the whole call, including throttling and backoff.
+        Raises the last error once retries are exhausted, or CircuitOpenError.
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        self._count("calls")
+        attempt = 0
+        while True:
+            with self._lock:
+                ticket = self.breaker.allow()
+            if ticket is None:
+                # A call cut short mid-retry failed; one never attempted was rejected
+                self._count("failed" if attempt else "rejected")
+                raise CircuitOpenError(f"circuit open after {self.breaker.failures} consecutive failures")
+            try:
+                result, delay = self._attempt(fn, tokens, deadline, attempt)
+            finally:
+                if ticket == "trial":
+                    with self._lock:
+                        self.breaker.release_trial()
+            if delay is None:
+                return result
+            self._count("retries")
+            self._count("backoff_seconds", delay)
+            with trace.span("llm_backoff", cat="llm", attempt=attempt + 1):
+                time.sleep(delay)
+            attempt += 1
+
+    def _attempt(self, fn: Callable[[float | None], T], tokens: int, deadline: float | None, attempt: int):
+        """One try: (result, None) on success, (None, backoff) to retry; raises when giving up."""
+        try:
+            self._throttle(tokens, deadline)
+        except LLMError:
+            self._count("failed")
+            raise
+        remaining = deadline - time.monotonic() if deadline is not None else None
+        if remaining is not None and remaining <= 0:
+            self._count("failed")
+            raise LLMError("timed out before the request could be sent", 408)
+        self._count("attempts")
+        try:
+            result = fn(remaining)
+        except Exception as e:
+            opened = False
+            with self._lock:
+                if getattr(e, "status", None) in _REQUEST_STATUS:
+                    # The endpoint answered; only this request was bad
+                    self.breaker.success()
+                else:
+                    opened = self.breaker.failure()
+                    if opened:
+                        self.counters["circuit_opened"] += 1
+            delay = self._backoff(attempt, e)
+            if (
+                not is_retryable(e)
+                or opened
+                or attempt >= self.max_retries
+                or (deadline is not None and time.monotonic() + delay >= deadline)
+            ):
+                self._count("failed")
+                raise
+            return None, delay
+        with self._lock:
+            self.breaker.success()
+            self.counters["succeeded"] += 1
+            self.counters["tokens_in"] += tokens
+        return result, None
+
+    def record_output(self, tokens: int) -> None:
+        """Charge response tokens against the tokens-per-minute budget."""
+        with self._lock:
+            self.counters["tokens_out"] += tokens
+            if self.tokens:
+                self.tokens.take(tokens)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self.counters)
+            elapsed = time.monotonic() - self._started
+            out["circuit"] = self.breaker.state
+        out["throttled_seconds"] = round(out["throttled_seconds"], 3)
+        out["backoff_seconds"] = round(out["backoff_seconds"], 3)
+        out["elapsed_seconds"] = round(elapsed, 3)
+        out["requests_per_minute"] = round(out["succeeded"] * 60 / elapsed, 2) if elapsed > 0 else 0.0
+        out["tokens_per_minute"] = (
+            round((out["tokens_in"] + out["tokens_out"]) * 60 / elapsed, 1) if elapsed > 0 else 0.0
+        )
+        return out
+
+    def summary_line(self) -> str:
+        m = self.metrics()
+        line = (
+            f"[docai] LLM requests: {m['succeeded']} ok, {m['failed']} failed, {m['retries']} retries, "
+            f"{m['throttled_seconds']:.1f}s throttled, {m['backoff_seconds']:.1f}s backing off"
+        )
+        if m["circuit"] != "closed":
+            line += f"; circuit {m['circuit']}"
+        return line
+
+
+def build_scheduler(cfg: Dict[str, Any]) -> Scheduler:
+    return Scheduler(
+        rpm=float(cfg.get("llm_rpm", 0)),
+        tpm=float(cfg.get("llm_tpm", 0)),
+        max_retries=int(cfg.get("llm_max_retries", 4)),
+        backoff_base=float(cfg.get("llm_backoff_base", 1.0)),
+        backoff_max=float(cfg.get("llm_backoff_max", 30.0)),
+        breaker_threshold=int(cfg.get("llm_breaker_threshold", 5)),
+        breaker_cooldown=float(cfg.get("llm_breaker_cooldown", 60.0)),
+    )
+
+
+_lock = threading.Lock()
+_scheduler: Optional[Scheduler] = None
+
+
+def get_scheduler() -> Scheduler:
+    """The process-wide scheduler, built from configuration on first use."""
+    global _scheduler
+    with _lock:
+        if _scheduler is None:
+            _scheduler = build_scheduler(_load_config())
+        return _scheduler
+
+
+def reset_scheduler() -> None:
+    global _scheduler
+    with _lock:
+        _scheduler = None
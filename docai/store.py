@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import json
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+from . import trace
+from .fingerprints import TREE_VERSION, load_tree, module_tree, root_hash, tree_path
+from .util import read_json, write_json
+
+# Output formats for scan results:
+#   json  - a single indented repo_info.json (the original format)
+#   jsonl - repo_info.jsonl, a header line then one module record per line,
+#           plus repo_info.idx.json mapping module -> byte offset for lazy loads
+#   both  - write both side by side
+FORMATS = ("json", "jsonl", "both")
+JSONL_VERSION = 1
+
+
+def jsonl_path(json_path: Path) -> Path:
+    return json_path.with_suffix(".jsonl")
+
+
+def index_path(json_path: Path) -> Path:
+    return json_path.with_suffix(".idx.json")
+
+
+class RepoWriter:
+    """Write scan records one at a time instead of dumping one big dict.
+
+    The JSON export is streamed so it stays byte-identical to
+    write_json(path, {"root": ..., "files": [...]}). The fingerprint tree
+    (repo_info.tree.json) is always written alongside. With symbol_db set,
+    changed modules are also upserted into that SQLite file (docai.symbols).
+    """
+
+    def __init__(self, json_path: Path, root: str, fmt: str = "json", symbol_db: Path | None = None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown output format {fmt!r}; expected one of {', '.join(FORMATS)}")
+        json_path.parent.mkdir(parents=True, exist_ok=True)
+        self.json_path = json_path
+        self._targets: List[tuple[Path, Path]] = []
+        self._json = None
+        self._jsonl = None
+        self._offsets: Dict[str, int] = {}
+        self._tree: Dict[str, Dict[str, Any]] = {}
+        self._pos = 0
+        self._count = 0
+        #: Set once the output is complete
+        self.root_hash: str | None = None
+        self._symbols = None
+        if symbol_db:
+            from .symbols import SymbolWriter  # sqlite3 only when the symbol DB is enabled
+
+            self._symbols = SymbolWriter(symbol_db)
+        if fmt in ("json", "both"):
+            tmp = json_path.with_suffix(json_path.suffix + ".tmp")
+            self._json = tmp.open("w", encoding="utf-8")
+            self._targets.append((tmp, json_path))
+            self._json.write('{\n  "root": ' + json.dumps(root, ensure_ascii=False) + ',\n  "files": [')
+        if fmt in ("jsonl", "both"):
+            final = jsonl_path(json_path)
+            tmp = final.with_suffix(final.suffix + ".tmp")
+            self._jsonl = tmp.open("wb")
+            self._targets.append((tmp, final))
+            self._write_line({"format": JSONL_VERSION, "root": root})
+
+    def _write_line(self, record: Dict[str, Any]) -> None:
+        data = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        self._jsonl.write(data)  # type: ignore[union-attr]
+        self._pos += len(data)
+
+    def add(self, record: Dict[str, Any]) -> None:
+        tree = self._tree[record["module"]] = module_tree(record)
+        if self._symbols is not None:
+            self._symbols.add(record, tree["hash"])
+        if self._json is not None:
+            body = json.dumps(record, indent=2, ensure_ascii=False).replace("\n", "\n    ")
+            self._json.write(("\n" if self._count == 0 else ",\n") + "    " + body)
+        if self._jsonl is not None:
+            self._offsets[record["module"]] = self._pos
+            self._write_line(record)
+        self._count += 1
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        with trace.span("write_output_close"):
+            self._finish()
+
+    def _finish(self) -> None:
+        if self._json is not None:
+            self._json.write("\n  ]\n}" if self._count else "]\n}")
+            self._json.close()
+        if self._jsonl is not None:
+            self._jsonl.close()
+            write_json(index_path(self.json_path), {"format": JSONL_VERSION, "modules": self._offsets}, indent=None)
+        for tmp, final in self._targets:
+            tmp.replace(final)
+        root = self.root_hash = root_hash(self._tree)
+        write_json(
+            tree_path(self.json_path),
+            {"version": TREE_VERSION, "root": root, "modules": self._tree},
+            indent=None,
+        )
+        if self._symbols is not None:
+            self._symbols.finish(root)
+
+    def abort(self) -> None:
+        for fh in (self._json, self._jsonl):
+            if fh is not None:
+                fh.close()
+        for tmp, _ in self._targets:
+            tmp.unlink(missing_ok=True)
+        if self._symbols is not None:
+            self._symbols.abort()
+
+    def __enter__(self) -> "RepoWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class RepoView(ABC):
+    """Read access to one scan's module records, shared by both output formats.
+
+    Consumers (docs, diff, symbols) go through modules(), get() and
+    iter_files(), so with the JSONL format no more than one record needs to
+    be in memory at a time.
+    """
+
+    json_path: Path
+    root: str
+
+    @abstractmethod
+    def modules(self) -> List[str]:
+        ...
+
+    @abstractmethod
+    def get(self, module: str) -> Dict[str, Any] | None:
+        ...
+
+    @abstractmethod
+    def iter_files(self) -> Iterator[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def size(self) -> int:
+        """Approximate size of the records in characters."""
+
+    def module_hashes(self) -> Dict[str, str]:
+        """Module -> fingerprint hash, from the tree written with the scan when it matches."""
+        tree = load_tree(self.json_path)
+        mods = (tree or {}).get("modules") or {}
+        if tree is not None and set(mods) == set(self.modules()):
+            return {m: t["hash"] for m, t in mods.items()}
+        return {r["module"]: module_tree(r)["hash"] for r in self.iter_files()}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"root": self.root, "files": list(self.iter_files())}
+
+
+class RepoStore(RepoView):
+    """Lazy, read-only view over repo_info.jsonl.
+
+    Module records are only parsed when requested; lookups by module name seek
+    straight to the record using the offset index.
+    """
+
+    def __init__(self, json_path: Path):
+        self.json_path = json_path
+        self.path = jsonl_path(json_path)
+        with self.path.open("rb") as f:
+            header = json.loads(f.readline())
+        self.root: str = header.get("root", "")
+        idx = read_json(index_path(json_path)) or {}
+        self._offsets: Dict[str, int] = idx.get("modules") or {}
+
+    def modules(self) -> List[str]:
+        return list(self._offsets)
+
+    def get(self, module: str) -> Dict[str, Any] | None:
+        offset = self._offsets.get(module)
+        if offset is None:
+            return None
+        with self.path.open("rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def iter_files(self) -> Iterator[Dict[str, Any]]:
+        with self.path.open("rb") as f:
+            f.readline()
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def size(self) -> int:
+        return self.path.stat().st_size
+
+
+class JsonRepo(RepoView):
+    """The same view over repo_info.json, which has to be parsed whole."""
+
+    def __init__(self, json_path: Path, data: Dict[str, Any]):
+        self.json_path = json_path
+        self.root = data.get("root", "")
+        self._files: List[Dict[str, Any]] = data.get("files") or []
+        self._by_module = {f["module"]: f for f in self._files}
+
+    def modules(self) -> List[str]:
+        return list(self._by_module)
+
+    def get(self, module: str) -> Dict[str, Any] | None:
+        return self._by_module.get(module)
+
+    def iter_files(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._files)
+
+    def size(self) -> int:
+        return self.json_path.stat().st_size
+
+
+def open_store(json_path: Path) -> RepoStore | None:
+    """Open the JSONL store next to json_path, or None if it was not written."""
+    if not jsonl_path(json_path).exists():
+        return None
+    try:
+        return RepoStore(json_path)
+    except Exception:
+        return None
+
+
+def open_repo(root: Path, json_path: Path | None = None) -> RepoView | None:
+    """A view over whichever scan output is newest on disk, or None if there is none."""
+    json_path = json_path or root / "repo_info.json"
+    jl = jsonl_path(json_path)
+    if jl.exists() and (not json_path.exists() or jl.stat().st_mtime_ns >= json_path.stat().st_mtime_ns):
+        store = open_store(json_path)
+        if store is not None:
+            return store
+    data = read_json(json_path)
+    return JsonRepo(json_path, data) if data else None
+
+
+def load_repo(root: Path, json_path: Path | None = None) -> Dict[str, Any] | None:
+    """Load scan results as a dict (every record in memory; prefer open_repo)."""
+    repo = open_repo(root, json_path)
+    if repo is None:
+        return None
+    with trace.span("load_repo"):
+        return repo.to_dict()
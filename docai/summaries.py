@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from .payload import estimate_tokens
+from .util import read_json, state_dir, write_json
+
+# Intermediate summaries for the hierarchical overview: one per module, one
+# per package (from its modules and sub-packages), then the overview from the
+# top level. Each summary is stored in .docai/summaries.json under the
+# fingerprint of its input, so editing one module only recomputes the chain
+# from that module up to the overview. A package (or the project) with more
+# child summaries than fit in prompt_token_budget is first reduced in parts
+# of group_children() size, repeatedly, until its children fit one request.
+SUMMARIES_VERSION = 1
+
+
+def summaries_path(root: Path) -> Path:
+    return state_dir(root) / "summaries.json"
+
+
+class SummaryStore:
+    """Fingerprint -> summary text, discarded when the generating model/prompts change."""
+
+    def __init__(self, root: Path, source: str):
+        self.path = summaries_path(root)
+        self.source = source
+        try:
+            data = read_json(self.path) or {}
+        except Exception:
+            data = {}
+        self._entries: Dict[str, str] = {}
+        if data.get("version") == SUMMARIES_VERSION and data.get("source") == source:
+            self._entries = data.get("entries") or {}
+        self._used: Dict[str, str] = {}
+        self._dirty = False
+
+    def get(self, key: str) -> str | None:
+        text = self._entries.get(key)
+        if text is not None:
+            self._used[key] = text
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        self._entries[key] = self._used[key] = text
+        self._dirty = True
+
+    def save(self) -> None:
+        # Keep only summaries used by this run; stale ones can never match again
+        if self._dirty or set(self._used) != set(self._entries):
+            write_json(self.path, {"version": SUMMARIES_VERSION, "source": self.source, "entries": self._used}, indent=None)
+
+
+def package_tree(modules: Iterable[str]) -> Dict[str, Dict[str, List[str]]]:
+    """Package name -> {"modules": [...], "packages": [...]} for every ancestor package.
+
+    The root package is "". A package's own __init__ module counts as one of
+    its modules.
+    """
+    tree: Dict[str, Dict[str, List[str]]] = {"": {"modules": [], "packages": []}}
+
+    def _node(pkg: str) -> Dict[str, List[str]]:
+        if pkg not in tree:
+            tree[pkg] = {"modules": [], "packages": []}
+            parent = pkg.rpartition(".")[0]
+            _node(parent)["packages"].append(pkg)
+        return tree[pkg]
+
+    for m in sorted(modules):
+        parent = m[: -len(".__init__")] if m.endswith(".__init__") else m.rpartition(".")[0]
+        _node(parent)["modules"].append(m)
+    for node in tree.values():
+        node["modules"].sort()
+        node["packages"].sort()
+    return tree
+
+
+def package_levels(tree: Dict[str, Any]) -> List[List[str]]:
+    """Non-root packages grouped by depth, deepest first."""
+    by_depth: Dict[int, List[str]] = {}
+    for pkg in tree:
+        if pkg:
+            by_depth.setdefault(pkg.count("."), []).append(pkg)
+    return [sorted(by_depth[d]) for d in sorted(by_depth, reverse=True)]
+
+
+def children_payload(title: str, children: Sequence[Tuple[str, str]]) -> str:
+    """Text payload listing child summaries, e.g. for a package or the overview."""
+    parts = [title]
+    for label, text in children:
+        parts.append(f"{label}:\n{text.strip()}")
+    return "\n\n".join(parts)
+
+
+def group_children(children: Sequence[Tuple[str, str]], budget_tokens: int) -> List[List[Tuple[str, str]]]:
+    """Split children, in order, into groups whose children_payload fits budget_tokens.
+
+    Every group holds at least one child, even one that is over budget alone.
+    """
+    groups: List[List[Tuple[str, str]]] = []
+    current: List[Tuple[str, str]] = []
+    used = 0
+    for label, text in children:
+        cost = estimate_tokens(f"{label}:\n{text.strip()}\n\n")
+        if current and used + cost > budget_tokens:
+            groups.append(current)
+            current, used = [], 0
+        current.append((label, text))
+        used += cost
+    if current:
+        groups.append(current)
+    return groups
@@ -0,0 +1,363 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from . import trace
+from .util import state_dir
+
+# Optional SQLite copy of the scan results in .docai/symbols.db, for indexed
+# lookups of classes, functions and methods by name, module or decorator
+# without loading repo_info.json. Rows are keyed per module by the module's
+# fingerprint hash (docai.fingerprints), so a re-scan only rewrites modules
+# whose hash changed and deletes modules that disappeared.
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS modules (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    path TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    doc TEXT,
+    summary TEXT
+);
+CREATE TABLE IF NOT EXISTS classes (
+    id INTEGER PRIMARY KEY,
+    module_id INTEGER NOT NULL REFERENCES modules(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    bases TEXT NOT NULL,
+    doc TEXT,
+    summary TEXT
+);
+CREATE TABLE IF NOT EXISTS functions (
+    id INTEGER PRIMARY KEY,
+    module_id INTEGER NOT NULL REFERENCES modules(id) ON DELETE CASCADE,
+    class_id INTEGER REFERENCES classes(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    qualname TEXT NOT NULL,
+    returns TEXT,
+    is_async INTEGER NOT NULL,
+    doc TEXT,
+    summary TEXT
+);
+CREATE TABLE IF NOT EXISTS args (
+    function_id INTEGER NOT NULL REFERENCES functions(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    annotation TEXT,
+    "default" TEXT,
+    PRIMARY KEY (function_id, position)
+);
+CREATE TABLE IF NOT EXISTS imports (
+    module_id INTEGER NOT NULL REFERENCES modules(id) ON DELETE CASCADE,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS decorators (
+    module_id INTEGER NOT NULL REFERENCES modules(id) ON DELETE CASCADE,
+    class_id INTEGER REFERENCES classes(id) ON DELETE CASCADE,
+    function_id INTEGER REFERENCES functions(id) ON DELETE CASCADE,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_classes_name ON classes(name);
+CREATE INDEX IF NOT EXISTS idx_classes_module ON classes(module_id);
+CREATE INDEX IF NOT EXISTS idx_functions_name ON functions(name);
+CREATE INDEX IF NOT EXISTS idx_functions_qualname ON functions(qualname);
+CREATE INDEX IF NOT EXISTS idx_functions_module ON functions(module_id);
+CREATE INDEX IF NOT EXISTS idx_functions_class ON functions(class_id);
+CREATE INDEX IF NOT EXISTS idx_imports_module ON imports(module_id);
+CREATE INDEX IF NOT EXISTS idx_imports_name ON imports(name);
+CREATE INDEX IF NOT EXISTS idx_decorators_name ON decorators(name);
+CREATE INDEX IF NOT EXISTS idx_decorators_module ON decorators(module_id);
+CREATE INDEX IF NOT EXISTS idx_decorators_class ON decorators(class_id);
+CREATE INDEX IF NOT EXISTS idx_decorators_function ON decorators(function_id);
+"""
+
+
+def db_path(root: Path) -> Path:
+    return state_dir(root) / "symbols.db"
+
+
+def connect(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), isolation_level=None)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    version = _schema_version(conn)
+    if version not in (None, SCHEMA_VERSION):
+        conn.close()
+        path.unlink(missing_ok=True)
+        return connect(path)
+    conn.executescript(_SCHEMA)
+    conn.execute("INSERT OR REPLACE INTO meta VALUES ('schema', ?)", (str(SCHEMA_VERSION),))
+    return conn
+
+
+def _schema_version(conn: sqlite3.Connection) -> Optional[int]:
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+    except sqlite3.DatabaseError:
+        return None
+    return int(row[0]) if row else None
+
+
+def stored_root_hash(conn: sqlite3.Connection) -> Optional[str]:
+    row = conn.execute("SELECT value FROM meta WHERE key = 'root_hash'").fetchone()
+    return row[0] if row else None
+
+
+class SymbolWriter:
+    """Sync scan records into symbols.db inside one transaction.
+
+    add() is called once per module with its fingerprint hash; modules whose
+    stored hash matches are left untouched. finish() deletes modules that were
+    not seen and commits.
+    """
+
+    def __init__(self, path: Path):
+        self.conn = connect(path)
+        self._known: Dict[str, tuple[int, str]] = {
+            name: (mid, h) for mid, name, h in self.conn.execute("SELECT id, name, hash FROM modules")
+        }
+        self._seen: set[str] = set()
+        self.updated = 0
+        self.conn.execute("BEGIN")
+
+    def add(self, record: Dict[str, Any], module_hash: str) -> None:
+        name = record["module"]
+        self._seen.add(name)
+        known = self._known.get(name)
+        if known and known[1] == module_hash:
+            return
+        if known:
+            self.conn.execute("DELETE FROM modules WHERE id = ?", (known[0],))
+        self._insert(record, module_hash)
+        self.updated += 1
+
+    def _insert(self, record: Dict[str, Any], module_hash: str) -> None:
+        cur = self.conn.execute(
+            "INSERT INTO modules (name, path, hash, doc, summary) VALUES (?, ?, ?, ?, ?)",
+            (record["module"], Path(record["path"]).as_posix(), module_hash, record.get("module_doc"), record.get("summary")),
+        )
+        mid = cur.lastrowid
+        self.conn.executemany(
+            "INSERT INTO imports (module_id, name) VALUES (?, ?)", [(mid, i) for i in record.get("imports") or []]
+        )
+        for c in record.get("classes") or []:
+            cur = self.conn.execute(
+                "INSERT INTO classes (module_id, name, bases, doc, summary) VALUES (?, ?, ?, ?, ?)",
+                (mid, c["name"], json.dumps(c.get("bases") or []), c.get("doc"), c.get("summary")),
+            )
+            cid = cur.lastrowid
+            self._decorators(mid, cid, None, c.get("decorators"))
+            for m in c.get("methods") or []:
+                self._function(mid, cid, m, f"{c['name']}.{m['name']}")
+        for fn in record.get("functions") or []:
+            self._function(mid, None, fn, fn["name"])
+
+    def _function(self, mid: int, cid: Optional[int], fn: Dict[str, Any], qualname: str) -> None:
+        cur = self.conn.execute(
+            "INSERT INTO functions (module_id, class_id, name, qualname, returns, is_async, doc, summary)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (mid, cid, fn["name"], qualname, fn.get("returns"), int(bool(fn.get("is_async"))), fn.get("doc"), fn.get("summary")),
+        )
+        fid = cur.lastrowid
+        defaults = fn.get("defaults") or {}
+        self.conn.executemany(
+            'INSERT INTO args (function_id, position, name, annotation, "default") VALUES (?, ?, ?, ?, ?)',
+            [(fid, i, a["name"], a.get("annotation"), defaults.get(a["name"])) for i, a in enumerate(fn.get("args") or [])],
+        )
+        self._decorators(mid, None, fid, fn.get("decorators"))
+
+    def _decorators(self, mid: int, cid: Optional[int], fid: Optional[int], names: Optional[Iterable[str]]) -> None:
+        self.conn.executemany(
+            "INSERT INTO decorators (module_id, class_id, function_id, name) VALUES (?, ?, ?, ?)",
+            [(mid, cid, fid, d) for d in names or []],
+        )
+
+    def finish(self, root_hash: str) -> None:
+        gone = [(mid,) for name, (mid, _) in self._known.items() if name not in self._seen]
+        with trace.span("symbols_commit", updated=self.updated, removed=len(gone)):
+            self.conn.executemany("DELETE FROM modules WHERE id = ?", gone)
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('root_hash', ?)", (root_hash,))
+            self.conn.execute("COMMIT")
+        self.conn.close()
+
+    def abort(self) -> None:
+        self.conn.execute("ROLLBACK")
+        self.conn.close()
+
+
+def sync(path: Path, files: Iterable[Dict[str, Any]], tree: Dict[str, Any]) -> int:
+    """Bring symbols.db in line with scan records; returns the number of modules rewritten."""
+    writer = SymbolWriter(path)
+    try:
+        modules = tree.get("modules") or {}
+        for record in files:
+            writer.add(record, modules[record["module"]]["hash"])
+    except BaseException:
+        writer.abort()
+        raise
+    writer.finish(tree.get("root", ""))
+    return writer.updated
+
+
+def ensure_current(root: Path, json_path: Path | None = None) -> Optional[Path]:
+    """Make symbols.db match the last scan, syncing changed modules if needed.
+
+    Returns None when there is no scan output to build it from.
+    """
+    from .fingerprints import load_tree, root_hash
+    from .store import open_repo
+
+    json_path = json_path or root / "repo_info.json"
+    path = db_path(root)
+    tree = load_tree(json_path)
+    if tree is not None and path.exists():
+        conn = connect(path)
+        try:
+            if stored_root_hash(conn) == tree.get("root"):
+                return path
+        finally:
+            conn.close()
+    repo = open_repo(root, json_path)
+    if repo is None:
+        return None
+    if tree is None:
+        tree = {"modules": {m: {"hash": h} for m, h in repo.module_hashes().items()}}
+        tree["root"] = root_hash(tree["modules"])
+    sync(path, repo.iter_files(), tree)
+    return path
+
+
+def _pattern(column: str, value: str) -> tuple[str, str]:
+    # Glob characters switch from an exact (indexed) match to GLOB
+    if any(ch in value for ch in "*?["):
+        return f"{column} GLOB ?", value
+    return f"{column} = ?", value
+
+
+def query(
+    path: Path,
+    name: str | None = None,
+    module: str | None = None,
+    decorator: str | None = None,
+    kind: str | None = None,
+    limit: int = 100,
+) -> List[Dict[str, Any]]:
+    """Find classes, methods and functions by name, module and/or decorator.
+
+    name matches the bare name or the qualified "Class.method" name; each
+    filter accepts glob patterns (*, ?, [...]).
+    """
+    conn = sqlite3.connect(str(path))
+    conn.row_factory = sqlite3.Row
+    try:
+        results: List[Dict[str, Any]] = []
+        if kind in (None, "class"):
+            results += _query_classes(conn, name, module, decorator, limit)
+        if kind in (None, "function", "method"):
+            results += _query_functions(conn, name, module, decorator, kind, limit)
+    finally:
+        conn.close()
+    results.sort(key=lambda r: (r["module"], r["qualname"]))
+    return results[:limit]
+
+
+def _query_classes(conn, name, module, decorator, limit) -> List[Dict[str, Any]]:
+    where: List[str] = []
+    params: List[Any] = []
+    if name:
+        clause, value = _pattern("c.name", name)
+        where.append(clause)
+        params.append(value)
+    if module:
+        clause, value = _pattern("m.name", module)
+        where.append(clause)
+        params.append(value)
+    if decorator:
+        clause, value = _pattern("d.name", decorator)
+        where.append(f"EXISTS (SELECT 1 FROM decorators d WHERE d.class_id = c.id AND {clause})")
+        params.append(value)
+    sql = (
+        "SELECT c.id, c.name, c.bases, c.summary, m.name AS module, m.path FROM classes c"
+        " JOIN modules m ON m.id = c.module_id"
+        + (" WHERE " + " AND ".join(where) if where else "")
+        + " LIMIT ?"
+    )
+    rows = conn.execute(sql, params + [limit]).fetchall()
+    return [
+        {
+            "kind": "class",
+            "module": r["module"],
+            "qualname": r["name"],
+            "path": r["path"],
+            "signature": f"{r['name']}({', '.join(json.loads(r['bases']))})",
+            "decorators": _names(conn, "class_id", r["id"]),
+            "summary": r["summary"],
+        }
+        for r in rows
+    ]
+
+
+def _query_functions(conn, name, module, decorator, kind, limit) -> List[Dict[str, Any]]:
+    where: List[str] = []
+    params: List[Any] = []
+    if name:
+        column = "f.qualname" if "." in name else "f.name"
+        clause, value = _pattern(column, name)
+        where.append(clause)
+        params.append(value)
+    if module:
+        clause, value = _pattern("m.name", module)
+        where.append(clause)
+        params.append(value)
+    if decorator:
+        clause, value = _pattern("d.name", decorator)
+        where.append(f"EXISTS (SELECT 1 FROM decorators d WHERE d.function_id = f.id AND {clause})")
+        params.append(value)
+    if kind == "function":
+        where.append("f.class_id IS NULL")
+    elif kind == "method":
+        where.append("f.class_id IS NOT NULL")
+    sql = (
+        "SELECT f.id, f.name, f.qualname, f.class_id, f.returns, f.is_async, f.summary, m.name AS module, m.path"
+        " FROM functions f JOIN modules m ON m.id = f.module_id"
+        + (" WHERE " + " AND ".join(where) if where else "")
+        + " LIMIT ?"
+    )
+    rows = conn.execute(sql, params + [limit]).fetchall()
+    out = []
+    for r in rows:
+        args = conn.execute(
+            'SELECT name, annotation, "default" FROM args WHERE function_id = ? ORDER BY position', (r["id"],)
+        ).fetchall()
+        parts = []
+        for a in args:
+            part = f"{a['name']}: {a['annotation']}" if a["annotation"] else a["name"]
+            if a["default"] is not None:
+                part += f" = {a['default']}"
+            parts.append(part)
+        sig = f"{'async ' if r['is_async'] else ''}{r['name']}({', '.join(parts)})"
+        if r["returns"]:
+            sig += f" -> {r['returns']}"
+        out.append(
+            {
+                "kind": "method" if r["class_id"] is not None else "function",
+                "module": r["module"],
+                "qualname": r["qualname"],
+                "path": r["path"],
+                "signature": sig,
+                "decorators": _names(conn, "function_id", r["id"]),
+                "summary": r["summary"],
+            }
+        )
+    return out
+
+
+def _names(conn, column: str, owner: int) -> List[str]:
+    return [row[0] for row in conn.execute(f"SELECT name FROM decorators WHERE {column} = ?", (owner,))]
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+# Lightweight span recorder behind `docai --timings` and `docai --trace out.json`.
+# Disabled by default; span() is then a near no-op.
+
+_enabled = False
+_lock = threading.Lock()
+_events: List[Dict[str, Any]] = []
+# Aggregated timings for calls too frequent to record individually (e.g. ast.unparse)
+_totals: Dict[str, List[float]] = {}
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def _now_us() -> float:
+    return time.perf_counter_ns() / 1000.0
+
+
+@contextmanager
+def span(name: str, cat: str = "docai", **args: Any) -> Iterator[None]:
+    """Record a complete ("X") trace event around the block when tracing is on."""
+    if not _enabled:
+        yield
+        return
+    start = _now_us()
+    try:
+        yield
+    finally:
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": start,
+            "dur": _now_us() - start,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+        }
+        if args:
+            event["args"] = args
+        with _lock:
+            _events.append(event)
+
+
+def reset() -> None:
+    """Forget recorded data, e.g. spans a forked worker inherited from its parent."""
+    with _lock:
+        _events.clear()
+        _totals.clear()
+
+
+def add_time(name: str, seconds: float) -> None:
+    """Accumulate time for a hot call without recording an event per call."""
+    with _lock:
+        entry = _totals.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+
+def drain() -> Dict[str, Any]:
+    """Take all recorded data (used to ship worker-process spans to the parent)."""
+    with _lock:
+        data = {"events": list(_events), "totals": dict(_totals)}
+        _events.clear()
+        _totals.clear()
+    return data
+
+
+def merge(data: Dict[str, Any]) -> None:
+    with _lock:
+        _events.extend(data.get("events") or [])
+        for name, (count, seconds) in (data.get("totals") or {}).items():
+            entry = _totals.setdefault(name, [0, 0.0])
+            entry[0] += count
+            entry[1] += seconds
+
+
+def summary_table(slowest: int = 10) -> str:
+    """Per-phase totals plus the slowest individual files."""
+    with _lock:
+        events = list(_events)
+        totals = {k: list(v) for k, v in _totals.items()}
+    rows: Dict[str, List[float]] = {}
+    for e in events:
+        r = rows.setdefault(e["name"], [0, 0.0, 0.0])
+        r[0] += 1
+        r[1] += e["dur"] / 1e6
+        r[2] = max(r[2], e["dur"] / 1e6)
+    lines = [f"{'phase':<28} {'count':>7} {'total s':>10} {'mean ms':>10} {'max ms':>10}"]
+    for name, (count, total, worst) in sorted(rows.items(), key=lambda kv: -kv[1][1]):
+        lines.append(f"{name:<28} {int(count):>7} {total:>10.3f} {1000 * total / count:>10.2f} {1000 * worst:>10.2f}")
+    for name, (count, total) in sorted(totals.items(), key=lambda kv: -kv[1][1]):
+        mean = 1000 * total / count if count else 0.0
+        lines.append(f"{name + ' (aggregated)':<28} {int(count):>7} {total:>10.3f} {mean:>10.3f} {'-':>10}")
+    files = sorted(
+        (e for e in events if e["name"] == "parse_file"),
+        key=lambda e: -e["dur"],
+    )[:slowest]
+    if files:
+        lines += ["", f"slowest files (top {len(files)}):"]
+        for e in files:
+            lines.append(f"  {e['dur'] / 1000:>10.2f} ms  {e.get('args', {}).get('path', '?')}")
+    return "\n".join(lines)
+
+
+def write_chrome_trace(path: str | Path) -> None:
+    """Write recorded spans in Chrome trace-event format (chrome://tracing, Perfetto)."""
+    with _lock:
+        events = list(_events)
+        totals = {k: {"count": v[0], "seconds": v[1]} for k, v in _totals.items()}
+    out = Path(path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with out.open("w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"totals": totals}}, f)
@@ -1,9 +1,16 @@
+from __future__ import annotations
+
+import hashlib
 import json
 import os
+import subprocess
+from fnmatch import fnmatch
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, List
+
+from . import trace
 
-IGNORES = {".git", "venv", ".venv", "__pycache__", "build", "dist"}
+IGNORES = {".git", ".docai", "venv", ".venv", "__pycache__", "build", "dist"}
 
 
 def repo_root(start: Path | None = None) -> Path:
@@ -14,25 +21,214 @@ def repo_root(start: Path | None = None) -> Path:
     return p
 
 
-def write_json(path: Path, data: Dict[str, Any]) -> None:
+_STATE_READY: set[Path] = set()
+
+
+def state_dir(root: Path) -> Path:
+    """root/.docai, created on first use with a .gitignore of `*`.
+
+    The queue, caches and daemon socket in it must never be picked up by
+    `git add -A`.
+    """
+    path = root / ".docai"
+    if path not in _STATE_READY:
+        ignore = path / ".gitignore"
+        if not ignore.exists():
+            path.mkdir(parents=True, exist_ok=True)
+            ignore.write_text("*\n", encoding="utf-8")
+        _STATE_READY.add(path)
+    return path
+
+
+def write_json(path: Path, data: Dict[str, Any], indent: int | None = 2) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     tmp = path.with_suffix(path.suffix + ".tmp")
-    with tmp.open("w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    with trace.span("write_json", path=path.name), tmp.open("w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
     tmp.replace(path)
 
 
 def read_json(path: Path) -> Dict[str, Any] | None:
     if not path.exists():
         return None
-    with path.open("r", encoding="utf-8") as f:
+    with trace.span("read_json", path=path.name), path.open("r", encoding="utf-8") as f:
         return json.load(f)
 
 
-def iter_python_files(root: Path):
+def fingerprint(data: Any) -> str:
+    """Stable content hash of a JSON-serialisable value."""
+    blob = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def load_project_config(root: Path) -> Dict[str, Any]:
+    """Per-project settings from .docai.json at the repository root (optional)."""
+    try:
+        cfg = read_json(root / ".docai.json")
+    except Exception:
+        return {}
+    return cfg if isinstance(cfg, dict) else {}
+
+
+def in_ignored_dir(rel: str) -> bool:
+    return any(part in IGNORES for part in rel.split("/")[:-1])
+
+
+def staged_changes(root: Path) -> tuple[List[str], List[str]] | None:
+    """Return (added_or_modified, removed) staged paths, or None outside git.
+
+    Renames count as a removal of the old path plus an addition of the new one.
+    """
+    if not (root / ".git").exists():
+        return None
+    try:
+        out = subprocess.run(
+            ["git", "-C", str(root), "diff", "--cached", "--name-status", "-z", "-M"],
+            capture_output=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    fields = [f.decode("utf-8", "surrogateescape") for f in out.split(b"\0") if f]
+    changed: List[str] = []
+    removed: List[str] = []
+    i = 0
+    while i < len(fields):
+        status = fields[i][:1]
+        if status in ("R", "C"):
+            old, new = fields[i + 1], fields[i + 2]
+            if status == "R":
+                removed.append(old)
+            changed.append(new)
+            i += 3
+            continue
+        path = fields[i + 1]
+        (removed if status == "D" else changed).append(path)
+        i += 2
+    return changed, removed
+
+
+def unstaged_paths(root: Path) -> List[str] | None:
+    """Paths whose working-tree copy differs from the index, or None outside git."""
+    if not (root / ".git").exists():
+        return None
+    try:
+        out = subprocess.run(
+            ["git", "-C", str(root), "diff", "--name-only", "-z"],
+            capture_output=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return [f.decode("utf-8", "surrogateescape") for f in out.split(b"\0") if f]
+
+
+def index_blobs(root: Path, paths: Iterable[str]) -> Dict[str, bytes] | None:
+    """Staged (index) content of each path, read in one `git cat-file --batch` call.
+
+    Paths that are not regular blobs in the index (deleted, submodules) are
+    left out. Returns None outside git or if git fails.
+    """
+    paths = list(paths)
+    if not paths:
+        return {}
+    try:
+        out = subprocess.run(
+            ["git", "-C", str(root), "cat-file", "--batch"],
+            input="".join(f":{p}\n" for p in paths).encode("utf-8", "surrogateescape"),
+            capture_output=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    blobs: Dict[str, bytes] = {}
+    pos = 0
+    for path in paths:
+        end = out.find(b"\n", pos)
+        if end < 0:
+            return None
+        header = out[pos:end].split()
+        pos = end + 1
+        if len(header) != 3:
+            # "<spec> missing"
+            continue
+        size = int(header[2])
+        if header[1] == b"blob":
+            blobs[path] = out[pos:pos + size]
+        pos += size + 1
+    return blobs
+
+
+def git_tree(root: Path, index: bool = False) -> str | None:
+    """Tree hash of HEAD, or of the index with index=True; None outside git or before the first commit."""
+    if not (root / ".git").exists():
+        return None
+    args = ["write-tree"] if index else ["rev-parse", "--verify", "-q", "HEAD^{tree}"]
+    try:
+        out = subprocess.run(["git", "-C", str(root), *args], capture_output=True, check=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.strip() or None
+
+
+def _git_python_files(root: Path) -> List[str] | None:
+    # Tracked plus untracked-but-not-ignored files, straight from the git index.
+    if not (root / ".git").exists():
+        return None
+    try:
+        out = subprocess.run(
+            ["git", "-C", str(root), "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+            capture_output=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    rels = set()
+    for raw in out.split(b"\0"):
+        rel = raw.decode("utf-8", "surrogateescape")
+        if rel.endswith(".py") and not in_ignored_dir(rel):
+            rels.add(rel)
+    # Index entries deleted from the working tree are not scannable
+    return [r for r in rels if (root / r).is_file()]
+
+
+def _walk_python_files(root: Path) -> List[str]:
+    rels: List[str] = []
     for dirpath, dirnames, filenames in os.walk(root):
         # prune ignored dirs in-place
         dirnames[:] = [d for d in dirnames if d not in IGNORES]
         for name in filenames:
             if name.endswith(".py"):
-                yield Path(dirpath) / name
+                rels.append((Path(dirpath) / name).relative_to(root).as_posix())
+    return rels
+
+
+def path_selected(rel: str, include: Iterable[str] | None = None, exclude: Iterable[str] | None = None) -> bool:
+    """Apply user include/exclude globs (matched against the POSIX relative path)."""
+    if include and not any(fnmatch(rel, pat) for pat in include):
+        return False
+    if exclude and any(fnmatch(rel, pat) for pat in exclude):
+        return False
+    return True
+
+
+def iter_python_files(
+    root: Path,
+    include: Iterable[str] | None = None,
+    exclude: Iterable[str] | None = None,
+    backend: str = "auto",
+):
+    """Yield Python files under root in sorted relative-path order.
+
+    backend is "git" (index + untracked, honours .gitignore), "walk" (os.walk)
+    or "auto" (git when available, os.walk otherwise).
+    """
+    with trace.span("enumerate_files", backend=backend):
+        rels = _git_python_files(root) if backend in ("auto", "git") else None
+        if rels is None:
+            rels = _walk_python_files(root)
+    include = list(include or [])
+    exclude = list(exclude or [])
+    for rel in sorted(rels):
+        if path_selected(rel, include, exclude):
+            yield root / rel
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import ast
+
+from benchmarks.fake_gemini import FakeGeminiModel
+from benchmarks.run import compare
+from benchmarks.synth import generate_repo
+
+
+def _tree(root):
+    return {p.relative_to(root).as_posix(): p.read_text() for p in sorted(root.rglob("*.py"))}
+
+
+def test_synthetic_repo_is_deterministic_valid_python(tmp_path):
+    a = generate_repo(tmp_path / "a", modules=6, packages=2, seed=3, git=False)
+    b = generate_repo(tmp_path / "b", modules=6, packages=2, seed=3, git=False)
+    assert _tree(a) == _tree(b)
+    modules = [p for p in _tree(a) if not p.endswith("__init__.py")]
+    assert len(modules) == 6
+    for source in _tree(a).values():
+        ast.parse(source)
+
+
+def test_fake_model_counts_calls_and_answers_in_markdown():
+    model = FakeGeminiModel()
+    text = model.generate(["Write an overview.", "\n\nRepository outline:\n", "module m (m.py)"])
+    assert model.calls == 1 and text.strip()
+
+
+def test_compare_reports_only_regressions_beyond_tolerance():
+    baseline = {"results": {"scan": {"min": 1.0}, "render": {"min": 1.0}, "generate_repo": {"min": 1.0}}}
+    current = {"results": {"scan": {"min": 1.2}, "render": {"min": 1.3}, "generate_repo": {"min": 9.0}}}
+    assert compare(current, baseline, 0.25) == ["render: 1.3000s vs baseline 1.0000s"]
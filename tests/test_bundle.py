@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import io
+import json
+import tarfile
+
+from docai import scanner
+from docai.bundle import _merge_sections, export_bundle, import_bundle
+from docai.cache import ResponseCache, cache_dir
+from docai.docs import _API_SECTIONS_VERSION, _section_line
+
+
+def _project(root):
+    root.mkdir()
+    (root / "a.py").write_text("def f(x: int) -> int:\n    return x\n")
+    (root / "b.py").write_text("class B:\n    pass\n")
+    scanner.scan_repository(root)
+    cache = ResponseCache(root)
+    cache.put(cache.key("m", "prompt", "payload"), "## Answer\n")
+    return root
+
+
+def test_export_is_reproducible_and_import_merges(tmp_path):
+    src = _project(tmp_path / "src")
+    (tmp_path / "out").mkdir()
+    first, manifest = export_bundle(src, tmp_path / "out", key="k1")
+    data = first.read_bytes()
+    again, _ = export_bundle(src, tmp_path / "out", key="k1")
+    assert again.read_bytes() == data and first.name == "docai-cache-k1.tar.gz"
+    assert "cache/parse.json" in manifest["members"]
+
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    stats = import_bundle(dest, first, expect_key="k1")
+    assert stats["rejected"] == [] and stats["parse"] == 2 and stats["llm"] == 1
+    assert len(list((cache_dir(dest) / "llm").glob("*.txt"))) == 1
+    # Everything is already there the second time
+    assert import_bundle(dest, first)["llm"] == 0
+
+
+def test_import_rejects_unknown_and_tampered_members(tmp_path):
+    bundle = tmp_path / "bad.tar.gz"
+    llm = "cache/llm/" + "0" * 64 + ".txt"
+    manifest = {"version": 1, "key": "k", "members": {llm: {"sha256": "0" * 64, "size": 4}}}
+    with tarfile.open(bundle, "w:gz") as tar:
+        for name, blob in [("manifest.json", json.dumps(manifest).encode()), ("../evil.py", b"x"), (llm, b"fake")]:
+            info = tarfile.TarInfo(name)
+            info.size = len(blob)
+            tar.addfile(info, io.BytesIO(blob))
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    stats = import_bundle(dest, bundle)
+    assert sorted(stats["rejected"]) == sorted(["../evil.py", llm]) and stats["llm"] == 0
+    assert not (tmp_path / "evil.py").exists()
+
+
+def test_merge_sections_keeps_local_sections_unless_they_fell_back(tmp_path):
+    def store(*records, source="gemini:x"):
+        return "".join(_section_line(r) for r in [{"version": _API_SECTIONS_VERSION, "source": source}, *records])
+
+    path = tmp_path / "api_sections.jsonl"
+    path.write_text(store(
+        {"module": "a", "fingerprint": "1", "text": "ours a"},
+        {"module": "b", "fingerprint": "2", "text": "ours b", "fallback": True},
+    ))
+    theirs = store(
+        {"module": "a", "fingerprint": "1", "text": "theirs a"},
+        {"module": "b", "fingerprint": "2", "text": "theirs b"},
+        {"module": "c", "fingerprint": "3", "text": "theirs c"},
+    )
+    assert _merge_sections(path, theirs.encode()) == 2
+    texts = [json.loads(line).get("text") for line in path.read_text().splitlines()[1:]]
+    assert texts == ["ours a", "theirs b", "theirs c"]
+    # Sections from another model or prompt are ignored
+    assert _merge_sections(path, store({"module": "d", "text": "x"}, source="other").encode()) == 0
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+
+from docai.cache import ResponseCache
+
+
+def test_get_drops_expired_entries(tmp_path):
+    cache = ResponseCache(tmp_path, max_age_days=1)
+    cache.put("a" * 64, "old answer")
+    path = cache.dir / f"{'a' * 64}.txt"
+    stale = time.time() - 2 * 86400
+    os.utime(path, (stale, stale))
+    assert cache.get("a" * 64) is None
+    assert not path.exists()
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_put_scans_directory_once_until_over_cap(tmp_path, monkeypatch):
+    cache = ResponseCache(tmp_path, max_bytes=1000)
+    scans = []
+    real = ResponseCache.evict
+    monkeypatch.setattr(ResponseCache, "evict", lambda self: scans.append(1) or real(self))
+    for i in range(9):
+        cache.put(f"{i:064x}", "x" * 100)
+    assert len(scans) == 1
+    for i in range(9, 12):
+        cache.put(f"{i:064x}", "x" * 100)
+    # Over the cap: least recently used entries go
+    assert len(scans) > 1
+    assert sum(p.stat().st_size for p in cache.dir.glob("*.txt")) <= 1000
+    assert cache.get(f"{11:064x}") == "x" * 100
+    assert cache.get(f"{0:064x}") is None
+
+
+def test_put_failure_is_reported_not_raised(tmp_path, monkeypatch, capsys):
+    cache = ResponseCache(tmp_path)
+
+    def fail(self, data):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(Path, "write_bytes", fail)
+    cache.put("b" * 64, "answer")
+    cache.put("c" * 64, "answer")
+    out = capsys.readouterr().out
+    assert out.count("Could not write LLM cache entry") == 1
+    assert not list(cache.dir.glob("*.tmp"))
+
+
+def test_counters_are_thread_safe(tmp_path):
+    cache = ResponseCache(tmp_path)
+    cache.put("d" * 64, "answer")
+
+    def hammer():
+        for _ in range(500):
+            cache.get("d" * 64)
+            cache.get("e" * 64)
+
+    threads = [threading.Thread(target=hammer) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert (cache.hits, cache.misses) == (4000, 4000)
+
+
+def test_overwriting_a_key_does_not_grow_the_total(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=1000)
+    cache.evict()
+    for _ in range(3):
+        cache.put("f" * 64, "x" * 100)
+    assert cache._total == 100
+
+
+def test_reads_track_recency_without_extending_age(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=250, max_age_days=1)
+    old, new = "1" * 64, "2" * 64
+    cache.put(old, "x" * 100)
+    path = cache.dir / f"{old}.txt"
+    written = time.time() - 3600
+    os.utime(path, (written, written))
+    assert cache.get(old) == "x" * 100
+    # The read moved the access time, not the age
+    assert path.stat().st_mtime == written and path.stat().st_atime > written
+
+    # Written later but read less recently: evicted first
+    cache.put(new, "y" * 100)
+    later = time.time() - 1800
+    os.utime(cache.dir / f"{new}.txt", (later, later))
+    cache.put("3" * 64, "z" * 100)
+    assert cache.get(old) is not None and cache.get(new) is None
+
+    # A frequently read entry still expires
+    stale = time.time() - 2 * 86400
+    os.utime(path, (time.time(), stale))
+    assert cache.get(old) is None
+
+
+def test_parse_cache_skips_unchanged_files(tmp_path, monkeypatch):
+    from docai import scanner
+
+    for name in ("a", "b"):
+        (tmp_path / f"{name}.py").write_text(f'def {name}():\n    """{name}."""\n')
+    parsed = []
+    real = scanner._parse_one
+    monkeypatch.setattr(scanner, "_parse_one", lambda root, py, src: parsed.append(py.name) or real(root, py, src))
+    first = scanner.scan_repository(tmp_path, jobs=1)
+    assert sorted(parsed) == ["a.py", "b.py"]
+
+    parsed.clear()
+    assert scanner.scan_repository(tmp_path, jobs=1) == first
+    assert parsed == []
+
+    # Same content, new mtime: the content hash still matches
+    later = time.time() + 10
+    os.utime(tmp_path / "a.py", (later, later))
+    (tmp_path / "b.py").write_text('def b():\n    """Changed."""\n')
+    repo = scanner.scan_repository(tmp_path, jobs=1)
+    assert parsed == ["b.py"]
+    assert repo.files[1].functions[0].doc == "Changed."
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from docai import daemon
+
+pytestmark = pytest.mark.skipif(not daemon.supported(), reason="needs Unix domain sockets")
+
+
+def test_long_root_uses_private_runtime_dir(tmp_path, monkeypatch):
+    runtime = tmp_path / "run"
+    runtime.mkdir(mode=0o700)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(runtime))
+    path = daemon.socket_path(tmp_path / ("x" * 120))
+    assert path is not None and path.parent == runtime / "docai"
+    assert (path.parent.stat().st_mode & 0o777) == 0o700
+
+
+def test_shared_runtime_dir_is_refused(tmp_path, monkeypatch):
+    shared = tmp_path / "run"
+    (shared / "docai").mkdir(parents=True)
+    os.chmod(shared / "docai", 0o777)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(shared))
+    assert daemon.socket_path(tmp_path / ("x" * 120)) is None
+
+
+def test_request_ignores_socket_of_another_user(tmp_path, monkeypatch, capsys):
+    import socket
+
+    path = tmp_path / ".docai" / "daemon.sock"
+    path.parent.mkdir()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(path))
+        server.listen(1)
+        monkeypatch.setattr(os, "getuid", lambda: os.stat(path).st_uid + 1)
+        assert daemon.request(tmp_path, "ping", timeout=1.0) is None
+    assert "not a socket owned by you" in capsys.readouterr().out
+
+
+def _server(path):
+    import socket
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(path))
+    server.listen(1)
+    return server
+
+
+def test_request_timeout_is_an_error_not_a_fallback(tmp_path):
+    with _server(tmp_path / ".docai" / "daemon.sock"):
+        resp = daemon.request(tmp_path, "hook", timeout=0.2)
+    assert resp is not None and resp["code"] == 1 and "did not answer" in resp["output"]
+
+
+def test_garbled_reply_is_an_error(tmp_path):
+    import threading
+
+    with _server(tmp_path / ".docai" / "daemon.sock") as server:
+
+        def reply():
+            conn, _ = server.accept()
+            with conn:
+                conn.recv(1024)
+                conn.sendall(b'{"ok": tr\n')
+
+        t = threading.Thread(target=reply)
+        t.start()
+        resp = daemon.request(tmp_path, "hook", timeout=5.0)
+        t.join()
+    assert resp is not None and resp["code"] == 1 and "no valid reply" in resp["output"]
+
+
+def test_staged_hook_writes_index_from_memory(tmp_path, monkeypatch):
+    import subprocess
+
+    from docai import scanner
+    from docai.store import open_repo
+
+    def git(*args):
+        subprocess.run(["git", "-c", "user.name=t", "-c", "user.email=t@example.com", "-C", str(tmp_path), *args],
+                       check=True, capture_output=True)
+
+    git("init", "-q")
+    for name in ("a", "b", "c"):
+        (tmp_path / f"{name}.py").write_text(f'def {name}():\n    """{name}."""\n')
+    git("add", "-A")
+    git("commit", "-qm", "init")
+    (tmp_path / "a.py").write_text('def a(x):\n    """Staged."""\n')
+    git("add", "a.py")
+    (tmp_path / "a.py").write_text('def a(x, y):\n    """Not staged."""\n')
+    (tmp_path / "b.py").write_text('def b(z):\n    """Not staged either."""\n')
+    git("rm", "-q", "--cached", "c.py")
+
+    d = daemon.Daemon(tmp_path, use_cache=False, jobs=1)
+    d.refresh()
+    parsed = []
+    real = scanner._parse_index
+    monkeypatch.setattr(scanner, "_parse_index", lambda root, rels: parsed.extend(rels) or real(root, rels))
+    d.write_staged()
+    from_daemon = list(open_repo(tmp_path).iter_files())
+    # Only the files whose working copy differs from the index are parsed
+    assert sorted(parsed) == ["a.py", "b.py"]
+
+    # A full scan of a working tree that matches the index
+    git("stash", "-q", "--keep-index")
+    scanner.scan_repository(tmp_path, use_cache=False, jobs=1)
+    assert from_daemon == list(open_repo(tmp_path).iter_files())
+    assert [f["path"] for f in from_daemon] == ["a.py", "b.py"]
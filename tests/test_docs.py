@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from docai import docs
+
+
+def test_abandoned_call_keeps_its_slot_until_it_ends(monkeypatch):
+    lock = threading.Lock()
+    live = []
+    peak = []
+    release = threading.Event()
+
+    def fake_call(model, prompt, payload, cache, timeout, stream):
+        with lock:
+            live.append(prompt)
+            peak.append(len(live))
+        try:
+            if prompt == "hang":
+                release.wait(5)
+            return f"answer to {prompt}"
+        finally:
+            with lock:
+                live.remove(prompt)
+
+    monkeypatch.setattr(docs, "_call_gemini", fake_call)
+    model = SimpleNamespace(label="Fake")
+    calls = {"a": ("hang", ""), "b": ("quick", ""), "c": ("quick2", "")}
+    timer = threading.Timer(0.5, release.set)
+    timer.start()
+    results = docs._run_calls(model, calls, None, 1, 0.2)
+    timer.join()
+    assert max(peak) == 1
+    assert results["a"] == ""
+    assert results["b"] == "answer to quick" and results["c"] == "answer to quick2"
+
+
+def _repo(tmp_path, docs_by_module):
+    from docai.store import JsonRepo
+
+    fn = {"name": "f", "args": [], "returns": None, "defaults": {}, "decorators": [], "is_async": False}
+    files = [
+        {"path": f"{m}.py", "module": m, "doc": None, "classes": [], "functions": [dict(fn, doc=doc, summary=doc)]}
+        for m, doc in docs_by_module.items()
+    ]
+    return JsonRepo(tmp_path / "repo_info.json", {"root": str(tmp_path), "files": files})
+
+
+def test_api_plan_reuses_stored_sections_and_cleans_layouts(tmp_path):
+    out = tmp_path / "docs"
+    plan = docs._ApiPlan(tmp_path, _repo(tmp_path, {"b": "Bee.", "a": "Ay."}), "deterministic")
+    assert plan.stale == ["a", "b"]
+    plan.assemble()
+    plan.write(out, "per-module")
+    assert sorted(p.name for p in (out / "api").iterdir()) == ["a.md", "b.md"]
+
+    plan = docs._ApiPlan(tmp_path, _repo(tmp_path, {"b": "Bee, revised.", "a": "Ay."}), "deterministic")
+    assert plan.stale == ["b"]
+    plan.assemble()
+    plan.write(out, "single")
+    assert not (out / "api").exists()
+    text = (out / "api_reference.md").read_text()
+    assert text.index("## a") < text.index("## b") and "Bee, revised." in text
+
+    # Another source starts over
+    assert docs._ApiPlan(tmp_path, _repo(tmp_path, {"a": "Ay."}), "gemini:x").stale == ["a"]
+
+
+def test_many_calls_use_a_bounded_set_of_threads(monkeypatch):
+    baseline = threading.active_count()
+    peak = []
+
+    def fake_call(model, prompt, payload, cache, timeout, stream):
+        peak.append(threading.active_count())
+        time.sleep(0.002)
+        return prompt
+
+    monkeypatch.setattr(docs, "_call_gemini", fake_call)
+    calls = {f"api:m{i}": (f"p{i}", "") for i in range(200)}
+    results = docs._run_calls(SimpleNamespace(label="Fake"), calls, None, 4, 5.0)
+    assert results == {k: p for k, (p, _) in calls.items()}
+    assert max(peak) <= baseline + 4
+
+
+def test_calls_behind_hung_slots_fall_back_within_the_timeout(monkeypatch, capsys):
+    release = threading.Event()
+
+    def fake_call(model, prompt, payload, cache, timeout, stream):
+        if prompt == "hang":
+            release.wait(10)
+        return f"answer to {prompt}"
+
+    monkeypatch.setattr(docs, "_call_gemini", fake_call)
+    calls = {"a": ("hang", ""), "b": ("quick", "")}
+    monkeypatch.setattr(docs, "_shared_slots", threading.BoundedSemaphore(1))
+    start = time.monotonic()
+    try:
+        results = docs._run_calls(SimpleNamespace(label="Fake"), calls, None, 2, 0.2)
+    finally:
+        release.set()
+    # "a" times out after 0.2s and keeps the only slot; "b" gives up at the 0.4s deadline
+    assert time.monotonic() - start < 2
+    assert results == {"a": "", "b": ""}
+    out = capsys.readouterr().out
+    assert "timed out" in out and "got no free slot" in out
+
+
+def test_generations_run_concurrently_and_failures_fall_back(monkeypatch, tmp_path):
+    # Passes only if the three calls are in flight at once
+    barrier = threading.Barrier(3, timeout=2)
+
+    def fake_call(model, prompt, payload, cache, timeout, stream):
+        barrier.wait()
+        if prompt == "readme":
+            raise RuntimeError("quota")
+        return f"{prompt} text"
+
+    monkeypatch.setattr(docs, "_call_gemini", fake_call)
+    requests = {k: (k, "{}") for k in ("overview", "readme", "api")}
+    results = docs._generate_all(SimpleNamespace(label="Fake", name="x"), requests, tmp_path)
+    assert results == {"overview": "overview text", "readme": "", "api": "api text"}
+
+
+def test_api_plan_retries_only_modules_that_fell_back(tmp_path, capsys):
+    repo = _repo(tmp_path, {"a": "Ay.", "b": "Bee."})
+    plan = docs._ApiPlan(tmp_path, repo, "gemini:x")
+    assert set(plan.requests("Describe.")) == {"api:a", "api:b"}
+    plan.assemble({"api:a": "## a\nWritten by the model.", "api:b": ""})
+    plan.write(tmp_path / "docs")
+    text = (tmp_path / "docs" / "api_reference.md").read_text()
+    assert "Written by the model." in text and "Bee." in text
+    assert "empty for 1 module(s)" in capsys.readouterr().out
+
+    # Unchanged modules are not requested again, the fallback one is
+    assert docs._ApiPlan(tmp_path, repo, "gemini:x").stale == ["b"]
+
+
+def test_packed_modules_missing_from_the_answer_are_retried_alone(monkeypatch, tmp_path, capsys):
+    from docai.packing import BEGIN, END
+
+    prompts = []
+
+    def fake_call(model, prompt, payload, cache, timeout, stream):
+        prompts.append(prompt)
+        if "Modules: a, b, c" in prompt:
+            # The model drops "b" from its packed answer
+            return "\n".join(f"{BEGIN.format(name=m)}\n## {m}\nPacked {m}.\n{END.format(name=m)}" for m in "ac")
+        return f"## {payload}\nAlone."
+
+    monkeypatch.setattr(docs, "_call_gemini", fake_call)
+    prompt = "Describe." + docs._API_MODULE_INSTRUCTION
+    results = docs._generate_all(
+        SimpleNamespace(label="Fake", name="x"), {f"api:{m}": (prompt, m) for m in "abc"}, tmp_path
+    )
+    assert results == {"api:a": "## a\nPacked a.\n", "api:b": "## b\nAlone.", "api:c": "## c\nPacked c.\n"}
+    assert len(prompts) == 2
+    assert "incomplete for 1 module(s)" in capsys.readouterr().out
+
+
+def test_stream_target_writes_truncates_and_abandons(tmp_path):
+    target_path = tmp_path / "docs" / "overview.md"
+    target_path.parent.mkdir()
+    tmp = tmp_path / "tmp"
+    closed = []
+
+    def chunks(*parts):
+        try:
+            yield from parts
+        finally:
+            closed.append(True)
+
+    target = docs._StreamTarget(target_path, tmp)
+    assert target.consume(chunks("# Over", "", "view\n")) == "# Overview\n"
+    assert target_path.read_text() == "# Overview\n" and target.changed and target.first_chunk is not None
+
+    target = docs._StreamTarget(target_path, tmp, max_chars=8)
+    text = target.consume(chunks("0123", "4567", "89ab"))
+    assert target.truncated and text.startswith("01234567") and text.endswith(docs._TRUNCATED)
+    assert target_path.read_text() == text and closed == [True, True]
+
+    # Failed, empty and abandoned responses keep what is there
+    def failing():
+        yield "partial"
+        raise RuntimeError("stream broke")
+
+    with pytest.raises(RuntimeError):
+        docs._StreamTarget(target_path, tmp).consume(failing())
+    assert docs._StreamTarget(target_path, tmp).consume(chunks(" ", "\n")) == ""
+    target = docs._StreamTarget(target_path, tmp)
+    target.abandon()
+    assert target.consume(chunks("late")) == "" and not target.committed
+    assert target_path.read_text() == text
+    assert list(tmp.iterdir()) == []
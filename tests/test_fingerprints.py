@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import copy
+
+from docai.fingerprints import build_tree, diff_trees, module_tree
+
+
+def _fn(name: str, doc: str | None = None, decorators=()) -> dict:
+    return {
+        "name": name,
+        "args": [{"name": "self", "annotation": None}],
+        "returns": None,
+        "defaults": {},
+        "decorators": list(decorators),
+        "is_async": False,
+        "doc": doc,
+        "summary": (doc or "").split("\n")[0],
+    }
+
+
+def _module(getter_doc: str = "The value.") -> dict:
+    return {
+        "path": "pkg/mod.py",
+        "module": "pkg.mod",
+        "doc": None,
+        "classes": [
+            {
+                "name": "Box",
+                "bases": [],
+                "decorators": [],
+                "doc": None,
+                "methods": [
+                    _fn("value", getter_doc, ["property"]),
+                    _fn("value", "Set the value.", ["value.setter"]),
+                ],
+            }
+        ],
+        "functions": [_fn("load", "Load from a path."), _fn("load", "Load, Windows flavour.")],
+    }
+
+
+def test_same_named_definitions_are_all_hashed():
+    tree = module_tree(_module())
+    assert {"Box.value", "Box.value#2", "load", "load#2"} <= set(tree["symbols"])
+
+
+def test_property_getter_doc_change_changes_hashes():
+    before = _module()
+    after = _module("The current value.")
+    assert module_tree(before)["hash"] != module_tree(after)["hash"]
+    old, new = build_tree([before]), build_tree([after])
+    assert old["root"] != new["root"]
+    assert diff_trees(old, new)["changed"]["pkg.mod"]["changed"] == ["Box", "Box.value"]
+
+
+def test_redefinition_change_changes_hash():
+    before = _module()
+    after = copy.deepcopy(before)
+    after["functions"][1]["doc"] = "Load, POSIX flavour."
+    assert module_tree(before)["hash"] != module_tree(after)["hash"]
@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+from benchmarks.importtime import BUDGET_MS, PACKAGE_ROOT, forbidden, measure, parse_importtime
+
+
+def test_scan_path_stays_within_import_budget():
+    ms, names = measure(repeat=3)
+    assert forbidden(names) == []
+    assert ms <= BUDGET_MS, f"`docai scan` imports took {ms:.1f}ms, budget {BUDGET_MS:.0f}ms"
+
+
+def test_cli_import_is_light():
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(PACKAGE_ROOT), os.environ.get("PYTHONPATH")])))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import docai.cli"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    _, names = parse_importtime(proc.stderr)
+    assert "docai.cli" in names
+    assert forbidden(names) == [] and "docai.scanner" not in names
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import threading
+
+from docai import jobs
+
+
+def test_concurrent_enqueues_coalesce_without_losing_requests(tmp_path):
+    n = 16
+    barrier = threading.Barrier(n)
+
+    def enqueue():
+        barrier.wait()
+        jobs.enqueue(tmp_path)
+
+    threads = [threading.Thread(target=enqueue) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    pending = jobs.list_jobs(tmp_path)["pending"]
+    assert len(pending) == 1
+    assert pending[0]["requests"] == n
+    assert not (jobs.queue_dir(tmp_path) / "queue.lock").exists()
+
+
+def test_enqueue_while_running_coalesces_into_running_job(tmp_path):
+    seen = []
+
+    def regenerate(root):
+        job, coalesced = jobs.enqueue(root)
+        seen.append((job["state"], coalesced))
+        return False
+
+    jobs.enqueue(tmp_path)
+    assert jobs.run_worker(tmp_path, regenerate) == 1
+    assert seen == [("running", True)]
+    queue = jobs.list_jobs(tmp_path)
+    assert not queue["pending"] and not queue["running"]
+    assert queue["done"][0]["result"] == "unchanged"
+
+
+def test_stale_queue_lock_is_taken_over(tmp_path, monkeypatch):
+    lock = jobs.queue_dir(tmp_path) / "queue.lock"
+    lock.parent.mkdir(parents=True)
+    lock.write_text("12345")
+    monkeypatch.setattr(jobs, "_pid_alive", lambda pid: False)
+    job, coalesced = jobs.enqueue(tmp_path)
+    assert not coalesced and job["requests"] == 1
+
+
+def test_rescan_job_scans_before_regenerating(tmp_path, monkeypatch):
+    from docai import scanner
+
+    order = []
+    monkeypatch.setattr(scanner, "_write_scan", lambda root: order.append("scan"))
+    job, _ = jobs.enqueue(tmp_path, rescan=True)
+    assert job["rescan"]
+    # Not coalesced with a plain job for the previous scan
+    assert jobs.job_fingerprint(tmp_path) != job["fingerprint"]
+    jobs.run_worker(tmp_path, lambda root: order.append("docs") or False, once=True)
+    assert order[:2] == ["scan", "docs"]
+
+
+def test_state_dir_is_ignored_by_git(tmp_path):
+    import subprocess
+
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    jobs.enqueue(tmp_path)
+    assert (tmp_path / ".docai" / ".gitignore").read_text() == "*\n"
+    status = subprocess.run(
+        ["git", "-C", str(tmp_path), "status", "--porcelain", "--untracked-files=all"],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    assert ".docai" not in status
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from docai.llm import HTTPBackend, LLMError, build_backend
+from docai.llm_server import STAND_IN_MODEL, StandInServer, stand_in_reply
+
+
+@pytest.fixture
+def server():
+    srv = StandInServer(port=0)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_http_backend_reuses_pooled_connections(server, monkeypatch):
+    backend = HTTPBackend(server.base_url, STAND_IN_MODEL)
+    opened = []
+    connect = backend._connect
+    monkeypatch.setattr(backend, "_connect", lambda timeout: opened.append(1) or connect(timeout))
+
+    assert backend.list_models() == [STAND_IN_MODEL]
+    assert backend.generate(["Hello", " world"], timeout=5) == stand_in_reply("Hello world")
+    assert "".join(backend.stream(["Hello world"], timeout=5)) == stand_in_reply("Hello world")
+    assert server.requests == 2 and len(opened) == 1
+
+
+def test_http_backend_surfaces_http_errors(server):
+    backend = HTTPBackend(server.base_url, STAND_IN_MODEL)
+    with pytest.raises(LLMError) as err:
+        backend.request("GET", "/missing", timeout=5)
+    assert err.value.status == 404
+    # The connection survives the error response
+    assert backend.generate(["x"], timeout=5) == stand_in_reply("x")
+    with pytest.raises(LLMError):
+        HTTPBackend("ftp://example.com", "m")
+
+
+def test_build_backend_picks_the_provider():
+    backend = build_backend({"llm_base_url": "http://127.0.0.1:1/v1", "llm_model": "m"})
+    assert isinstance(backend, HTTPBackend) and backend.name == "m"
+    assert build_backend({"llm_provider": "http"}) is None
+    assert build_backend({"gemini_model": "models/x"}) is None
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from docai.packing import BEGIN, END, MAX_MODULES, pack_payload, plan_packs, split_response
+
+
+def _block(name, body):
+    return f"{BEGIN.format(name=name)}\n{body}\n{END.format(name=name)}"
+
+
+def test_plan_packs_fits_the_budget():
+    sizes = {"a": 60, "b": 50, "c": 30, "d": 20, "huge": 500}
+    packs = plan_packs(sizes, budget=100, overhead=10)
+    assert sorted(k for p in packs for k in p) == sorted(sizes)
+    assert ["huge"] in packs
+    assert all(10 + sum(sizes[k] for k in p) <= 100 for p in packs if p != ["huge"])
+    assert packs == sorted(packs, key=lambda p: p[0]) and all(p == sorted(p) for p in packs)
+
+
+def test_plan_packs_caps_modules_per_call():
+    packs = plan_packs({f"m{i:02}": 1 for i in range(40)}, budget=10_000)
+    assert max(len(p) for p in packs) == MAX_MODULES
+
+
+def test_pack_payload_introduces_each_module():
+    text = pack_payload([("a", "module a\n"), ("b", "module b")])
+    assert text == "=== module: a ===\nmodule a\n\n=== module: b ===\nmodule b"
+
+
+def test_split_response_keeps_only_valid_sections():
+    text = "\n".join([
+        "Preamble the model should not have written.",
+        _block("a", "## a\nAy."),
+        _block("b", "## `b`\nBee."),
+        _block("c", "## not c\nWrong heading."),
+        _block("d", "## d\nOnce."),
+        _block("d", "## d\nTwice."),
+        f"{BEGIN.format(name='e')}\n## e\nNever closed.",
+    ])
+    assert split_response(text, ["a", "b", "c", "d", "e", "f"]) == {"a": "## a\nAy.", "b": "## `b`\nBee."}
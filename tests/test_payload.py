@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from docai.payload import compact_payload, estimate_tokens
+
+
+def _fn(name, doc=None):
+    return {"name": name, "args": [{"name": "x", "annotation": "int"}], "returns": "str", "defaults": {},
+            "decorators": [], "is_async": False, "doc": doc, "summary": doc or f"Function {name}"}
+
+
+def _repo():
+    files = [
+        {"path": f"m{i}.py", "module": f"m{i}", "module_doc": None, "imports": ["os", "sys"], "classes": [],
+         "functions": [_fn("public", "Does the thing.")] + [_fn(f"_helper{j}") for j in range(20)]}
+        for i in range(5)
+    ]
+    return {"root": "/abs/root", "files": files}
+
+
+def test_outline_drops_synthesised_summaries_and_root():
+    text = compact_payload(_repo())
+    assert "def public(x: int) -> str: Does the thing." in text
+    assert "Function _helper0" not in text and "/abs/root" not in text
+
+
+def test_budget_keeps_public_api_before_private_helpers():
+    full = compact_payload(_repo())
+    text = compact_payload(_repo(), budget_tokens=estimate_tokens(full) // 4)
+    assert estimate_tokens(text) < estimate_tokens(full) // 4 + 20
+    assert all(f"module m{i} (m{i}.py)" in text for i in range(5))
+    assert text.count("def public") == 5 and "_helper19" not in text
+    assert text.endswith("lower-priority lines omitted to fit the token budget")
+    # Kept lines stay in their original order
+    assert text.index("module m0") < text.index("def public") < text.index("module m1")
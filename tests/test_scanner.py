@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import subprocess
+
+import pytest
+
+from docai import scanner
+from docai.store import open_repo
+
+
+def _git(root, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@example.com", "-C", str(root), *args],
+        check=True,
+        capture_output=True,
+    )
+
+
+def _doc(root, name):
+    (info,) = [f for f in open_repo(root).iter_files() if f["path"] == name]
+    return info["functions"][0]["doc"]
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    _git(tmp_path, "init", "-q")
+    (tmp_path / "a.py").write_text('def f():\n    """One."""\n')
+    (tmp_path / "b.py").write_text('def g():\n    """Two."""\n')
+    _git(tmp_path, "add", "-A")
+    _git(tmp_path, "commit", "-qm", "init")
+    scanner.scan_repository(tmp_path, use_cache=False, jobs=1)
+    full = []
+    real = scanner._write_scan
+    monkeypatch.setattr(scanner, "_write_scan", lambda *a, **k: full.append(1) or real(*a, **k))
+    return tmp_path, full
+
+
+def test_staged_scan_patches_after_hooked_commit(repo):
+    root, full = repo
+    (root / "a.py").write_text('def f():\n    """One, revised."""\n')
+    _git(root, "add", "a.py")
+    scanner.scan_staged(root, jobs=1)
+    assert _doc(root, "a.py") == "One, revised."
+    _git(root, "commit", "-qm", "revise")
+    (root / "b.py").write_text('def g():\n    """Two, revised."""\n')
+    _git(root, "add", "b.py")
+    scanner.scan_staged(root, jobs=1)
+    assert _doc(root, "b.py") == "Two, revised."
+    assert full == []
+
+
+def test_staged_scan_rescans_when_head_moved_without_it(repo):
+    root, full = repo
+    # A commit that bypassed the hook, e.g. --no-verify
+    (root / "a.py").write_text('def f():\n    """Changed behind our back."""\n')
+    _git(root, "commit", "-qam", "no-verify")
+    scanner.scan_staged(root, jobs=1)
+    assert _doc(root, "a.py") == "Changed behind our back."
+    assert full == [1]
+
+
+def test_parallel_collect_streams_in_order(tmp_path, monkeypatch):
+    from docai.cache import ParseCache
+
+    for i in range(60):
+        (tmp_path / f"m{i:02d}.py").write_text(f'def f{i}():\n    """Function {i}."""\n')
+    (tmp_path / "broken.py").write_text("def (:\n")
+    paths = sorted(tmp_path.glob("*.py"))
+    # Warm the cache for every third file, so hits wait behind pending misses
+    warm = ParseCache(tmp_path, scanner.SCANNER_VERSION)
+    list(scanner._collect(tmp_path, paths[::3], warm, 1))
+    warm.save()
+    monkeypatch.setattr(scanner, "_MIN_PARALLEL_FILES", 4)
+    monkeypatch.setattr(scanner, "_BATCH_FILES", 3)
+
+    uncached = ParseCache(tmp_path, scanner.SCANNER_VERSION, enabled=False)
+    serial = [f.path for f in scanner._collect(tmp_path, paths, uncached, 1)]
+    cache = ParseCache(tmp_path, scanner.SCANNER_VERSION)
+    parallel = [f.path for f in scanner._collect(tmp_path, paths, cache, 2)]
+    assert parallel == serial == [p.name for p in paths if p.name != "broken.py"]
+    # Every miss was stored in the cache, including the unparseable file
+    assert all(cache.lookup_stat(p.name, p.stat())[0] for p in paths)
+
+
+def test_staged_scan_keeps_unchanged_records(repo):
+    root, _ = repo
+    (root / "c.py").write_text('def h():\n    """Three."""\n')
+    _git(root, "add", "c.py")
+    result = scanner.scan_staged(root, jobs=1)
+    assert [f.path for f in result.files] == ["a.py", "b.py", "c.py"]
+    assert [f["path"] for f in open_repo(root).iter_files()] == ["a.py", "b.py", "c.py"]
+
+
+def test_staged_scan_reads_index_not_working_tree(repo):
+    root, full = repo
+    (root / "a.py").write_text('def f():\n    """Staged."""\n')
+    _git(root, "add", "a.py")
+    (root / "a.py").write_text('def f():\n    """Not staged."""\n')
+    scanner.scan_staged(root, jobs=1)
+    assert _doc(root, "a.py") == "Staged."
+    assert full == []
+
+
+def test_public_scan_returns_file_infos(tmp_path):
+    (tmp_path / "a.py").write_text('def f():\n    """One."""\n')
+    repo = scanner.scan_repository(tmp_path, use_cache=False, jobs=1)
+    assert isinstance(repo, scanner.RepoInfo)
+    assert [(f.module, f.functions[0].name) for f in repo.files] == [("a", "f")]
+    assert scanner._write_scan(tmp_path, use_cache=False, jobs=1).files == 1
+
+
+def test_scan_past_deadline_keeps_previous_output(repo):
+    import time
+
+    root, _ = repo
+    before = (root / "repo_info.json").read_bytes()
+    (root / "c.py").write_text('def h():\n    """Three."""\n')
+    with pytest.raises(scanner.ScanBudgetExceeded):
+        scanner._write_scan(root, jobs=1, deadline=time.perf_counter() - 1)
+    assert (root / "repo_info.json").read_bytes() == before
+
+
+_EXPRESSIONS = [
+    "str", "typing.Dict", "a.b.c", "None", "True", "...", "0", "-1", "10**3", "1.5", "'x'", "'it''s'",
+    "'tab\\t'", "u'x'", "b'x'", "Optional[str]", "Dict[str, Any]", "Tuple[int, ...]", "Tuple[()]",
+    "Callable[[int, str], None]", "Callable[..., Any]", "Literal['a', 'b']", "Dict[str, Tuple[int, int]]",
+    "x[1:2]", "x[(1, 2), 3]", "x[a, b][c]", "f()[0]", "int | None", "int | str | None", "(int | str) | None",
+    "int | (str | None)", "list[int] | dict[str, int]", "Annotated[int, Field(gt=0)]", "[1, 2]", "[]",
+    "[(1, 2)]", "property", "functools.lru_cache(maxsize=None)", "app.route('/x')", "lambda: 0",
+    "{'a': 1}", "x if y else z", "not x", "a and b", "'é'", "'\\x00'",
+]
+
+
+def test_render_simple_matches_ast_unparse():
+    import ast
+    from pathlib import Path
+
+    nodes = [ast.parse(src, mode="eval").body for src in _EXPRESSIONS]
+    # Plus every expression in this repository's own sources
+    for py in sorted(Path(scanner.__file__).parent.glob("*.py")):
+        nodes += [n for n in ast.walk(ast.parse(py.read_text())) if isinstance(n, ast.expr)]
+    rendered = 0
+    for node in nodes:
+        text = scanner._render_simple(node)
+        if text is not None:
+            assert text == ast.unparse(node), ast.dump(node)
+            rendered += 1
+    assert rendered > 1000
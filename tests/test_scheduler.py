@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import pytest
+
+from docai import scheduler as sched
+from docai.llm import LLMError
+from docai.scheduler import CircuitBreaker, CircuitOpenError, Scheduler, TokenBucket
+
+
+class _Clock:
+    def __init__(self, start: float = 1000.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr(sched.time, "monotonic", c)
+    monkeypatch.setattr(sched.time, "sleep", lambda s: setattr(c, "now", c.now + s))
+    return c
+
+
+def test_token_bucket_refills_at_rate_up_to_capacity(clock):
+    bucket = TokenBucket(60)  # one per second, burst of 60
+    assert bucket.wait_time(60, clock.now) == 0
+    bucket.take(60)
+    assert bucket.wait_time(1, clock.now) == pytest.approx(1.0)
+    clock.now += 0.5
+    assert bucket.wait_time(1, clock.now) == pytest.approx(0.5)
+    clock.now += 3600
+    assert bucket.level <= bucket.capacity
+    assert bucket.wait_time(60, clock.now) == 0
+    # Requests larger than a minute's worth wait for a full bucket instead of forever
+    bucket.take(60)
+    assert bucket.wait_time(1000, clock.now) == pytest.approx(60.0)
+
+
+def test_token_bucket_debt_delays_next_request(clock):
+    bucket = TokenBucket(60)
+    bucket.take(90)  # a response that used more than estimated
+    assert bucket.wait_time(1, clock.now) == pytest.approx(31.0)
+
+
+def test_throttle_waits_and_counts(clock):
+    s = Scheduler(rpm=60)
+    s.requests.take(60)
+    assert s.call(lambda t: "ok") == "ok"
+    assert s.metrics()["throttled_seconds"] == pytest.approx(1.0)
+
+
+def test_throttle_past_deadline_fails_fast(clock):
+    s = Scheduler(rpm=6)
+    s.requests.take(6)
+    with pytest.raises(LLMError) as e:
+        s.call(lambda t: "ok", timeout=5)
+    assert e.value.status == 429
+    assert s.metrics()["failed"] == 1
+
+
+def test_backoff_is_jittered_and_capped():
+    s = Scheduler(backoff_base=1.0, backoff_max=8.0)
+    err = LLMError("busy", 503)
+    for attempt in range(10):
+        for _ in range(50):
+            assert 0 <= s._backoff(attempt, err) <= min(8.0, 2 ** attempt)
+    assert s._backoff(0, LLMError("slow down", 429, retry_after=3)) == 3
+    assert s._backoff(0, LLMError("slow down", 429, retry_after=600)) == 8.0
+
+
+def test_retries_retryable_errors_then_succeeds(clock):
+    s = Scheduler(max_retries=3, backoff_base=0.1)
+    outcomes = [LLMError("busy", 503), TimeoutError("read timed out"), "ok"]
+
+    def fn(timeout):
+        out = outcomes.pop(0)
+        if isinstance(out, BaseException):
+            raise out
+        return out
+
+    assert s.call(fn) == "ok"
+    m = s.metrics()
+    assert (m["attempts"], m["retries"], m["succeeded"], m["failed"]) == (3, 2, 1, 0)
+
+
+def test_gives_up_after_max_retries_and_on_request_errors(clock):
+    s = Scheduler(max_retries=2, breaker_threshold=0)
+    calls = []
+
+    def busy(timeout):
+        calls.append(1)
+        raise LLMError("busy", 503)
+
+    with pytest.raises(LLMError):
+        s.call(busy)
+    assert len(calls) == 3
+
+    def bad(timeout):
+        calls.append(1)
+        raise LLMError("bad request", 400)
+
+    calls.clear()
+    with pytest.raises(LLMError):
+        s.call(bad)
+    assert len(calls) == 1
+
+
+def test_breaker_opens_then_half_open_trial_closes(clock):
+    b = CircuitBreaker(threshold=2, cooldown=10)
+    assert b.allow() == "call"
+    assert not b.failure()
+    assert b.failure()  # second consecutive failure opens
+    assert b.state == "open" and b.allow() is None
+    clock.now += 10
+    assert b.state == "half-open"
+    assert b.allow() == "trial"
+    assert b.allow() is None  # only one probe at a time
+    b.success()
+    assert b.state == "closed" and b.allow() == "call"
+
+
+def test_breaker_failed_trial_reopens(clock):
+    b = CircuitBreaker(threshold=1, cooldown=10)
+    b.failure()
+    clock.now += 10
+    assert b.allow() == "trial"
+    b.failure()
+    assert b.state == "open"
+    clock.now += 10
+    assert b.allow() == "trial"
+
+
+def _open_breaker(s: Scheduler, clock: _Clock) -> None:
+    def busy(timeout):
+        raise LLMError("unavailable", 503)
+
+    with pytest.raises(LLMError):
+        s.call(busy)
+    assert s.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        s.call(lambda t: "ok")
+    clock.now += s.breaker.cooldown + 0.001
+
+
+def test_request_error_on_trial_closes_breaker(clock):
+    s = Scheduler(max_retries=5, breaker_threshold=2, breaker_cooldown=30)
+    _open_breaker(s, clock)
+
+    def bad(timeout):
+        raise LLMError("bad request", 400)
+
+    with pytest.raises(LLMError) as e:
+        s.call(bad)
+    assert not isinstance(e.value, CircuitOpenError)
+    assert s.breaker.state == "closed"
+    assert s.call(lambda t: "ok") == "ok"
+
+
+def test_interrupted_trial_does_not_wedge_breaker(clock):
+    s = Scheduler(max_retries=5, breaker_threshold=2, breaker_cooldown=30)
+    _open_breaker(s, clock)
+
+    def interrupted(timeout):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        s.call(interrupted)
+    assert s.breaker.state == "half-open"
+    assert s.call(lambda t: "ok") == "ok"
+    assert s.breaker.state == "closed"
+
+
+def test_throttled_trial_does_not_wedge_breaker(clock):
+    s = Scheduler(rpm=6, max_retries=5, breaker_threshold=2, breaker_cooldown=30)
+    _open_breaker(s, clock)
+    s.requests.take(s.requests.level + 6)
+    with pytest.raises(LLMError):
+        s.call(lambda t: "ok", timeout=1)
+    assert s.breaker.allow() == "trial"
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from docai import docs
+from docai.payload import estimate_tokens, truncate_payload
+from docai.summaries import SummaryStore, children_payload, group_children
+
+
+def _children(n: int, size: int = 400) -> list[tuple[str, str]]:
+    return [(f"module pkg.m{i}", f"Summary {i}. " + "x" * size) for i in range(n)]
+
+
+def test_group_children_fits_budget_and_keeps_order():
+    children = _children(30)
+    groups = group_children(children, 1000)
+    assert [c for g in groups for c in g] == children
+    assert all(estimate_tokens(children_payload("", g)) <= 1000 for g in groups if len(g) > 1)
+    # A child over budget on its own still gets a group
+    assert group_children(_children(2, 10000), 100) == [[c] for c in _children(2, 10000)]
+
+
+def test_truncate_payload_respects_budget():
+    text = "\n".join(f"line {i} " + "y" * 50 for i in range(500))
+    cut = truncate_payload(text, 1000)
+    assert estimate_tokens(cut) <= 1000
+    assert cut.endswith("characters omitted to fit the token budget")
+    assert truncate_payload("short", 1000) == "short"
+
+
+def _plan(tmp_path, budget):
+    plan = docs._OverviewPlan.__new__(docs._OverviewPlan)
+    plan.root = tmp_path
+    plan.budget = budget
+    plan.prompts = {"package_summary": "Summarize."}
+    plan.store = SummaryStore(tmp_path, "test")
+    return plan
+
+
+def test_fit_reduces_wide_fan_in_until_it_fits(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_generate_all(model, requests, root, cache=None, streams=None):
+        calls.append(dict(requests))
+        for prompt, payload in requests.values():
+            assert estimate_tokens(prompt) + estimate_tokens(payload) <= 2000
+        return {k: "Part summary." for k in requests}
+
+    monkeypatch.setattr(docs, "_generate_all", fake_generate_all)
+    plan = _plan(tmp_path, 2000)
+    children = _children(200)
+    fitted = plan._fit(None, None, "Write the overview.", {"": ("Project", children)})[""]
+    assert estimate_tokens(children_payload("Project", fitted)) <= 2000
+    assert calls and all(k.startswith("part:(project)#") for k in calls[0])
+
+    # Parts are cached: the same input needs no further calls
+    calls.clear()
+    again = plan._fit(None, None, "Write the overview.", {"": ("Project", children)})[""]
+    assert again == fitted and calls == []
+
+
+def test_fit_leaves_small_fan_in_alone(tmp_path, monkeypatch):
+    monkeypatch.setattr(docs, "_generate_all", lambda *a, **k: (_ for _ in ()).throw(AssertionError("called")))
+    children = _children(3)
+    assert _plan(tmp_path, 24000)._fit(None, None, "p", {"pkg": ("Package pkg", children)}) == {"pkg": children}
+
+
+def test_module_and_package_with_the_same_name_keep_both_summaries(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+
+    from docai.store import JsonRepo
+
+    (tmp_path / ".docai.json").write_text('{"overview_mode": "hierarchical"}')
+    # pkg.py next to a pkg/ package
+    files = [
+        {"path": p, "module": m, "doc": None, "classes": [], "functions": [], "summary": m}
+        for p, m in (("pkg.py", "pkg"), ("pkg/a.py", "pkg.a"), ("pkg/b.py", "pkg.b"))
+    ]
+    repo = JsonRepo(tmp_path / "repo_info.json", {"root": str(tmp_path), "files": files})
+    sent = {}
+
+    def fake_generate_all(model, requests, root, cache=None, streams=None):
+        sent.update(requests)
+        return {k: f"Summary of {k}." for k in requests}
+
+    monkeypatch.setattr(docs, "_generate_all", fake_generate_all)
+    plan = docs._OverviewPlan(tmp_path, repo, {"overview": "Overview."}, SimpleNamespace(label="Fake", name="x"))
+    plan.finish(None, fake_generate_all(None, plan.requests(), tmp_path), None)
+    overview = sent["overview"][1]
+    assert "module pkg:\nSummary of msum:pkg." in overview
+    assert "package pkg:\nSummary of psum:pkg." in overview
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import json
+
+from docai import scanner, trace
+
+
+def test_disabled_tracing_records_nothing():
+    trace.reset()
+    with trace.span("noop"):
+        pass
+    assert trace.drain() == {"events": [], "totals": {}}
+
+
+def test_scan_spans_round_trip_to_a_chrome_trace(tmp_path, monkeypatch):
+    monkeypatch.setattr(trace, "_enabled", False)
+    trace.reset()
+    trace.enable()
+    (tmp_path / "a.py").write_text("def f(x: int = 1) -> int:\n    return x\n")
+    scanner.scan_repository(tmp_path, use_cache=False, jobs=1)
+
+    # Worker processes ship their spans back with drain() and merge()
+    data = trace.drain()
+    assert trace.drain()["events"] == []
+    trace.merge(data)
+    names = {e["name"] for e in data["events"]}
+    assert {"scan_repository", "parse_file", "ast.parse"} <= names
+    assert "ast.unparse" in data["totals"]
+    assert "slowest files" in trace.summary_table() and "a.py" in trace.summary_table()
+
+    out = tmp_path / "trace" / "out.json"
+    trace.write_chrome_trace(out)
+    doc = json.loads(out.read_text())
+    assert all(e["ph"] == "X" and e["dur"] >= 0 for e in doc["traceEvents"])
+    assert doc["otherData"]["totals"]["ast.unparse"]["count"] >= 1
+    trace.reset()
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import subprocess
+
+from docai.util import iter_python_files
+
+
+def _rels(root, **kw):
+    return [p.relative_to(root).as_posix() for p in iter_python_files(root, **kw)]
+
+
+def _tree(root):
+    for rel in ("a.py", "pkg/b.py", "gen/out.py", "venv/lib.py", "notes.txt"):
+        (root / rel).parent.mkdir(parents=True, exist_ok=True)
+        (root / rel).write_text("x = 1\n")
+
+
+def test_git_backend_honours_gitignore(tmp_path):
+    _tree(tmp_path)
+    (tmp_path / ".gitignore").write_text("gen/\n")
+    (tmp_path / "gone.py").write_text("x = 1\n")
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    subprocess.run(["git", "-C", str(tmp_path), "add", "a.py", "gone.py"], check=True)
+    (tmp_path / "gone.py").unlink()
+    # Tracked and untracked files, sorted; ignored, deleted and IGNORES dirs are left out
+    assert _rels(tmp_path, backend="git") == ["a.py", "pkg/b.py"]
+    # os.walk knows nothing of .gitignore
+    assert _rels(tmp_path, backend="walk") == ["a.py", "gen/out.py", "pkg/b.py"]
+
+
+def test_walk_fallback_outside_git_with_patterns(tmp_path):
+    _tree(tmp_path)
+    assert _rels(tmp_path) == ["a.py", "gen/out.py", "pkg/b.py"]
+    assert _rels(tmp_path, include=["pkg/*"]) == ["pkg/b.py"]
+    assert _rels(tmp_path, exclude=["gen/*"]) == ["a.py", "pkg/b.py"]